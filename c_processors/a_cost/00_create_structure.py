@@ -1,10 +1,18 @@
 import os
+import sys
 import re
 import json
 import pypandoc
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+# --- Setup del Percorso ---
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_cache import CachedModel, llm_cache_from_env
+
 # --- 1. CONFIGURAZIONE SPECIFICA PER LA COSTITUZIONE ---
 def load_config():
     """Carica le configurazioni e inizializza i client per il processo della Costituzione."""
@@ -15,7 +23,7 @@ def load_config():
     config = {
         "model": "gemini-2.5-pro",
         "input_indice_docx": os.path.join(proj_root, "b_testi", "a_cost", "cost_2023_22_10_indice.docx"),
-        "output_dir": os.path.join(proj_root, "d_outputs", "00_structured", "a_cost"),
+        "output_dir": os.path.join(proj_root, "d_outputs", "03_structured", "a_cost"),
         "output_json_structure": ""
     }
     config["output_json_structure"] = os.path.join(config["output_dir"], "cost_structure.json")
@@ -23,7 +31,7 @@ def load_config():
     try:
         os.makedirs(config["output_dir"], exist_ok=True)
         genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        client = genai.GenerativeModel(config["model"])
+        client = CachedModel(genai.GenerativeModel(config["model"]), llm_cache_from_env(os.path.join(proj_root, "d_outputs", "06_cache")))
         print("✅ Configurazione caricata e client AI inizializzato.")
         return config, client
     except Exception as e:
@@ -121,7 +129,8 @@ def create_structure_file(config, client):
 
     try:
         print("🧠 Invio indice della Costituzione all'IA per l'analisi strutturale...")
-        response = client.generate_content(prompt)
+        # La risposta entra nella cache solo se contiene un JSON valido
+        response = client.generate_content(prompt, validate=lambda text: json.loads(clean_json_from_text(text)))
         json_text = clean_json_from_text(response.text)
         
         print("✅ Analisi AI completata. Tento il parsing del JSON...")
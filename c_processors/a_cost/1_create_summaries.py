@@ -1,18 +1,25 @@
 import os
-import re
+import sys
 import json
-import time
-import pypandoc
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+# --- Setup del Percorso ---
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_enrichment import EnrichmentPool
+from g_src.g_general.utils_cache import CachedModel, llm_cache_from_env
+from g_src.g_general.utils_articles import load_articles
+
 # --- 1. CONFIGURAZIONE ---
 def load_config():
     """Carica le configurazioni e inizializza i client per il processo di generazione dei riassunti."""
     proj_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     load_dotenv(os.path.join(proj_root, "a_chiavi", ".env"))
     
-    output_dir = os.path.join(proj_root, "d_outputs", "00_structured", "a_cost")
+    output_dir = os.path.join(proj_root, "d_outputs", "03_structured", "a_cost")
     
     config = {
         "model_summary": "gemini-2.5-pro",
@@ -27,7 +34,7 @@ def load_config():
     try:
         os.makedirs(output_dir, exist_ok=True)
         genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        client = genai.GenerativeModel(config["model_summary"])
+        client = CachedModel(genai.GenerativeModel(config["model_summary"]), llm_cache_from_env(os.path.join(proj_root, "d_outputs", "06_cache")))
         print("✅ Configurazione caricata e client AI inizializzato.")
         return config, client
     except Exception as e:
@@ -36,29 +43,6 @@ def load_config():
 
 # --- 2. FUNZIONI DI UTILITÀ ---
 
-def extract_articles_from_docx(file_path: str) -> dict:
-    print(f"📄 Estrazione testo degli articoli da: {os.path.basename(file_path)}")
-    try:
-        full_text = pypandoc.convert_file(file_path, 'plain', format='docx')
-        full_text = full_text.replace('\r\n', '\n') # Normalizzazione terminatori di riga
-    except Exception as e:
-        print(f"❌ ERRORE PANDOC durante la lettura del file di testo: {e}")
-        return {}
-    
-    pattern = r'(?m)^Art\.\s*(\d+)|^([IVXLCDM]+)$'
-    matches = list(re.finditer(pattern, full_text))
-    
-    articles_map = {}
-    for i, match in enumerate(matches):
-        article_id = match.group(1) or match.group(2)
-        start_pos = match.end()
-        end_pos = matches[i+1].start() if i + 1 < len(matches) else len(full_text)
-        article_text = full_text[start_pos:end_pos].strip()
-        articles_map[article_id] = article_text
-        
-    print(f"✅ Estratti {len(articles_map)} articoli/disposizioni dal testo.")
-    return articles_map
-
 def find_summary_nodes(nodes: list) -> list:
     """Funzione ricorsiva per trovare tutti i nodi 'foglia' (quelli con articoli)."""
     leaf_nodes = []
@@ -78,7 +62,7 @@ def generate_summaries():
     try:
         with open(config["input_structure_json"], 'r', encoding='utf-8') as f:
             structure_data = json.load(f)
-        articles_text_map = extract_articles_from_docx(config["input_text_docx"])
+        articles_text_map = load_articles(config["input_text_docx"], "cost")
     except FileNotFoundError as e:
         print(f"❌ ERRORE: File di input non trovato: {e}")
         return
@@ -105,10 +89,11 @@ def generate_summaries():
     if limit is not None:
         print(f"⚠️ ATTENZIONE: Esecuzione in modalità TEST. Verranno generati al massimo {limit} riassunti.")
     
-    generated_count = 0
+    # Selezione dei nodi da riassumere: quelli già presenti o senza testo vengono saltati
+    pending_nodes = []
     for node in nodes_to_summarize:
-        # Se il limite di test è stato raggiunto, interrompe il ciclo
-        if limit is not None and generated_count >= limit:
+        # Se il limite di test è stato raggiunto, interrompe la selezione
+        if limit is not None and len(pending_nodes) >= limit:
             print(f"\nℹ️ Limite di test ({limit}) raggiunto. Interruzione.")
             break
 
@@ -117,9 +102,6 @@ def generate_summaries():
             print(f"  -> Riassunto per '{node_title}' già presente. Salto.")
             continue
 
-        print(f"  -> Generazione riassunto per: '{node_title}'...")
-        generated_count += 1
-        
         full_node_text = "\n\n".join(
             f"Testo Articolo {art_id}:\n{articles_text_map.get(art_id, '')}"
             for art_id in node["articles"]
@@ -127,9 +109,12 @@ def generate_summaries():
         )
 
         if not full_node_text.strip():
-            print(f"     -> ATTENZIONE: Nessun testo trovato per gli articoli di questo nodo. Salto.")
+            print(f"  -> ATTENZIONE: Nessun testo trovato per gli articoli di '{node_title}'. Salto.")
             continue
+        pending_nodes.append((node_title, full_node_text))
 
+    def summarize(item: tuple) -> str:
+        node_title, full_node_text = item
         # Utilizzo del nuovo prompt migliorato
         prompt = (
             "Sei un giurista e un analista di testi normativi. Il tuo compito è leggere un insieme di articoli di legge e produrre un riassunto astratto e conciso del loro scopo collettivo.\n\n"
@@ -143,21 +128,23 @@ def generate_summaries():
             "**TESTO DEGLI ARTICOLI DA ANALIZZARE:**\n"
             f"{full_node_text}"
         )
-        
-        try:
-            response = client.generate_content(prompt)
-            new_summary = response.text.strip()
-            summaries_data["summaries"][node_title] = new_summary
-            
-            # Salva il progresso dopo ogni chiamata API
-            with open(config["output_summaries_json"], 'w', encoding='utf-8') as f:
-                json.dump(summaries_data, f, ensure_ascii=False, indent=2)
-            print(f"     ✅ Riassunto generato e salvato.")
-            time.sleep(2) # Pausa per rispettare i limiti API
-        except Exception as e:
-            print(f"     ❌ ERRORE durante la generazione del riassunto per '{node_title}': {e}")
-            break # Interrompe il ciclo in caso di errore API
+        return pool.generate(client, prompt).text.strip()
+
+    # Le chiamate partono in parallelo; i riassunti arrivano in ordine e vengono salvati uno per uno
+    pool = EnrichmentPool.from_env()
+    print(f"  -> {len(pending_nodes)} riassunti da generare con {pool.max_workers} worker.")
+    for (node_title, _), new_summary, error in pool.run_ordered(pending_nodes, summarize):
+        if error:
+            print(f"     ❌ ERRORE durante la generazione del riassunto per '{node_title}': {error}")
+            break # Interrompe il ciclo in caso di errore API non recuperabile
+
+        summaries_data["summaries"][node_title] = new_summary
+        # Salva il progresso dopo ogni riassunto
+        with open(config["output_summaries_json"], 'w', encoding='utf-8') as f:
+            json.dump(summaries_data, f, ensure_ascii=False, indent=2)
+        print(f"  ✅ Riassunto per '{node_title}' generato e salvato.")
 
+    print(f"📊 Chiamate LLM: {pool.summary()}")
     print("\n🎉 Processo di generazione riassunti terminato.")
 
 # --- 4. AVVIO ---
@@ -1,32 +1,54 @@
 import os
 import re
+import sys
 import json
-import time
-import pypandoc
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+# --- Setup del Percorso ---
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_enrichment import EnrichmentPool
+from g_src.g_general.utils_cache import CachedModel, llm_cache_from_env
+from g_src.g_general.utils_articles import load_articles
+from g_src.g_general.utils_checkpoint import JsonlCheckpoint
+from g_src.g_general.utils_segmentation import segment_commi, SegmentationReport
+from g_src.g_general.utils_batching import batch_size_from_env, group_into_windows, item_key, string_list_validator, generate_keyed
+
+# Commi per prompt delle keyword; 1 = una chiamata per comma
+BATCH_SIZE = batch_size_from_env()
+
+# Intestazione condivisa della modalità batch: istruzioni e riassunti delle sezioni compaiono una sola volta
+PROMPT_KEYWORDS_BATCH_HEADER = (
+    "Per ciascuno dei commi di legge elencati sotto, estrai da 5 a 10 parole chiave o brevi frasi chiave (massimo 3 parole). "
+    "Le parole chiave devono catturare gli aspetti legali, i soggetti e gli oggetti principali della norma. "
+    "Considera il contesto generale della sezione a cui appartiene ciascun comma.\n\n"
+    "**Contesti Generali delle Sezioni:**\n{contexts}"
+)
+
 # --- 1. CONFIGURAZIONE ---
 def load_config():
     """Carica le configurazioni e inizializza i client per il processo di generazione delle keyword."""
     proj_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     load_dotenv(os.path.join(proj_root, "a_chiavi", ".env"))
     
-    structured_dir = os.path.join(proj_root, "d_outputs", "00_structured", "a_cost")
+    structured_dir = os.path.join(proj_root, "d_outputs", "03_structured", "a_cost")
     
     config = {
         "model": "gemini-2.5-pro",
         "input_structure_json": os.path.join(structured_dir, "cost_structure.json"),
         "input_summaries_json": os.path.join(structured_dir, "cost_summaries.json"),
         "input_text_docx": os.path.join(proj_root, "b_testi", "a_cost", "cost_2023_22_10_testo.docx"),
-        "output_progress_json": os.path.join(structured_dir, "cost_keywords_progress.json"),
+        "output_progress_jsonl": os.path.join(structured_dir, "cost_keywords_progress.jsonl"),
         "output_final_json": os.path.join(structured_dir, "cost_keywords_data.json")
     }
     
     try:
         os.makedirs(structured_dir, exist_ok=True)
         genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        client = genai.GenerativeModel(config["model"])
+        client = CachedModel(genai.GenerativeModel(config["model"]), llm_cache_from_env(os.path.join(proj_root, "d_outputs", "06_cache")))
         print("✅ Configurazione caricata e client AI inizializzato.")
         return config, client
     except Exception as e:
@@ -35,29 +57,18 @@ def load_config():
 
 # --- 2. FUNZIONI DI UTILITÀ ---
 
-def extract_articles_from_docx(file_path: str) -> dict:
-    """Estrae il testo pulito degli articoli da un file DOCX."""
-    print(f"📄 Estrazione testo degli articoli da: {os.path.basename(file_path)}")
-    try:
-        full_text = pypandoc.convert_file(file_path, 'plain', format='docx')
-        full_text = full_text.replace('\r\n', '\n')
-    except Exception as e:
-        print(f"❌ ERRORE PANDOC: {e}")
-        return {}
-    
-    pattern = r'(?m)^Art\.\s*(\d+)|^([IVXLCDM]+)$'
-    matches = list(re.finditer(pattern, full_text))
-    
-    articles_map = {}
-    for i, match in enumerate(matches):
-        article_id = match.group(1) or match.group(2)
-        start_pos = match.end()
-        end_pos = matches[i+1].start() if i + 1 < len(matches) else len(full_text)
-        article_text = full_text[start_pos:end_pos].strip()
-        articles_map[article_id] = article_text
-        
-    print(f"✅ Estratti {len(articles_map)} articoli/disposizioni dal testo.")
-    return articles_map
+def estimate_commi(article_text: str) -> int:
+    """Numero di commi di un articolo (segmentazione a regole o, in mancanza, paragrafi non vuoti), usato per dimensionare le finestre."""
+    commi = segment_commi(article_text)
+    return len(commi) if commi else max(1, len([p for p in article_text.split("\n\n") if p.strip()]))
+
+def parse_json_array(text: str) -> list:
+    """Array JSON della risposta (anche dentro ```json ... ```); solleva un errore se manca o non è valido."""
+    cleaned_json_text = re.search(r'```json\s*(\[[\s\S]*?\])\s*```', text)
+    parsed = json.loads(cleaned_json_text.group(1) if cleaned_json_text else text)
+    if not isinstance(parsed, list):
+        raise ValueError("La risposta non è un array JSON.")
+    return parsed
 
 def find_leaf_nodes(nodes: list) -> list:
     """Funzione ricorsiva per trovare tutti i nodi 'foglia' (quelli con articoli)."""
@@ -80,7 +91,7 @@ def generate_keywords():
             structure_data = json.load(f)
         with open(config["input_summaries_json"], 'r', encoding='utf-8') as f:
             summaries_data = json.load(f).get("summaries", {})
-        articles_text_map = extract_articles_from_docx(config["input_text_docx"])
+        articles_text_map = load_articles(config["input_text_docx"], "cost")
     except FileNotFoundError as e:
         print(f"❌ ERRORE: File di input non trovato: {e}")
         return
@@ -89,33 +100,42 @@ def generate_keywords():
         print("❌ Impossibile procedere senza il testo degli articoli.")
         return
 
-    try:
-        with open(config["output_progress_json"], 'r', encoding='utf-8') as f:
-            enriched_data = json.load(f)
-        print(f"📄 File di progresso caricato. {len(enriched_data)} record presenti.")
-    except FileNotFoundError:
-        enriched_data = []
+    # Checkpoint JSONL (una riga per articolo): per riprendere bastano le chiavi
+    checkpoint = JsonlCheckpoint(config["output_progress_jsonl"])
+    if checkpoint.exists():
+        processed_articles = checkpoint.keys()
+        print(f"📄 File di progresso caricato. {len(processed_articles)} articoli presenti.")
+    else:
+        processed_articles = set()
         print("ℹ️  Nessun file di progresso trovato. Ne verrà creato uno nuovo.")
-
-    processed_articles = {record['articolo'] for record in enriched_data}
     
     leaf_nodes = find_leaf_nodes(structure_data.get("structure", []))
     article_to_nodetitle_map = {art_id: node["title"] for node in leaf_nodes for art_id in node["articles"]}
     all_articles_ids = list(articles_text_map.keys())
 
-    print("\n--- Inizio Processo di Segmentazione e Generazione Keyword ---")
-    for i, article_id in enumerate(all_articles_ids):
-        if article_id in processed_articles:
+    articles_to_process = []
+    for article_id in all_articles_ids:
+        if str(article_id) in processed_articles:
             print(f"  -> Articolo {article_id} già processato. Salto.")
-            continue
-
-        print(f"  -> Processo Articolo {article_id} ({i+1}/{len(all_articles_ids)})")
-        article_text = articles_text_map.get(article_id)
-
-        if not article_text:
-            print(f"     -> ATTENZIONE: Testo per l'articolo {article_id} non trovato. Salto.")
-            continue
-        
+        elif not articles_text_map.get(article_id):
+            print(f"  -> ATTENZIONE: Testo per l'articolo {article_id} non trovato. Salto.")
+        else:
+            articles_to_process.append(article_id)
+
+    segmentation = SegmentationReport()
+
+    def segment_article(article_id: str) -> list:
+        """
+        Divide il testo di un articolo in commi (lista di {'comma', 'testo'}) con le regole
+        deterministiche; l'LLM viene chiamato solo se la segmentazione non supera la validazione.
+        """
+        article_text = articles_text_map[article_id]
+        commi = segment_commi(article_text)
+        segmentation.record(article_id, used_fallback=commi is None)
+        if commi is not None:
+            return commi
+
+        print(f"     ↪ Art. {article_id}: struttura dei commi non riconosciuta, segmentazione con l'LLM.")
         prompt_commi = (
             "Sei un assistente legale. Dividi il seguente testo di un articolo di legge in commi numerati. Ogni comma deve essere un oggetto JSON separato in una lista. "
             "Ogni oggetto deve avere due chiavi: 'comma' (il numero del comma come stringa, es. '1', '2') e 'testo' (il testo completo del comma).\n"
@@ -123,53 +143,91 @@ def generate_keywords():
             f"--- TESTO ARTICOLO ---\n{article_text}"
         )
 
-        try:
-            response_commi = client.generate_content(prompt_commi)
-            cleaned_json_text = re.search(r'```json\s*(\[[\s\S]*?\])\s*```', response_commi.text)
-            commi_list = json.loads(cleaned_json_text.group(1) if cleaned_json_text else response_commi.text)
-
-            temp_article_chunks = []
-            for comma_item in commi_list:
-                comma_num = comma_item.get("comma")
-                comma_text = comma_item.get("testo")
-                
-                parent_node_title = article_to_nodetitle_map.get(article_id, "Contesto Generale")
-                context_summary = summaries_data.get(parent_node_title, "")
-
-                prompt_keywords = (
-                    "Estrai da 5 a 10 parole chiave o brevi frasi chiave (massimo 3 parole) dal seguente testo di un comma di legge. "
-                    "Le parole chiave devono catturare gli aspetti legali, i soggetti e gli oggetti principali della norma. Considera il contesto generale fornito.\n"
-                    f"**Contesto Generale della Sezione ({parent_node_title}):**\n{context_summary}\n\n"
-                    f"**Testo del Comma:**\n{comma_text}\n\n"
-                    "Restituisci SOLO un array JSON di stringhe."
-                )
-                
-                response_keywords = client.generate_content(prompt_keywords)
-                cleaned_kw_text = re.search(r'```json\s*(\[[\s\S]*?\])\s*```', response_keywords.text)
-                keywords = json.loads(cleaned_kw_text.group(1) if cleaned_kw_text else response_keywords.text)
-                
-                temp_article_chunks.append({
-                    "articolo": article_id,
-                    "comma": comma_num,
-                    "testo_originale_comma": comma_text,
-                    "keywords": keywords
-                })
-                print(f"     - Comma {comma_num} processato.")
-            
-            enriched_data.extend(temp_article_chunks)
-            with open(config["output_progress_json"], 'w', encoding='utf-8') as f:
-                json.dump(enriched_data, f, ensure_ascii=False, indent=2)
-            print(f"     ✅ Progresso per Art. {article_id} salvato.")
-
-            time.sleep(2)
-        except Exception as e:
-            print(f"     ❌ ERRORE durante il processo dell'articolo {article_id}: {e}")
+        # La risposta entra nella cache solo se il JSON è valido
+        response_commi = pool.generate(client, prompt_commi, validate=parse_json_array)
+        return parse_json_array(response_commi.text)
+
+    def comma_keywords(article_id: str, comma_text: str) -> list:
+        """Modalità classica: una chiamata per comma."""
+        parent_node_title = article_to_nodetitle_map.get(article_id, "Contesto Generale")
+        context_summary = summaries_data.get(parent_node_title, "")
+
+        prompt_keywords = (
+            "Estrai da 5 a 10 parole chiave o brevi frasi chiave (massimo 3 parole) dal seguente testo di un comma di legge. "
+            "Le parole chiave devono catturare gli aspetti legali, i soggetti e gli oggetti principali della norma. Considera il contesto generale fornito.\n"
+            f"**Contesto Generale della Sezione ({parent_node_title}):**\n{context_summary}\n\n"
+            f"**Testo del Comma:**\n{comma_text}\n\n"
+            "Restituisci SOLO un array JSON di stringhe."
+        )
+
+        response_keywords = pool.generate(client, prompt_keywords, validate=parse_json_array)
+        return parse_json_array(response_keywords.text)
+
+    def batched_keywords(commi: list) -> list:
+        """Modalità batch: le keyword di tutti i commi (articolo, comma, testo) in un solo prompt."""
+        keys = [f"{item_key(article_id, comma_num)}_{i}" for i, (article_id, comma_num, _) in enumerate(commi)]
+        sections = dict.fromkeys(article_to_nodetitle_map.get(article_id, "Contesto Generale") for article_id, _, _ in commi)
+        contexts = "\n".join(f"- {title}: {summaries_data.get(title, '')}" for title in sections)
+        items = {
+            key: f"(Sezione: {article_to_nodetitle_map.get(article_id, 'Contesto Generale')})\n{comma_text}"
+            for key, (article_id, _, comma_text) in zip(keys, commi)
+        }
+        keywords_by_key = generate_keyed(pool, client, PROMPT_KEYWORDS_BATCH_HEADER.format(contexts=contexts), items, string_list_validator())
+        return [keywords_by_key[key] for key in keys]
+
+    def process_window(article_ids: list) -> dict:
+        """Segmenta gli articoli della finestra e genera le keyword di tutti i loro commi."""
+        commi = [
+            (article_id, comma_item.get("comma"), comma_item.get("testo"))
+            for article_id in article_ids
+            for comma_item in segment_article(article_id)
+        ]
+        if BATCH_SIZE > 1:
+            keywords_list = batched_keywords(commi)
+        else:
+            keywords_list = [comma_keywords(article_id, comma_text) for article_id, _, comma_text in commi]
+
+        results = {article_id: [] for article_id in article_ids}
+        for (article_id, comma_num, comma_text), keywords in zip(commi, keywords_list):
+            results[article_id].append({
+                "articolo": article_id,
+                "comma": comma_num,
+                "testo_originale_comma": comma_text,
+                "keywords": keywords
+            })
+        return results
+
+    # Finestre di articoli consecutivi (commi stimati dai paragrafi del testo); in modalità classica un articolo per finestra
+    if BATCH_SIZE > 1:
+        windows = group_into_windows([(aid, estimate_commi(articles_text_map[aid])) for aid in articles_to_process], BATCH_SIZE)
+    else:
+        windows = [[aid] for aid in articles_to_process]
+
+    # Le finestre vengono elaborate in parallelo ma salvate in ordine, un articolo alla volta
+    pool = EnrichmentPool.from_env()
+    print(f"\n--- Inizio Processo di Segmentazione e Generazione Keyword ({len(articles_to_process)} articoli in {len(windows)} finestre, {pool.max_workers} worker) ---")
+    saved_articles = 0
+    for window, results, error in pool.run_ordered(windows, process_window):
+        if error:
+            print(f"     ❌ ERRORE durante il processo degli articoli {', '.join(map(str, window))}: {error}")
             print("         Interruzione del processo. Rilanciare per riprendere.")
+            print(f"📊 Chiamate LLM: {pool.summary()}")
+            print(f"✂️  Segmentazione: {segmentation.summary()}")
             return
 
-    # Se il ciclo si completa, rinomina il file di progresso in quello finale
-    if os.path.exists(config["output_progress_json"]):
-        os.rename(config["output_progress_json"], config["output_final_json"])
+        for article_id in window:
+            checkpoint.append([(article_id, results[article_id])])
+            saved_articles += 1
+            print(f"  ✅ Art. {article_id} ({saved_articles}/{len(articles_to_process)}): {len(results[article_id])} commi processati e salvati.")
+
+    print(f"📊 Chiamate LLM: {pool.summary()}")
+    print(f"✂️  Segmentazione: {segmentation.summary()}")
+
+    # Se il ciclo si completa, il checkpoint viene compattato nel file finale
+    if not checkpoint.exists():
+        print("\nℹ️  Nessun nuovo articolo elaborato.")
+        return
+    enriched_data = checkpoint.compact(config["output_final_json"], flatten=True)
 
     print("\n🎉 Arricchimento completato!")
     print(f"✅ Creati {len(enriched_data)} record con keyword.")
@@ -5,8 +5,8 @@ import json
 def load_paths():
     """Definisce e restituisce tutti i percorsi necessari per la creazione dei chunk."""
     proj_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    structured_dir = os.path.join(proj_root, "d_outputs", "00_structured", "a_cost")
-    chunks_dir = os.path.join(proj_root, "d_outputs", "01_chunks", "a_cost")
+    structured_dir = os.path.join(proj_root, "d_outputs", "03_structured", "a_cost")
+    chunks_dir = os.path.join(proj_root, "d_outputs", "04_chunks", "a_cost")
     
     os.makedirs(chunks_dir, exist_ok=True)
     
@@ -1,23 +1,32 @@
 import os
+import sys
 import json
 import time
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+# --- Setup del Percorso ---
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_checkpoint import JsonlCheckpoint, reopen_checkpoint
+
 # --- 1. CONFIGURAZIONE ---
 def load_config_and_clients():
     """Carica configurazioni, percorsi e inizializza il client AI."""
     proj_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     load_dotenv(os.path.join(proj_root, "a_chiavi", ".env"))
     
-    chunks_dir = os.path.join(proj_root, "d_outputs", "01_chunks", "a_cost")
-    embeddings_dir = os.path.join(proj_root, "d_outputs", "02_embeddings", "a_cost")
+    chunks_dir = os.path.join(proj_root, "d_outputs", "04_chunks", "a_cost")
+    embeddings_dir = os.path.join(proj_root, "d_outputs", "05_embeddings", "a_cost")
     os.makedirs(embeddings_dir, exist_ok=True)
     
     config = {
         "embedding_model": "text-embedding-004",
         "input_chunks_file": os.path.join(chunks_dir, "cost_chunks.json"),
-        "output_embeddings_file": os.path.join(embeddings_dir, "cost_embeddings.json")
+        "output_embeddings_file": os.path.join(embeddings_dir, "cost_embeddings.json"),
+        "output_progress_jsonl": os.path.join(embeddings_dir, "cost_embeddings_progress.jsonl")
     }
     
     try:
@@ -47,11 +56,23 @@ def generate_embeddings():
         print(f"❌ ERRORE: Impossibile decodificare il JSON dal file dei chunk.")
         return
 
-    embeddings_data = []
+    # Ripresa: i chunk già presenti nel checkpoint JSONL (o nel file di output) non vengono ricalcolati
+    chunk_key = lambda c: f"art_{c.get('articolo')}_comma_{c.get('comma')}"
+    checkpoint = JsonlCheckpoint(config["output_progress_jsonl"])
+    if not checkpoint.exists() and os.path.exists(config["output_embeddings_file"]):
+        try:
+            reopen_checkpoint(config["output_embeddings_file"], checkpoint, chunk_key)
+        except json.JSONDecodeError:
+            print("⚠️  WARNING: File di output corrotto. Ripartenza da zero.")
+    processed_chunk_ids = checkpoint.keys()
+    if processed_chunk_ids:
+        print(f"ℹ️  Recuperati {len(processed_chunk_ids)} embedding già generati.")
     
     print("\n--- Inizio Processo di Generazione Embedding ---")
     total_chunks = len(chunks_data)
     for i, chunk in enumerate(chunks_data):
+        if chunk_key(chunk) in processed_chunk_ids:
+            continue
         # Costruisce il testo da vettorializzare, combinando metadati e contenuto
         text_to_embed = (
             f"Titolo del Documento: {chunk.get('document_title', '')}. "
@@ -73,7 +94,7 @@ def generate_embeddings():
             embedding_vector = result['embedding']
             
             chunk['embedding'] = embedding_vector
-            embeddings_data.append(chunk)
+            checkpoint.append([(chunk_key(chunk), chunk)])
             
             print(f"  -> Embedding generato per chunk #{i+1}/{total_chunks} (Art. {chunk.get('articolo')}, Comma {chunk.get('comma')})")
             
@@ -83,15 +104,14 @@ def generate_embeddings():
         except Exception as e:
             print(f"❌ ERRORE durante la generazione dell'embedding per il chunk #{i+1}: {e}")
             print("    Interruzione del processo.")
-            if embeddings_data:
-                partial_save_path = config["output_embeddings_file"].replace(".json", "_PARTIAL.json")
-                with open(partial_save_path, "w", encoding="utf-8") as f:
-                    json.dump(embeddings_data, f, ensure_ascii=False, indent=2)
-                print(f"    ⚠️ Salvataggio parziale effettuato in: {partial_save_path}")
+            if checkpoint.exists():
+                print(f"    ⚠️ Progressi parziali salvati in: {config['output_progress_jsonl']} (rilanciare per riprendere)")
             return
-            
-    with open(config["output_embeddings_file"], "w", encoding="utf-8") as f:
-        json.dump(embeddings_data, f, ensure_ascii=False, indent=2)
+
+    if not checkpoint.exists():
+        print("ℹ️  Nessun chunk da elaborare.")
+        return
+    embeddings_data = checkpoint.compact(config["output_embeddings_file"])
 
     print(f"\n🎉 Generazione embedding completata!")
     print(f"✅ Generati {len(embeddings_data)} vettori.")
@@ -1,25 +1,35 @@
 import os
+import sys
 import json
 import uuid
 from qdrant_client import QdrantClient, models
 from dotenv import load_dotenv
 
+# --- Setup del Percorso ---
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_cache import record_ingest_version
+from g_src.g_general.utils_qdrant import make_qdrant_client
+
 def load_config_and_client():
     """Carica configurazioni, percorsi e inizializza il client Qdrant."""
     proj_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     load_dotenv(os.path.join(proj_root, "a_chiavi", ".env"))
     
-    embeddings_dir = os.path.join(proj_root, "d_outputs", "02_embeddings", "a_cost")
+    embeddings_dir = os.path.join(proj_root, "d_outputs", "05_embeddings", "a_cost")
     
     config = {
         "qdrant_url": os.getenv("QDRANT_HOST"),
         "qdrant_api_key": os.getenv("QDRANT_API_KEY"),
         "qdrant_collection_name": "regcam_v11",
-        "input_embeddings_file": os.path.join(embeddings_dir, "cost_embeddings.json")
+        "input_embeddings_file": os.path.join(embeddings_dir, "cost_embeddings.json"),
+        "ingest_manifest_path": os.path.join(proj_root, "d_outputs", "05_embeddings", "ingest_manifest.json")
     }
     
     try:
-        client = QdrantClient(url=config["qdrant_url"], api_key=config["qdrant_api_key"])
+        client = make_qdrant_client(config["qdrant_url"], config["qdrant_api_key"], os.getenv("QDRANT_TRANSPORT", "rest"), int(os.getenv("QDRANT_GRPC_PORT", "6334")))
         print("✅ Connessione a Qdrant riuscita.")
         return config, client
     except Exception as e:
@@ -94,6 +104,7 @@ def ingest_data_to_qdrant():
     try:
         client.upsert(collection_name=collection_name, points=points_to_upload, wait=True)
         print(f"✅ Ingest completato con successo.")
+        record_ingest_version(config["ingest_manifest_path"], collection_name, note=f"ingest '{document_title_to_check}'")
     except Exception as e:
         print(f"❌ ERRORE durante l'operazione di upsert: {e}")
         return
@@ -1,11 +1,20 @@
 import os
+import sys
 import re
 import json
 import time
-import pypandoc
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+# --- Setup del Percorso ---
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_cache import CachedModel, llm_cache_from_env
+from g_src.g_general.utils_articles import load_articles
+from g_src.g_general.utils_segmentation import segment_commi, SegmentationReport
+
 # --- 1. CONFIGURAZIONE SPECIFICA PER IL TEST SULLA COSTITUZIONE ---
 def load_config():
     """Carica le configurazioni per il processo di test sulla Costituzione."""
@@ -16,19 +25,21 @@ def load_config():
     config = {
         "model": "gemini-2.5-pro", # Modello corretto
         "model_summary": "gemini-2.5-pro",
-        "input_structure_json": os.path.join(proj_root, "d_outputs", "00_structured", "a_cost", "cost_structure.json"),
+        "input_structure_json": os.path.join(proj_root, "d_outputs", "03_structured", "a_cost", "cost_structure.json"),
         "input_text_docx": os.path.join(proj_root, "b_testi", "a_cost", "cost_2023_22_10_testo.docx"),
-        "output_dir": os.path.join(proj_root, "d_outputs", "00_structured", "a_cost"),
-        "output_summaries_json": os.path.join(proj_root, "d_outputs", "00_structured", "a_cost", "cost_summaries.json"),
-        "output_enriched_json": os.path.join(proj_root, "d_outputs", "00_structured", "a_cost", "cost_enriched_data.json")
+        "output_dir": os.path.join(proj_root, "d_outputs", "03_structured", "a_cost"),
+        "output_summaries_json": os.path.join(proj_root, "d_outputs", "03_structured", "a_cost", "cost_summaries.json"),
+        "output_enriched_json": os.path.join(proj_root, "d_outputs", "03_structured", "a_cost", "cost_enriched_data.json")
     }
     
     try:
         os.makedirs(config["output_dir"], exist_ok=True)
         genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        # Cache delle risposte condivisa con gli script della pipeline: i prompt identici non vengono ripetuti
+        llm_cache = llm_cache_from_env(os.path.join(proj_root, "d_outputs", "06_cache"))
         clients = {
-            "default": genai.GenerativeModel(config["model"]),
-            "summary": genai.GenerativeModel(config["model_summary"])
+            "default": CachedModel(genai.GenerativeModel(config["model"]), llm_cache),
+            "summary": CachedModel(genai.GenerativeModel(config["model_summary"]), llm_cache)
         }
         print("✅ Configurazione caricata e client AI inizializzato.")
         return config, clients
@@ -38,31 +49,13 @@ def load_config():
 
 # --- 2. FUNZIONI DI ESTRAZIONE E ANALISI TESTO (INVARIATE) ---
 
-def extract_articles_from_docx(file_path: str) -> dict:
-    """Estrae il testo da un DOCX e lo mappa in un dizionario per articolo/disposizione."""
-    print(f"📄 Estrazione testo degli articoli da: {os.path.basename(file_path)}")
-    try:
-        full_text = pypandoc.convert_file(file_path, 'plain', format='docx')
-    except Exception as e:
-        print(f"❌ ERRORE PANDOC durante la lettura del file di testo: {e}")
-        return {}
-    
-    pattern = r'(?m)^(Art\.\s*(\d+)|([IVXLCDM]+))$'
-    matches = list(re.finditer(pattern, full_text))
-    
-    articles_map = {}
-    for i, match in enumerate(matches):
-        article_id_raw = match.group(0)
-        article_id = article_id_raw.replace("Art.", "").strip()
-
-        start_pos = match.end()
-        end_pos = matches[i+1].start() if i + 1 < len(matches) else len(full_text)
-        
-        article_text = full_text[start_pos:end_pos].strip()
-        articles_map[article_id] = article_text
-        
-    print(f"✅ Estratti {len(articles_map)} articoli/disposizioni dal testo.")
-    return articles_map
+def parse_json_array(text: str) -> list:
+    """Array JSON della risposta (anche dentro ```json ... ```); solleva un errore se manca o non è valido."""
+    cleaned_json_text = re.search(r'```json\s*(\[[\s\S]*?\])\s*```', text)
+    parsed = json.loads(cleaned_json_text.group(1) if cleaned_json_text else text)
+    if not isinstance(parsed, list):
+        raise ValueError("La risposta non è un array JSON.")
+    return parsed
 
 def find_summary_nodes(nodes: list) -> list:
     """Funzione ricorsiva per trovare tutti i nodi 'foglia' per cui generare un riassunto."""
@@ -87,7 +80,7 @@ def run_enrichment_pipeline():
     try:
         with open(config["input_structure_json"], 'r', encoding='utf-8') as f:
             structure_data = json.load(f)
-        articles_text_map = extract_articles_from_docx(config["input_text_docx"])
+        articles_text_map = load_articles(config["input_text_docx"], "cost")
     except FileNotFoundError as e:
         print(f"❌ ERRORE: File di input non trovato: {e}")
         return
@@ -157,6 +150,7 @@ def run_enrichment_pipeline():
             article_to_nodetitle_map[art_id] = node["title"]
 
     enriched_data = []
+    segmentation = SegmentationReport()
     # --- MODIFICA CHIAVE: Limita l'esecuzione ai primi 10 articoli ---
     articles_to_process = [str(i) for i in range(1, 11)]
 
@@ -168,18 +162,21 @@ def run_enrichment_pipeline():
             print(f"     -> ATTENZIONE: Testo per l'articolo {article_id} non trovato. Salto.")
             continue
         
-        prompt_commi = (
-            "Sei un assistente legale. Dividi il seguente testo di un articolo di legge in commi numerati. Ogni comma deve essere un oggetto JSON separato in una lista. "
-            "Ogni oggetto deve avere due chiavi: 'comma' (il numero del comma come stringa, es. '1', '2') e 'testo' (il testo completo del comma).\n"
-            "Restituisci SOLO l'array JSON.\n\n"
-            f"--- TESTO ARTICOLO ---\n{article_text}"
-        )
-
         try:
-            response_commi = clients["default"].generate_content(prompt_commi)
-            # Aggiungo un controllo più robusto sul parsing del JSON
-            cleaned_json_text = re.search(r'```json\s*(\[[\s\S]*?\])\s*```', response_commi.text)
-            commi_list = json.loads(cleaned_json_text.group(1) if cleaned_json_text else response_commi.text)
+            # Segmentazione a regole; l'LLM solo se la struttura dei commi non viene riconosciuta
+            commi_list = segment_commi(article_text)
+            segmentation.record(article_id, used_fallback=commi_list is None)
+            if commi_list is None:
+                print(f"     ↪ Struttura dei commi non riconosciuta, segmentazione con l'LLM.")
+                prompt_commi = (
+                    "Sei un assistente legale. Dividi il seguente testo di un articolo di legge in commi numerati. Ogni comma deve essere un oggetto JSON separato in una lista. "
+                    "Ogni oggetto deve avere due chiavi: 'comma' (il numero del comma come stringa, es. '1', '2') e 'testo' (il testo completo del comma).\n"
+                    "Restituisci SOLO l'array JSON.\n\n"
+                    f"--- TESTO ARTICOLO ---\n{article_text}"
+                )
+                # La risposta entra nella cache solo se il JSON è valido
+                response_commi = clients["default"].generate_content(prompt_commi, validate=parse_json_array)
+                commi_list = parse_json_array(response_commi.text)
 
             for comma_item in commi_list:
                 comma_num = comma_item.get("comma")
@@ -196,9 +193,8 @@ def run_enrichment_pipeline():
                     "Restituisci SOLO un array JSON di stringhe."
                 )
                 
-                response_keywords = clients["default"].generate_content(prompt_keywords)
-                cleaned_kw_text = re.search(r'```json\s*(\[[\s\S]*?\])\s*```', response_keywords.text)
-                keywords = json.loads(cleaned_kw_text.group(1) if cleaned_kw_text else response_keywords.text)
+                response_keywords = clients["default"].generate_content(prompt_keywords, validate=parse_json_array)
+                keywords = parse_json_array(response_keywords.text)
                 
                 enriched_data.append({
                     "articolo": article_id,
@@ -218,6 +214,7 @@ def run_enrichment_pipeline():
 
     print("\n🎉 Arricchimento di TEST completato!")
     print(f"✅ Creati {len(enriched_data)} record arricchiti per 10 articoli.")
+    print(f"✂️  Segmentazione: {segmentation.summary()}")
     print(f"📁 File di test salvato in: {test_output_path}")
 
 # --- 4. AVVIO ---
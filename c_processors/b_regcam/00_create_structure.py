@@ -1,17 +1,25 @@
 import os
+import sys
 import re
 import json
 import pypandoc
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+# --- Setup del Percorso ---
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_cache import CachedModel, llm_cache_from_env
+
 # --- 1. CONFIGURAZIONE ---
 def load_config():
     """Carica le configurazioni per il processo del Regolamento Camera."""
     proj_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     load_dotenv(os.path.join(proj_root, "a_chiavi", ".env"))
     
-    output_dir = os.path.join(proj_root, "d_outputs", "00_structured", "b_regcam")
+    output_dir = os.path.join(proj_root, "d_outputs", "03_structured", "b_regcam")
     
     config = {
         "model": "gemini-2.5-pro",
@@ -23,7 +31,7 @@ def load_config():
     try:
         os.makedirs(config["output_dir"], exist_ok=True)
         genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        client = genai.GenerativeModel(config["model"])
+        client = CachedModel(genai.GenerativeModel(config["model"]), llm_cache_from_env(os.path.join(proj_root, "d_outputs", "06_cache")))
         print("✅ Configurazione caricata e client AI inizializzato.")
         return config, client
     except Exception as e:
@@ -83,7 +91,8 @@ def create_structure_file(config, client):
 
     try:
         print("🧠 Invio indice del Regolamento all'IA per l'analisi strutturale...")
-        response = client.generate_content(prompt)
+        # La risposta entra nella cache solo se contiene un JSON valido
+        response = client.generate_content(prompt, validate=lambda text: json.loads(clean_json_from_text(text)))
         json_text = clean_json_from_text(response.text)
         
         print("✅ Analisi AI completata. Tento il parsing del JSON...")
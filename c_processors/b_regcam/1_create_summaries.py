@@ -1,18 +1,25 @@
 import os
-import re
+import sys
 import json
-import time
-import pypandoc
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+# --- Setup del Percorso ---
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_enrichment import EnrichmentPool
+from g_src.g_general.utils_cache import CachedModel, llm_cache_from_env
+from g_src.g_general.utils_articles import load_articles
+
 # --- 1. CONFIGURAZIONE ---
 def load_config():
     """Carica le configurazioni per il processo di generazione dei riassunti del Regolamento."""
     proj_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     load_dotenv(os.path.join(proj_root, "a_chiavi", ".env"))
     
-    output_dir = os.path.join(proj_root, "d_outputs", "00_structured", "b_regcam")
+    output_dir = os.path.join(proj_root, "d_outputs", "03_structured", "b_regcam")
     
     config = {
         "model_summary": "gemini-2.5-pro",
@@ -26,7 +33,7 @@ def load_config():
     try:
         os.makedirs(output_dir, exist_ok=True)
         genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        client = genai.GenerativeModel(config["model_summary"])
+        client = CachedModel(genai.GenerativeModel(config["model_summary"]), llm_cache_from_env(os.path.join(proj_root, "d_outputs", "06_cache")))
         print("✅ Configurazione caricata e client AI inizializzato.")
         return config, client
     except Exception as e:
@@ -35,38 +42,6 @@ def load_config():
 
 # --- 2. FUNZIONI DI UTILITÀ ---
 
-def extract_articles_from_docx(file_path: str) -> dict:
-    """Estrae il testo degli articoli dal DOCX del Regolamento."""
-    print(f"📄 Estrazione testo degli articoli da: {os.path.basename(file_path)}")
-    try:
-        full_text = pypandoc.convert_file(file_path, 'plain', format='docx')
-        full_text = full_text.replace('\r\n', '\n')
-
-        # --- RIGHE DA AGGIUNGERE PER IL DEBUG ---
-        print("\n--- INIZIO OUTPUT GREZZO PANDOC (REGOLAMENTO) ---")
-        print(repr(full_text[:1000])) # Stampiamo i primi 1000 caratteri
-        print("--- FINE OUTPUT GREZZO PANDOC (REGOLAMENTO) ---\n")
-        # --- FINE RIGHE DA AGGIUNGERE ---
-
-    except Exception as e:
-        print(f"❌ ERRORE PANDOC: {e}")
-        return {}
-    
-    # Pattern per trovare "Articolo [numero]"
-    pattern = r'(?m)^ART\.\s+(\d+(?:-bis|-ter|-quater|-quinquies|-sexies)?)'
-    matches = list(re.finditer(pattern, full_text, re.IGNORECASE))
-    
-    articles_map = {}
-    for i, match in enumerate(matches):
-        article_id = match.group(1)
-        start_pos = match.start() # Includiamo "Articolo X" nel testo
-        end_pos = matches[i+1].start() if i + 1 < len(matches) else len(full_text)
-        article_text = full_text[start_pos:end_pos].strip()
-        articles_map[article_id] = article_text
-        
-    print(f"✅ Estratti {len(articles_map)} articoli dal testo.")
-    return articles_map
-
 def find_leaf_nodes(nodes: list) -> list:
     """Funzione ricorsiva per trovare tutti i nodi 'foglia' (quelli con articoli)."""
     leaf_nodes = []
@@ -86,7 +61,7 @@ def generate_summaries():
     try:
         with open(config["input_structure_json"], 'r', encoding='utf-8') as f:
             structure_data = json.load(f)
-        articles_text_map = extract_articles_from_docx(config["input_text_docx"])
+        articles_text_map = load_articles(config["input_text_docx"], "regcam")
     except FileNotFoundError as e:
         print(f"❌ ERRORE: File di input non trovato: {e}")
         return
@@ -112,9 +87,10 @@ def generate_summaries():
     if limit is not None:
         print(f"⚠️ ATTENZIONE: Esecuzione in modalità TEST. Verranno generati al massimo {limit} riassunti.")
     
-    generated_count = 0
+    # Selezione dei nodi da riassumere: quelli già presenti o senza testo vengono saltati
+    pending_nodes = []
     for node in nodes_to_summarize:
-        if limit is not None and generated_count >= limit:
+        if limit is not None and len(pending_nodes) >= limit:
             print(f"\nℹ️ Limite di test ({limit}) raggiunto. Interruzione.")
             break
 
@@ -123,9 +99,6 @@ def generate_summaries():
             print(f"  -> Riassunto per '{node_title}' già presente. Salto.")
             continue
 
-        print(f"  -> Generazione riassunto per: '{node_title}'...")
-        generated_count += 1
-        
         full_node_text = "\n\n".join(
             articles_text_map.get(art_id, '')
             for art_id in node["articles"]
@@ -133,9 +106,12 @@ def generate_summaries():
         )
 
         if not full_node_text.strip():
-            print(f"     -> ATTENZIONE: Nessun testo trovato per gli articoli di questo nodo. Salto.")
+            print(f"  -> ATTENZIONE: Nessun testo trovato per gli articoli di '{node_title}'. Salto.")
             continue
+        pending_nodes.append((node_title, full_node_text))
 
+    def summarize(item: tuple) -> str:
+        node_title, full_node_text = item
         # Utilizzo del prompt migliorato e definitivo
         prompt = (
             "Sei un giurista e un analista di testi normativi. Il tuo compito è leggere un insieme di articoli di legge e produrre un riassunto astratto e conciso del loro scopo collettivo.\n\n"
@@ -149,20 +125,21 @@ def generate_summaries():
             "**TESTO DEGLI ARTICOLI DA ANALIZZARE:**\n"
             f"{full_node_text}"
         )
-        
-        try:
-            response = client.generate_content(prompt)
-            new_summary = response.text.strip()
-            summaries_data["summaries"][node_title] = new_summary
-            
-            with open(config["output_summaries_json"], 'w', encoding='utf-8') as f:
-                json.dump(summaries_data, f, ensure_ascii=False, indent=2)
-            print(f"     ✅ Riassunto generato e salvato.")
-            time.sleep(2)
-        except Exception as e:
-            print(f"     ❌ ERRORE durante la generazione del riassunto per '{node_title}': {e}")
+        return pool.generate(client, prompt).text.strip()
+
+    pool = EnrichmentPool.from_env()
+    print(f"  -> {len(pending_nodes)} riassunti da generare con {pool.max_workers} worker.")
+    for (node_title, _), new_summary, error in pool.run_ordered(pending_nodes, summarize):
+        if error:
+            print(f"     ❌ ERRORE durante la generazione del riassunto per '{node_title}': {error}")
             break
 
+        summaries_data["summaries"][node_title] = new_summary
+        with open(config["output_summaries_json"], 'w', encoding='utf-8') as f:
+            json.dump(summaries_data, f, ensure_ascii=False, indent=2)
+        print(f"  ✅ Riassunto per '{node_title}' generato e salvato.")
+
+    print(f"📊 Chiamate LLM: {pool.summary()}")
     print("\n🎉 Processo di generazione riassunti terminato.")
 
 # --- 4. AVVIO ---
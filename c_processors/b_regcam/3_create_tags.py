@@ -9,11 +9,18 @@ lavorando con un file di progresso separato per garantire robustezza,
 efficienza e il mantenimento dell'ordine originale dei dati.
 
 Logica di Robustezza Implementata:
-- Usa un file `_progress.json` per salvare i risultati intermedi.
-- All'avvio, carica i progressi e salta gli articoli già completati.
+- Usa un checkpoint `_progress.jsonl` append-only per i risultati intermedi
+  (una riga per articolo, sincronizzata su disco: costo costante per salvataggio).
+- All'avvio, legge solo le chiavi del checkpoint e salta gli articoli già completati.
 - Salva i dati dopo aver processato tutti i commi di un intero articolo.
-- Se il processo si completa, rinomina il file di progresso in quello finale.
+- Se il processo si completa, compatta il checkpoint nel file finale.
 - Mantiene un "Circuit Breaker" per interrompersi dopo errori API consecutivi.
+- Elabora più articoli in parallelo tramite il pool di arricchimento condiviso
+  (budget di richieste/token al minuto, backoff con jitter sugli errori 429/5xx),
+  salvando comunque i risultati nell'ordine originale, un articolo alla volta.
+- In modalità batch (ENRICHMENT_BATCH_SIZE > 1) i commi di più articoli consecutivi
+  vanno in un solo prompt, con lista dei tag e riassunti delle sezioni una sola volta;
+  solo i commi mancanti o non validi nella risposta vengono richiesti di nuovo.
 
 INPUT:
 - d_outputs/03_structured/b_regcam/regcam_keywords_data.json
@@ -28,7 +35,6 @@ import sys
 import json
 import google.generativeai as genai
 from dotenv import load_dotenv
-import time
 import re
 from collections import defaultdict
 
@@ -38,6 +44,11 @@ project_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+from g_src.g_general.utils_enrichment import EnrichmentPool
+from g_src.g_general.utils_cache import CachedModel, llm_cache_from_env
+from g_src.g_general.utils_checkpoint import JsonlCheckpoint
+from g_src.g_general.utils_batching import batch_size_from_env, group_into_windows, item_key, string_list_validator, generate_keyed
+
 # --- Caricamento Configurazione ---
 env_path = os.path.join(project_root, "a_chiavi", ".env")
 load_dotenv(dotenv_path=env_path)
@@ -46,11 +57,13 @@ load_dotenv(dotenv_path=env_path)
 STRUCTURED_DIR = os.path.join(project_root, "d_outputs", "03_structured", "b_regcam")
 INPUT_KEYWORDS_PATH = os.path.join(STRUCTURED_DIR, "regcam_keywords_data.json")
 INPUT_SUMMARIES_PATH = os.path.join(STRUCTURED_DIR, "regcam_summaries.json")
-OUTPUT_PROGRESS_PATH = os.path.join(STRUCTURED_DIR, "regcam_tags_progress.json")
+OUTPUT_PROGRESS_PATH = os.path.join(STRUCTURED_DIR, "regcam_tags_progress.jsonl")
 OUTPUT_FINAL_PATH = os.path.join(STRUCTURED_DIR, "regcam_tags_data.json")
+CACHE_DIR = os.path.join(project_root, "d_outputs", "06_cache")
 
 # --- Costanti ---
 CONSECUTIVE_ERROR_LIMIT = 5
+BATCH_SIZE = batch_size_from_env() # Commi per prompt; 1 = una chiamata per comma
 
 # --- Prompt Engineering ---
 TAGS_POSSIBILI = [
@@ -77,6 +90,22 @@ Analizza attentamente il testo fornito e il suo contesto per assegnare i tag pi
 Restituisci SOLO un array JSON di stringhe con i tag scelti. Esempio: ["sedute", "ordine_e_disciplina"]
 """
 
+# Intestazione condivisa della modalità batch: lista dei tag e riassunti delle sezioni compaiono una sola volta
+PROMPT_TAGS_BATCH_HEADER = f"""
+Sei un esperto di indicizzazione giuridica e archivistica. Il tuo compito è analizzare i commi di un regolamento parlamentare elencati sotto e, considerando il contesto generale della sezione a cui appartiene ciascuno, estrarre per ogni comma una lista di tag categorici.
+
+Scegli uno o più tag pertinenti dalla seguente lista predefinita:
+{json.dumps(TAGS_POSSIBILI)}
+
+**Contesti Generali delle Sezioni:**
+{{contexts}}
+
+Per ogni comma indica i tag più appropriati. Esempio di risposta: {{{{"art_12_comma_1": ["sedute", "ordine_e_disciplina"], "art_12_comma_2": ["votazioni"]}}}}
+"""
+
+def comma_section_title(comma_item: dict) -> str:
+    return comma_item.get("metadati", {}).get("livello_2_title") or comma_item.get("metadati", {}).get("livello_1_title", "N/D")
+
 def clean_json_from_text(text: str) -> str:
     match = re.search(r'```json\s*(\[[\s\S]*?\])\s*```', text)
     if match: return match.group(1)
@@ -91,7 +120,7 @@ def main():
 
     try:
         genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        model = CachedModel(genai.GenerativeModel('gemini-2.5-flash'), llm_cache_from_env(CACHE_DIR))
     except Exception as e:
         print(f"❌ ERRORE CRITICO: Configurazione Gemini fallita. Errore: {e}"); sys.exit(1)
 
@@ -109,86 +138,91 @@ def main():
     
     all_articles_ids = list(commi_per_articolo.keys())
 
-    enriched_data = []
+    checkpoint = JsonlCheckpoint(OUTPUT_PROGRESS_PATH)
     processed_articles = set()
-    if os.path.exists(OUTPUT_PROGRESS_PATH):
+    if checkpoint.exists():
         print(f"ℹ️  Trovato file di progresso. Caricamento...")
-        with open(OUTPUT_PROGRESS_PATH, 'r', encoding='utf-8') as f:
-            try:
-                enriched_data = json.load(f)
-                processed_articles = {record['articolo'] for record in enriched_data}
-                print(f"✅  Recuperati {len(processed_articles)} articoli già elaborati.")
-            except json.JSONDecodeError:
-                print("⚠️  WARNING: File di progresso corrotto. Ripartenza da zero.")
+        processed_articles = checkpoint.keys()
+        print(f"✅  Recuperati {len(processed_articles)} articoli già elaborati.")
     
-    articles_to_process_ids = [aid for aid in all_articles_ids if aid not in processed_articles]
+    articles_to_process_ids = [aid for aid in all_articles_ids if str(aid) not in processed_articles]
 
     if not articles_to_process_ids:
         print("🎉 Tutti gli articoli sono già stati processati.")
-        # Se il file finale non esiste, rinominiamo quello di progresso
-        if not os.path.exists(OUTPUT_FINAL_PATH) and os.path.exists(OUTPUT_PROGRESS_PATH):
-             os.rename(OUTPUT_PROGRESS_PATH, OUTPUT_FINAL_PATH)
+        # Se è rimasto un checkpoint (es. interruzione durante la compattazione), lo compattiamo ora
+        if checkpoint.exists():
+            checkpoint.compact(OUTPUT_FINAL_PATH, flatten=True)
         return
         
-    print(f"\nInizio elaborazione di {len(articles_to_process_ids)} articoli rimanenti...")
-    consecutive_errors = 0
-
-    for i, article_id in enumerate(articles_to_process_ids):
-        print(f"  -> Processo Articolo {article_id} ({i+1}/{len(articles_to_process_ids)})")
+    def process_article(article_id) -> list:
+        """Genera i tag di tutti i commi di un articolo; un errore su un comma scarta l'intero articolo."""
         temp_article_chunks = []
-        
-        commi_da_processare = commi_per_articolo[article_id]
-        
-        error_in_article = False
-        for comma_item in commi_da_processare:
+        for comma_item in commi_per_articolo[article_id]:
             comma_text = comma_item.get("testo_originale_comma", "")
-            parent_node_title = comma_item.get("metadati", {}).get("livello_2_title") or comma_item.get("metadati", {}).get("livello_1_title", "N/D")
+            parent_node_title = comma_section_title(comma_item)
             context_summary = summaries_data.get(parent_node_title, "Nessun contesto generale disponibile.")
             prompt = PROMPT_TAGS.format(context_summary=context_summary, comma_text=comma_text)
 
-            tags = []
-            try:
-                response = model.generate_content(prompt)
-                if not response.candidates or not response.candidates[0].content.parts:
-                    raise ValueError(f"Risposta API vuota. Finish Reason: {response.candidates[0].finish_reason.name if response.candidates else 'N/A'}")
-                
-                cleaned_json_str = clean_json_from_text(response.text)
-                tags = json.loads(cleaned_json_str)
-                if not isinstance(tags, list): 
-                    print(f"     ⚠️  WARNING Comma {comma_item.get('comma')}: L'LLM non ha restituito una lista. Assegno lista vuota.")
-                    tags = []
-
-                consecutive_errors = 0 # Successo: azzera il contatore
-            except Exception as e:
-                print(f"     ❌ ERRORE Comma {comma_item.get('comma')}: {e}")
-                consecutive_errors += 1
-                error_in_article = True
-                if consecutive_errors >= CONSECUTIVE_ERROR_LIMIT:
-                    break
-                time.sleep(2)
-                continue
+            # Una risposta vuota (es. bloccata) solleva l'errore del modello e scarta l'articolo;
+            # in cache entrano solo le risposte che contengono una lista JSON
+            response = pool.generate(model, prompt, validate=lambda text: isinstance(json.loads(clean_json_from_text(text)), list))
+            cleaned_json_str = clean_json_from_text(response.text)
+            tags = json.loads(cleaned_json_str)
+            if not isinstance(tags, list):
+                print(f"     ⚠️  WARNING Comma {comma_item.get('comma')}: L'LLM non ha restituito una lista. Assegno lista vuota.")
+                tags = []
 
             comma_item['tags'] = tags
             temp_article_chunks.append(comma_item)
-            print(f"     - Comma {comma_item.get('comma')} processato.")
-            time.sleep(1.5)
-        
-        if consecutive_errors >= CONSECUTIVE_ERROR_LIMIT or error_in_article:
-            print(f"   ⚠️  Errore durante l'elaborazione dell'articolo {article_id}. Il progresso per questo articolo non verrà salvato.")
+        return temp_article_chunks
+
+    validate_tags = string_list_validator(TAGS_POSSIBILI)
+
+    def process_window(article_ids: list) -> dict:
+        """Modalità batch: un solo prompt per tutti i commi degli articoli della finestra."""
+        commi = [comma_item for article_id in article_ids for comma_item in commi_per_articolo[article_id]]
+        sections = dict.fromkeys(comma_section_title(comma_item) for comma_item in commi)
+        contexts = "\n".join(f"- {title}: {summaries_data.get(title, 'Nessun contesto generale disponibile.')}" for title in sections)
+        items = {
+            item_key(comma_item.get("articolo"), comma_item.get("comma")): f"(Sezione: {comma_section_title(comma_item)})\n{comma_item.get('testo_originale_comma', '')}"
+            for comma_item in commi
+        }
+        tags_by_key = generate_keyed(pool, model, PROMPT_TAGS_BATCH_HEADER.format(contexts=contexts), items, validate_tags)
+        for comma_item in commi:
+            comma_item['tags'] = tags_by_key[item_key(comma_item.get("articolo"), comma_item.get("comma"))]
+        return {article_id: commi_per_articolo[article_id] for article_id in article_ids}
+
+    pool = EnrichmentPool.from_env()
+    if BATCH_SIZE > 1:
+        windows = group_into_windows([(aid, len(commi_per_articolo[aid])) for aid in articles_to_process_ids], BATCH_SIZE)
+        work = process_window
+    else:
+        windows = [[aid] for aid in articles_to_process_ids]
+        work = lambda article_ids: {article_ids[0]: process_article(article_ids[0])}
+    print(f"\nInizio elaborazione di {len(articles_to_process_ids)} articoli rimanenti in {len(windows)} richieste con {pool.max_workers} worker...")
+    consecutive_errors = 0
+    saved_articles = 0
+
+    for window, results, error in pool.run_ordered(windows, work):
+        if error:
+            consecutive_errors += 1
+            print(f"   ❌ ERRORE Articoli {', '.join(map(str, window))}: {error}")
+            print("   ⚠️  Il progresso per questi articoli non verrà salvato.")
             if consecutive_errors >= CONSECUTIVE_ERROR_LIMIT:
                 break
-            else:
-                continue
+            continue
 
-        enriched_data.extend(temp_article_chunks)
-        with open(OUTPUT_PROGRESS_PATH, 'w', encoding='utf-8') as f:
-            json.dump(enriched_data, f, indent=2, ensure_ascii=False)
-        print(f"     ✅ Progresso per Art. {article_id} salvato.")
+        consecutive_errors = 0 # Successo: azzera il contatore
+        for article_id in window:
+            checkpoint.append([(article_id, results[article_id])])
+            saved_articles += 1
+            print(f"  ✅ Art. {article_id} ({saved_articles}/{len(articles_to_process_ids)}): {len(results[article_id])} commi salvati.")
 
+    print(f"📊 Chiamate LLM: {pool.summary()}")
     if consecutive_errors < CONSECUTIVE_ERROR_LIMIT:
         print("\n🎉 Arricchimento completato!")
-        if os.path.exists(OUTPUT_PROGRESS_PATH):
-            os.rename(OUTPUT_PROGRESS_PATH, OUTPUT_FINAL_PATH)
+        if checkpoint.exists():
+            enriched_data = checkpoint.compact(OUTPUT_FINAL_PATH, flatten=True)
             print(f"✅ Creati {len(enriched_data)} record con tag.")
             print(f"📁 File finale salvato in: {OUTPUT_FINAL_PATH}")
     else:
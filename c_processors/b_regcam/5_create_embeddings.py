@@ -11,8 +11,11 @@ Utilizza la "ricetta" di embedding standard e robusta, che si è dimostrata
 efficace nel preservare il segnale semantico.
 
 Logica di Robustezza Implementata:
-- Carica un file di output esistente per riprendere i progressi.
-- Salva i progressi in modo incrementale dopo aver processato ogni batch.
+- Salva i progressi in un checkpoint JSONL append-only dopo ogni batch (una riga
+  per chunk, scritta e sincronizzata su disco: il costo non cresce col corpus).
+- Riprende leggendo solo le chiavi del checkpoint; se esiste solo il file di
+  output, il checkpoint viene ricostruito da quello.
+- A fine lavoro compatta il checkpoint nel file di output, scritto una volta sola.
 - Implementa un "Circuit Breaker" per interrompersi dopo errori API consecutivi.
 
 INPUT:
@@ -35,6 +38,8 @@ project_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+from g_src.g_general.utils_checkpoint import JsonlCheckpoint, reopen_checkpoint
+
 # --- Caricamento Configurazione ---
 env_path = os.path.join(project_root, "a_chiavi", ".env")
 load_dotenv(dotenv_path=env_path)
@@ -45,6 +50,7 @@ EMBEDDINGS_DIR = os.path.join(project_root, "d_outputs", "05_embeddings", "b_reg
 
 INPUT_CHUNKS_PATH = os.path.join(CHUNKS_DIR, "regcam_chunks.json")
 OUTPUT_EMBEDDINGS_PATH = os.path.join(EMBEDDINGS_DIR, "regcam_embeddings.json")
+OUTPUT_PROGRESS_PATH = os.path.join(EMBEDDINGS_DIR, "regcam_embeddings_progress.jsonl")
 
 # --- Costanti ---
 EMBEDDING_MODEL = "text-embedding-004"
@@ -85,10 +91,8 @@ def build_text_to_embed(chunk: dict) -> str:
 #         parts.append(f"Parole Chiave: {', '.join(chunk['keywords'])}.")
 #     return " ".join(parts)
 
-def save_progress(data, path):
-    """Funzione di aiuto per salvare i dati in un file JSON."""
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+def chunk_key(chunk: dict) -> str:
+    return f"art_{chunk.get('articolo')}_comma_{chunk.get('comma')}"
 
 def main():
     """Orchestra il processo di generazione degli embedding per il Regolamento."""
@@ -106,22 +110,21 @@ def main():
     except FileNotFoundError:
         print(f"❌ ERRORE CRITICO: File di input dei chunk non trovato a: {INPUT_CHUNKS_PATH}"); sys.exit(1)
 
-    embeddings_results = []
-    processed_chunk_ids = set()
-    if os.path.exists(OUTPUT_EMBEDDINGS_PATH):
-        print(f"ℹ️  Trovato file di output esistente. Carico i progressi...")
-        with open(OUTPUT_EMBEDDINGS_PATH, 'r', encoding='utf-8') as f:
-            try:
-                embeddings_results = json.load(f)
-                for item in embeddings_results:
-                    unique_id = f"art_{item.get('articolo')}_comma_{item.get('comma')}"
-                    processed_chunk_ids.add(unique_id)
-                print(f"✅  Recuperati {len(processed_chunk_ids)} embedding già generati.")
-            except json.JSONDecodeError:
-                print("⚠️  WARNING: Il file di output corrotto. Ripartenza da zero."); embeddings_results = []
+    checkpoint = JsonlCheckpoint(OUTPUT_PROGRESS_PATH)
+    if not checkpoint.exists() and os.path.exists(OUTPUT_EMBEDDINGS_PATH):
+        print(f"ℹ️  Trovato file di output esistente. Lo riporto in un checkpoint per riprendere i progressi...")
+        try:
+            reopen_checkpoint(OUTPUT_EMBEDDINGS_PATH, checkpoint, chunk_key)
+        except json.JSONDecodeError:
+            print("⚠️  WARNING: Il file di output corrotto. Ripartenza da zero.")
+    processed_chunk_ids = checkpoint.keys()
+    if processed_chunk_ids:
+        print(f"✅  Recuperati {len(processed_chunk_ids)} embedding già generati.")
     
-    items_to_process = [c for c in chunks_data if f"art_{c.get('articolo')}_comma_{c.get('comma')}" not in processed_chunk_ids]
+    items_to_process = [c for c in chunks_data if chunk_key(c) not in processed_chunk_ids]
     if not items_to_process:
+        if checkpoint.exists():
+            checkpoint.compact(OUTPUT_EMBEDDINGS_PATH)
         print("🎉 Tutti i chunk hanno già un embedding. Nessuna azione richiesta."); return
 
     print(f"\nInizio elaborazione di {len(items_to_process)} chunk rimanenti in batch da {BATCH_SIZE}...")
@@ -146,10 +149,9 @@ def main():
             for chunk, embedding_vector in zip(batch_chunks, batch_embeddings):
                 chunk['embedding'] = embedding_vector
             
-            embeddings_results.extend(batch_chunks)
             consecutive_errors = 0
             print(f"     ✅ Batch completato. Salvataggio progressi...")
-            save_progress(embeddings_results, OUTPUT_EMBEDDINGS_PATH)
+            checkpoint.append([(chunk_key(chunk), chunk) for chunk in batch_chunks])
             time.sleep(1)
 
         except Exception as e:
@@ -159,10 +161,12 @@ def main():
                 print(f"\n❌ ERRORE CRITICO: Rilevati {CONSECUTIVE_ERROR_LIMIT} errori. Interruzione."); break
             time.sleep(5)
 
-    if consecutive_errors < CONSECUTIVE_ERROR_LIMIT:
+    if consecutive_errors < CONSECUTIVE_ERROR_LIMIT and checkpoint.exists():
+        embeddings_results = checkpoint.compact(OUTPUT_EMBEDDINGS_PATH)
         print("\n🎉 Processo di generazione embedding terminato con successo.")
+        print(f"📁 {len(embeddings_results)} embedding salvati in: {OUTPUT_EMBEDDINGS_PATH}")
     else:
-        print("\n⚠️  Processo interrotto. I progressi parziali sono stati salvati.")
+        print(f"\n⚠️  Processo interrotto. I progressi parziali sono stati salvati in: {OUTPUT_PROGRESS_PATH}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
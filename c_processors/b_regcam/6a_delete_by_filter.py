@@ -27,7 +27,7 @@ OUTPUT:
 
 import os
 import sys
-from qdrant_client import QdrantClient, models
+from qdrant_client import models
 from dotenv import load_dotenv
 from collections import defaultdict
 
@@ -37,6 +37,9 @@ project_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+from g_src.g_general.utils_cache import record_ingest_version
+from g_src.g_general.utils_qdrant import make_qdrant_client
+
 # --- Caricamento Configurazione ---
 env_path = os.path.join(project_root, "a_chiavi", ".env")
 load_dotenv(dotenv_path=env_path)
@@ -44,7 +47,10 @@ load_dotenv(dotenv_path=env_path)
 # --- Configurazione ---
 QDRANT_URL = os.getenv("QDRANT_HOST")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+QDRANT_TRANSPORT = os.getenv("QDRANT_TRANSPORT", "rest") # rest | grpc | async | async_grpc
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
 QDRANT_COLLECTION_NAME = "regcam_v11"
+INGEST_MANIFEST_PATH = os.path.join(project_root, "d_outputs", "05_embeddings", "ingest_manifest.json")
 
 
 def main():
@@ -53,7 +59,7 @@ def main():
     print("ATTENZIONE: Stai per eseguire un'operazione di cancellazione dati irreversibile.")
 
     try:
-        client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+        client = make_qdrant_client(QDRANT_URL, QDRANT_API_KEY, QDRANT_TRANSPORT, QDRANT_GRPC_PORT)
         print("✅ Connessione a Qdrant riuscita.")
     except Exception as e:
         print(f"❌ ERRORE CRITICO durante la connessione a Qdrant: {e}"); sys.exit(1)
@@ -137,6 +143,7 @@ def main():
             wait=True # Attende che l'operazione sia completata
         )
         print("✅ Operazione di cancellazione completata con successo.")
+        record_ingest_version(INGEST_MANIFEST_PATH, QDRANT_COLLECTION_NAME, note=f"delete '{selected_doc_title}'")
         print(f"   - Stato dell'operazione: {response.status}")
     except Exception as e:
         print(f"❌ ERRORE durante l'operazione di delete in Qdrant: {e}")
@@ -36,6 +36,9 @@ project_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+from g_src.g_general.utils_cache import record_ingest_version
+from g_src.g_general.utils_qdrant import make_qdrant_client
+
 # --- Caricamento Configurazione ---
 env_path = os.path.join(project_root, "a_chiavi", ".env")
 load_dotenv(dotenv_path=env_path)
@@ -45,7 +48,10 @@ EMBEDDINGS_DIR = os.path.join(project_root, "d_outputs", "05_embeddings", "b_reg
 INPUT_EMBEDDINGS_PATH = os.path.join(EMBEDDINGS_DIR, "regcam_embeddings.json")
 QDRANT_URL = os.getenv("QDRANT_HOST")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+QDRANT_TRANSPORT = os.getenv("QDRANT_TRANSPORT", "rest") # rest | grpc | async | async_grpc
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
 QDRANT_COLLECTION_NAME = "regcam_v11"
+INGEST_MANIFEST_PATH = os.path.join(project_root, "d_outputs", "05_embeddings", "ingest_manifest.json")
 
 
 def ensure_collection_and_indexes(client: QdrantClient, collection_name: str):
@@ -85,7 +91,7 @@ def main():
     print(f"--- PASSO 6b: Inizio Ingest Dati per il Regolamento in Qdrant ---")
 
     try:
-        client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+        client = make_qdrant_client(QDRANT_URL, QDRANT_API_KEY, QDRANT_TRANSPORT, QDRANT_GRPC_PORT)
         print("✅ Connessione a Qdrant riuscita.")
     except Exception as e:
         print(f"❌ ERRORE CRITICO durante la connessione a Qdrant: {e}"); sys.exit(1)
@@ -130,6 +136,7 @@ def main():
     try:
         client.upsert(collection_name=QDRANT_COLLECTION_NAME, points=points_to_upload, wait=True)
         print(f"✅ Ingest completato con successo.")
+        record_ingest_version(INGEST_MANIFEST_PATH, QDRANT_COLLECTION_NAME, note=f"ingest '{document_title_to_check}'")
     except Exception as e:
         print(f"❌ ERRORE durante l'operazione di upsert: {e}"); return
             
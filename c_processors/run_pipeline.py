@@ -0,0 +1,274 @@
+# c_processors/run_pipeline.py
+
+"""
+Orchestratore incrementale della pipeline di processamento (a_cost, b_regcam).
+
+Ogni documento è modellato come un DAG di stadi:
+    struttura -> riassunti -> keyword -> [tag] -> chunk -> embedding -> punti Qdrant
+Per ogni stadio il manifest (d_outputs/06_cache/pipeline_manifest.json) registra
+l'hash dei file di input e, per gli stadi che lavorano per record, l'hash di ogni
+nodo/articolo/comma calcolato dai suoi input a monte. Al rilancio:
+- uno stadio con input invariati viene saltato;
+- negli stadi per record si potano dagli output solo i record obsoleti e si rilancia
+  lo script dello stadio, che riprende e rigenera solo ciò che manca;
+- i punti Qdrant vengono sincronizzati per comma (cancellazione mirata + upsert),
+  senza cancellare e ricaricare l'intero documento.
+Al primo avvio gli output esistenti vengono adottati come base (nessun ricalcolo).
+
+Limiti noti:
+- b_regcam/2_create_keywords.py è vuoto: lo stadio 'keywords' del Regolamento è
+  manuale e, se i suoi input cambiano, la pipeline si ferma lì.
+- 6a_delete_by_filter.py è interattivo e resta fuori dal DAG.
+
+USO:
+    python c_processors/run_pipeline.py [--doc a_cost|b_regcam|all] [--dry-run] [--force STADIO ...]
+"""
+
+import os
+import sys
+import uuid
+import argparse
+from collections import defaultdict
+from dotenv import load_dotenv
+
+# --- Setup del Percorso ---
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_cache import record_ingest_version
+from g_src.g_general.utils_qdrant import make_qdrant_client
+from g_src.g_general.utils_incremental import (
+    PipelineManifest, run_document_pipeline, script_runner, record_hash, load_json,
+    prune_summaries, prune_article_records, prune_comma_records, comma_key, article_key,
+)
+from g_src.g_general.utils_checkpoint import completed_keys
+from g_src.g_general.utils_articles import load_articles
+
+# --- Caricamento Configurazione ---
+load_dotenv(dotenv_path=os.path.join(project_root, "a_chiavi", ".env"))
+
+OUTPUTS_DIR = os.path.join(project_root, "d_outputs")
+TEXTS_DIR = os.path.join(project_root, "b_testi")
+MANIFEST_PATH = os.path.join(OUTPUTS_DIR, "06_cache", "pipeline_manifest.json")
+INGEST_MANIFEST_PATH = os.path.join(OUTPUTS_DIR, "05_embeddings", "ingest_manifest.json")
+
+QDRANT_URL = os.getenv("QDRANT_HOST")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+QDRANT_TRANSPORT = os.getenv("QDRANT_TRANSPORT", "rest") # rest | grpc | async | async_grpc
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_COLLECTION_NAME = "regcam_v11"
+UPSERT_BATCH_SIZE = 256
+
+# --- Funzioni di supporto ---
+
+def find_leaf_nodes(nodes: list) -> list:
+    """Nodi della struttura che contengono articoli (gli stessi riassunti dagli script)."""
+    leaf_nodes = []
+    for node in nodes:
+        if node.get("articles"):
+            leaf_nodes.append(node)
+        if node.get("children"):
+            leaf_nodes.extend(find_leaf_nodes(node["children"]))
+    return leaf_nodes
+
+def summary_records(structure_path: str, articles_loader) -> dict:
+    """Un record per nodo foglia: titolo del documento, titolo del nodo e testo dei suoi articoli."""
+    structure = load_json(structure_path, {})
+    articles = articles_loader()
+    return {
+        node["title"]: record_hash(structure.get("document_title"), node["title"], [articles.get(art_id) for art_id in node["articles"]])
+        for node in find_leaf_nodes(structure.get("structure", []))
+        if any(articles.get(art_id) for art_id in node["articles"])
+    }
+
+def summary_keys(summaries_path: str) -> set:
+    return set(load_json(summaries_path, {}).get("summaries", {}))
+
+def article_keys(final_path: str, checkpoint_path: str) -> set:
+    return completed_keys(final_path, checkpoint_path, article_key)
+
+def comma_keys(final_path: str, checkpoint_path: str) -> set:
+    return completed_keys(final_path, checkpoint_path, comma_key)
+
+def comma_records(path: str) -> dict:
+    """Un record per comma, con l'hash dell'intero oggetto (payload ed eventuale vettore)."""
+    return {comma_key(record): record_hash(record) for record in load_json(path, [])}
+
+def parse_comma_key(key: str) -> tuple:
+    article_part, comma = key[len("art_"):].rsplit("_comma_", 1)
+    return article_part, comma
+
+def points_runner(embeddings_path: str):
+    """
+    Sincronizza i punti Qdrant di un documento per comma: i commi modificati o rimossi
+    vengono cancellati per filtro (document_title + articolo + comma), quelli modificati
+    ricaricati con id deterministici. Il resto della collezione non viene toccato.
+    """
+    def run(stale_keys: set, removed_keys: set) -> bool:
+        from qdrant_client import models
+
+        records = {comma_key(record): record for record in load_json(embeddings_path, [])}
+        if not records:
+            print("❌ File di embedding vuoto. Nessun punto da sincronizzare.")
+            return False
+        document_title = next(iter(records.values())).get("document_title")
+
+        commi_per_articolo = defaultdict(list)
+        for key in stale_keys | removed_keys:
+            article_id, comma = parse_comma_key(key)
+            commi_per_articolo[article_id].append(comma)
+
+        points = [
+            models.PointStruct(
+                id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"{document_title}|{key}")),
+                vector=records[key]["embedding"],
+                payload={k: v for k, v in records[key].items() if k != "embedding"},
+            )
+            for key in sorted(stale_keys) if key in records
+        ]
+
+        client = make_qdrant_client(QDRANT_URL, QDRANT_API_KEY, QDRANT_TRANSPORT, QDRANT_GRPC_PORT)
+        try:
+            for article_id, commi in commi_per_articolo.items():
+                client.delete(
+                    collection_name=QDRANT_COLLECTION_NAME,
+                    points_selector=models.FilterSelector(filter=models.Filter(must=[
+                        models.FieldCondition(key="document_title", match=models.MatchValue(value=document_title)),
+                        models.FieldCondition(key="articolo", match=models.MatchValue(value=article_id)),
+                        models.FieldCondition(key="comma", match=models.MatchAny(any=commi)),
+                    ])),
+                    wait=True,
+                )
+            for start in range(0, len(points), UPSERT_BATCH_SIZE):
+                client.upsert(collection_name=QDRANT_COLLECTION_NAME, points=points[start:start + UPSERT_BATCH_SIZE], wait=True)
+            print(f"   ✅ Punti sincronizzati: {len(points)} caricati, {len(removed_keys)} commi rimossi.")
+            record_ingest_version(INGEST_MANIFEST_PATH, QDRANT_COLLECTION_NAME, note=f"sync incrementale '{document_title}'")
+            return True
+        except Exception as e:
+            print(f"   ❌ ERRORE durante la sincronizzazione dei punti: {e}")
+            return False
+        finally:
+            client.close()
+    return run
+
+# --- Definizione dei DAG per documento ---
+
+def build_cost_stages() -> list:
+    scripts_dir = os.path.join(script_dir, "a_cost")
+    structured_dir = os.path.join(OUTPUTS_DIR, "03_structured", "a_cost")
+    index_docx = os.path.join(TEXTS_DIR, "a_cost", "cost_2023_22_10_indice.docx")
+    text_docx = os.path.join(TEXTS_DIR, "a_cost", "cost_2023_22_10_testo.docx")
+    structure = os.path.join(structured_dir, "cost_structure.json")
+    summaries = os.path.join(structured_dir, "cost_summaries.json")
+    keywords_final = os.path.join(structured_dir, "cost_keywords_data.json")
+    keywords_progress = os.path.join(structured_dir, "cost_keywords_progress.jsonl")
+    chunks = os.path.join(OUTPUTS_DIR, "04_chunks", "a_cost", "cost_chunks.json")
+    embeddings = os.path.join(OUTPUTS_DIR, "05_embeddings", "a_cost", "cost_embeddings.json")
+    embeddings_progress = os.path.join(OUTPUTS_DIR, "05_embeddings", "a_cost", "cost_embeddings_progress.jsonl")
+    script = lambda name: os.path.join(scripts_dir, name)
+    articles = lambda: load_articles(text_docx, "cost")
+
+    def keyword_records() -> dict:
+        structure_data = load_json(structure, {})
+        summaries_data = load_json(summaries, {}).get("summaries", {})
+        node_of = {art_id: node["title"] for node in find_leaf_nodes(structure_data.get("structure", [])) for art_id in node["articles"]}
+        records = {}
+        for article_id, text in articles().items():
+            if text:
+                parent = node_of.get(article_id, "Contesto Generale")
+                records[str(article_id)] = record_hash(text, parent, summaries_data.get(parent, ""))
+        return records
+
+    return [
+        {"name": "structure", "inputs": [index_docx], "outputs": [structure],
+         "run": script_runner(script("00_create_structure.py"), project_root)},
+        {"name": "summaries", "inputs": [structure, text_docx], "outputs": [summaries],
+         "records": lambda: summary_records(structure, articles), "output_keys": lambda: summary_keys(summaries),
+         "invalidate": lambda keys: prune_summaries(summaries, keys),
+         "run": script_runner(script("1_create_summaries.py"), project_root)},
+        {"name": "keywords", "inputs": [structure, summaries, text_docx], "outputs": [keywords_final],
+         "records": keyword_records, "output_keys": lambda: article_keys(keywords_final, keywords_progress),
+         "invalidate": lambda keys: prune_article_records(keywords_final, keywords_progress, keys),
+         "run": script_runner(script("2_create_keywords.py"), project_root)},
+        {"name": "chunks", "inputs": [structure, keywords_final], "outputs": [chunks],
+         "run": script_runner(script("3_create_chunks.py"), project_root)},
+        {"name": "embeddings", "inputs": [chunks], "outputs": [embeddings],
+         "records": lambda: comma_records(chunks), "output_keys": lambda: comma_keys(embeddings, embeddings_progress),
+         "invalidate": lambda keys: prune_comma_records(embeddings, embeddings_progress, keys),
+         "run": script_runner(script("4_create_embeddings.py"), project_root)},
+        {"name": "points", "inputs": [embeddings], "outputs": [],
+         "records": lambda: comma_records(embeddings), "run": points_runner(embeddings)},
+    ]
+
+def build_regcam_stages() -> list:
+    scripts_dir = os.path.join(script_dir, "b_regcam")
+    structured_dir = os.path.join(OUTPUTS_DIR, "03_structured", "b_regcam")
+    index_docx = os.path.join(TEXTS_DIR, "b_regcam", "regcam_indice.docx")
+    text_docx = os.path.join(TEXTS_DIR, "b_regcam", "regcam_testo.docx")
+    structure = os.path.join(structured_dir, "regcam_structure.json")
+    summaries = os.path.join(structured_dir, "regcam_summaries.json")
+    keywords = os.path.join(structured_dir, "regcam_keywords_data.json")
+    tags_final = os.path.join(structured_dir, "regcam_tags_data.json")
+    tags_progress = os.path.join(structured_dir, "regcam_tags_progress.jsonl")
+    chunks = os.path.join(OUTPUTS_DIR, "04_chunks", "b_regcam", "regcam_chunks.json")
+    embeddings = os.path.join(OUTPUTS_DIR, "05_embeddings", "b_regcam", "regcam_embeddings.json")
+    embeddings_progress = os.path.join(OUTPUTS_DIR, "05_embeddings", "b_regcam", "regcam_embeddings_progress.jsonl")
+    script = lambda name: os.path.join(scripts_dir, name)
+    articles = lambda: load_articles(text_docx, "regcam")
+
+    def tag_records() -> dict:
+        # Stesso contesto usato da 3_create_tags.py: i commi dell'articolo e il riassunto della sezione
+        summaries_data = load_json(summaries, {}).get("summaries", {})
+        commi_per_articolo = defaultdict(list)
+        for record in load_json(keywords, []):
+            metadati = record.get("metadati", {})
+            parent = metadati.get("livello_2_title") or metadati.get("livello_1_title", "N/D")
+            commi_per_articolo[str(record.get("articolo"))].append((record, summaries_data.get(parent)))
+        return {article_id: record_hash(commi) for article_id, commi in commi_per_articolo.items()}
+
+    return [
+        {"name": "structure", "inputs": [index_docx], "outputs": [structure],
+         "run": script_runner(script("00_create_structure.py"), project_root)},
+        {"name": "summaries", "inputs": [structure, text_docx], "outputs": [summaries],
+         "records": lambda: summary_records(structure, articles), "output_keys": lambda: summary_keys(summaries),
+         "invalidate": lambda keys: prune_summaries(summaries, keys),
+         "run": script_runner(script("1_create_summaries.py"), project_root)},
+        {"name": "keywords", "inputs": [structure, summaries, text_docx], "outputs": [keywords],
+         "run": None, "note": "b_regcam/2_create_keywords.py è vuoto"},
+        {"name": "tags", "inputs": [keywords, summaries], "outputs": [tags_final],
+         "records": tag_records, "output_keys": lambda: article_keys(tags_final, tags_progress),
+         "invalidate": lambda keys: prune_article_records(tags_final, tags_progress, keys),
+         "run": script_runner(script("3_create_tags.py"), project_root)},
+        {"name": "chunks", "inputs": [structure, keywords, tags_final], "outputs": [chunks],
+         "run": script_runner(script("4_create_chunks.py"), project_root)},
+        {"name": "embeddings", "inputs": [chunks], "outputs": [embeddings],
+         "records": lambda: comma_records(chunks), "output_keys": lambda: comma_keys(embeddings, embeddings_progress),
+         "invalidate": lambda keys: prune_comma_records(embeddings, embeddings_progress, keys),
+         "run": script_runner(script("5_create_embeddings.py"), project_root)},
+        {"name": "points", "inputs": [embeddings], "outputs": [],
+         "records": lambda: comma_records(embeddings), "run": points_runner(embeddings)},
+    ]
+
+PIPELINES = {"a_cost": build_cost_stages, "b_regcam": build_regcam_stages}
+
+def main():
+    parser = argparse.ArgumentParser(description="Esegue in modo incrementale la pipeline di processamento dei documenti.")
+    parser.add_argument("--doc", default="all", choices=[*PIPELINES, "all"], help="Documento da processare.")
+    parser.add_argument("--dry-run", action="store_true", help="Mostra cosa verrebbe ricalcolato, senza eseguire nulla.")
+    parser.add_argument("--force", nargs="*", default=[], metavar="STADIO", help="Stadi da ricalcolare per intero.")
+    args = parser.parse_args()
+
+    manifest = PipelineManifest(MANIFEST_PATH, project_root)
+    doc_names = list(PIPELINES) if args.doc == "all" else [args.doc]
+    results = {doc_name: run_document_pipeline(doc_name, PIPELINES[doc_name](), manifest, args.dry_run, set(args.force)) for doc_name in doc_names}
+
+    print("\n--- Riepilogo ---")
+    for doc_name, ok in results.items():
+        print(f"  {'✅' if ok else '⚠️ '} {doc_name}")
+    if not all(results.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
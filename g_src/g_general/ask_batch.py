@@ -0,0 +1,158 @@
+# g_src/g_general/ask_batch.py
+
+"""
+Esecuzione non interattiva di un file di domande sull'intero percorso
+router -> retrieval -> generazione, con più domande in parallelo.
+
+Ogni risultato viene scritto come una riga JSONL con: domanda, percorso seguito,
+analisi del router, tempi per fase, riferimenti ai chunk usati nel contesto, statistiche
+del contesto e risposta. Alla fine stampa throughput e tempi medi per fase:
+è il benchmark di throughput e la suite di regressione quando cambiano modelli o collezione.
+
+Le righe di follow-up ("più sintetico", "più dettagliato @gpt") non sono domande nuove:
+vengono eseguite in sequenza dopo la domanda che le precede, con la stessa gestione dei
+follow-up della modalità interattiva (record con 'follow_up_of'). Un follow-up senza
+domanda precedente viene segnalato nel record e saltato.
+
+USO:
+    python g_src/g_general/ask_batch.py [--file PERCORSO] [--task CHIAVE_PROMPT]
+                                        [--model default_generator|gpt|pro] [--workers 4] [--output FILE.jsonl]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Logica per aggiungere il percorso radice al sys.path
+script_dir = os.path.dirname(__file__)
+proj_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
+if proj_root not in sys.path:
+    sys.path.insert(0, proj_root)
+
+from g_src.g_general.config import load_config_and_clients
+from g_src.g_general.utils_pipeline import (
+    answer_question,
+    answer_follow_up,
+    build_last_interaction,
+    detect_follow_up_style,
+    extract_model_override,
+    turn_to_record
+)
+from g_src.g_general.utils_tracing import print_trace_summary
+
+DEFAULT_QUESTIONS_PATH = os.path.join(proj_root, "g_src", "d_domande", "merged_file.txt")
+BATCH_REPORTS_DIR = os.path.join(proj_root, "e_reports", "03_batch")
+
+def load_questions(path: str) -> list:
+    """Legge le domande dal file, ignorando le righe vuote e quelle che iniziano con #."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+def group_conversations(questions: list) -> list:
+    """
+    Raggruppa le righe in conversazioni [(indice, riga), ...]: una domanda nuova seguita dai
+    suoi follow-up. Le conversazioni sono indipendenti e possono girare in parallelo.
+    """
+    conversations = []
+    for index, question in enumerate(questions):
+        if detect_follow_up_style(question) and conversations:
+            conversations[-1].append((index, question))
+        else:
+            conversations.append([(index, question)])
+    return conversations
+
+def run_conversation(config, clients, all_summaries, conversation: list, task_key: str, model_key: str) -> list:
+    """Esegue in ordine una domanda e i suoi follow-up; restituisce un record JSON serializzabile per riga."""
+    records, last_interaction_info, question_index = [], {}, None
+    for index, question in conversation:
+        record = {"index": index, "question": question, "task": task_key}
+        style = detect_follow_up_style(question)
+        try:
+            domanda_pulita, model_override_key = extract_model_override(question)
+            if style:
+                record["follow_up_of"] = question_index
+                if not last_interaction_info:
+                    print(f"⚠️ Follow-up #{index + 1} senza domanda precedente: saltato.")
+                    record.update(path_taken="follow_up_skipped", error="Follow-up senza domanda precedente.")
+                    records.append(record)
+                    continue
+                turn = answer_follow_up(
+                    config, clients, last_interaction_info, question, task_key,
+                    model_override_key or model_key, style, stream=False
+                )
+                if turn is None:
+                    raise ValueError("Stato dell'interazione precedente non valido.")
+            else:
+                question_index = index
+                turn = answer_question(config, clients, all_summaries, domanda_pulita, task_key, model_override_key or model_key, stream=False)
+                last_interaction_info = build_last_interaction(turn)
+            record.update(turn_to_record(turn))
+            record["question"] = question
+        except Exception as e:
+            print(f"❌ ERRORE sulla domanda #{index + 1}: {e}")
+            record["error"] = str(e)
+        records.append(record)
+    return records
+
+def main():
+    parser = argparse.ArgumentParser(description="Esegue in batch un file di domande e scrive i risultati in JSONL.")
+    parser.add_argument("--file", default=DEFAULT_QUESTIONS_PATH, help="File di domande (una per riga, # per i commenti).")
+    parser.add_argument("--task", help="Chiave del prompt di sistema (default: il primo in ordine alfabetico).")
+    parser.add_argument("--model", default="default_generator", help="Chiave del modello di generazione.")
+    parser.add_argument("--workers", type=int, default=4, help="Numero di domande elaborate in parallelo.")
+    parser.add_argument("--output", help="File JSONL di output (default: e_reports/03_batch/batch_<timestamp>.jsonl).")
+    args = parser.parse_args()
+
+    config, clients, _, all_summaries, _ = load_config_and_clients()
+    if not config.get("prompts"):
+        print("⚠️ Nessun prompt di sistema trovato. Impossibile eseguire il batch.")
+        return
+    task_key = args.task or sorted(config["prompts"])[0]
+    if task_key not in config["prompts"]:
+        print(f"⚠️ Prompt '{task_key}' non trovato. Disponibili: {sorted(config['prompts'])}")
+        return
+    if args.model not in config["models"] or args.model == "router":
+        print(f"⚠️ Modello '{args.model}' non valido.")
+        return
+
+    questions = load_questions(args.file)
+    conversations = group_conversations(questions)
+    output_path = args.output or os.path.join(BATCH_REPORTS_DIR, f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    print(f"\n--- Batch: {len(questions)} domande ({len(questions) - len(conversations)} follow-up), compito '{task_key}', modello '{args.model}', {args.workers} worker ---")
+
+    records = []
+    write_lock = threading.Lock()
+    batch_start = time.perf_counter()
+    with open(output_path, "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="ask_batch") as executor:
+        futures = [
+            executor.submit(run_conversation, config, clients, all_summaries, conversation, task_key, args.model)
+            for conversation in conversations
+        ]
+        for future in as_completed(futures):
+            for record in future.result():
+                with write_lock:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                records.append(record)
+                status = "❌" if "error" in record else "✅"
+                total = record.get("timings", {}).get("total", 0.0)
+                print(f"{status} [{len(records)}/{len(questions)}] ({record.get('path_taken', 'errore')}, {total:.2f}s) {record['question']}")
+    elapsed = time.perf_counter() - batch_start
+
+    print("\n--- Risultati Batch ---")
+    print(f"Domande completate: {sum(1 for r in records if 'error' not in r)}/{len(records)} in {elapsed:.1f}s ({len(records) / max(elapsed, 1e-9):.2f} domande/s)")
+    stages = sorted({stage for r in records for stage in r.get("timings", {})})
+    for stage in stages:
+        values = [r["timings"][stage] for r in records if stage in r.get("timings", {})]
+        print(f"   - {stage:<18} media {sum(values) / len(values):.3f}s su {len(values)} domande")
+    print_trace_summary([r["spans"] for r in records if r.get("spans")])
+    print(f"📄 Risultati scritti in '{output_path}'.")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,22 @@
 import os
 import sys
-import json
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
-import google.generativeai as genai
-from openai import OpenAI
+from g_src.g_general.utils_vector_index import build_vector_index
+from g_src.g_general.utils_snapshot import load_corpus
+from g_src.g_general.utils_tracing import TraceLog
+from g_src.g_general.utils_clients import LazyClients, make_gemini_factory, make_openai_factory, make_qdrant_factory, build_gemini_models
+from g_src.g_general.utils_cache import RetrievalCache, LRUCache, SemanticAnswerCache, read_ingest_version, answer_cache_version
+
+DOC_INFO_MAP = {
+    "a_cost": {
+        "document_title": "Costituzione della Repubblica Italiana",
+        "document_type": "costituzione"
+    },
+    "b_regcam": {
+        "document_title": "Regolamento della Camera dei Deputati",
+        "document_type": "regolamento_parlamentare"
+    }
+}
 
 def load_config_and_clients():
     """
@@ -31,39 +43,84 @@ def load_config_and_clients():
         },
         "gemini_embedding_model": "text-embedding-004",
         "qdrant_collection_name": "regcam_v11",
+        # Trasporto verso Qdrant: 'rest', 'grpc', 'async' o 'async_grpc' (vedi utils_qdrant)
+        "qdrant_transport": os.getenv("QDRANT_TRANSPORT", "rest"),
+        "qdrant_grpc_port": int(os.getenv("QDRANT_GRPC_PORT", "6334")),
         "structured_data_dir": os.path.join(proj_root, "d_outputs", "03_structured"),
         "chunks_data_dir": os.path.join(proj_root, "d_outputs", "04_chunks"),
+        "embeddings_data_dir": os.path.join(proj_root, "d_outputs", "05_embeddings"),
+        # Backend di retrieval: 'qdrant' (solo rete), 'local' (indice NumPy in-process),
+        # 'auto' (Qdrant con fallback sull'indice locale se l'host non risponde)
+        "retrieval_backend": os.getenv("RETRIEVAL_BACKEND", "qdrant"),
+        "cache_dir": os.path.join(proj_root, "d_outputs", "06_cache"),
+        # Snapshot binario di strutture, riassunti, chunk e tabelle derivate (rigenerato se i JSON cambiano)
+        "corpus_snapshot_path": os.path.join(proj_root, "d_outputs", "06_cache", "corpus_snapshot.bin"),
+        "ingest_manifest_path": os.path.join(proj_root, "d_outputs", "05_embeddings", "ingest_manifest.json"),
+        # Cache di retrieval: LRU in memoria + SQLite su disco (disattivabile con RETRIEVAL_CACHE_DISK=0)
+        "retrieval_cache_memory_size": 512,
+        "retrieval_cache_disk": os.getenv("RETRIEVAL_CACHE_DISK", "1") != "0",
+        # Sotto questa confidenza il router deterministico cede la domanda al router LLM
+        "router_confidence_threshold": 0.8,
+        # Retrieval ibrido: BM25 sui testi dei commi fuso con la ricerca vettoriale (RRF).
+        # Con HYBRID_RETRIEVAL=0 si torna al solo vettoriale con re-ranking per keyword.
+        "hybrid_retrieval": os.getenv("HYBRID_RETRIEVAL", "1") != "0",
+        "rrf_k": 60,
+        # Ricerca a ventaglio (MULTI_QUERY=0 per disattivare): più articoli, entrambi i documenti o
+        # sotto-domande diventano target separati, con embedding e ricerca in batch e quota per target
+        "multi_query_fanout": os.getenv("MULTI_QUERY", "1") != "0",
+        "fanout_max_targets": 4,
+        # Budget di token del contesto RAG per modello di generazione (conteggio con tiktoken)
+        "context_token_budget": {"default_generator": 8000, "gpt": 8000, "pro": 16000},
+        # Quota massima del budget riservata ai riassunti di sezione, prima dei commi rimasti fuori
+        "context_summary_share": 0.3,
+        # Per tipo di score, i commi sotto questa frazione dello score migliore dello stesso tipo
+        # vengono scartati: coseno (banda stretta, 0.85 taglia la coda) e RRF (0.4 con k=60 scarta
+        # solo gli hit in fondo a una sola lista); il lookup diretto (score 1.0) non ha soglia
+        "context_min_relative_score": {"cosine": 0.85, "rrf": 0.4},
+        # Cache semantica delle risposte (ANSWER_CACHE=0 per disattivare): soglia di similarità
+        # coseno tra le domande e sovrapposizione minima (Jaccard) dei commi recuperati
+        "answer_cache_enabled": os.getenv("ANSWER_CACHE", "1") != "0",
+        "answer_cache_similarity_threshold": 0.95,
+        "answer_cache_min_chunk_overlap": 0.8,
+        # Log JSONL a rotazione con gli span di latenza per fase di ogni domanda
+        "trace_log_path": os.path.join(proj_root, "e_reports", "02_diagnostica", "rag_traces.jsonl"),
+        # Stampa la risposta token per token man mano che arriva (STREAM_OUTPUT=0 per disattivare)
+        "stream_output": os.getenv("STREAM_OUTPUT", "1") != "0",
+        # Journal JSONL append-only delle sessioni (un turno per riga), da cui si generano i report Word
+        "session_journal_dir": os.path.join(proj_root, "e_reports", "04_sessioni"),
+        # Servizio HTTP: sessioni massime in memoria, scadenza per inattività, thread per la pipeline
+        "service_max_sessions": 256,
+        "service_session_ttl_seconds": 3600,
+        "service_workers": 8,
         "prompts_dir": os.path.join(proj_root, "g_src", "a_prompts") # Percorso centralizzato per i prompt
     }
 
-    DOC_INFO_MAP = {
-        "a_cost": {
-            "document_title": "Costituzione della Repubblica Italiana",
-            "document_type": "costituzione"
-        },
-        "b_regcam": {
-            "document_title": "Regolamento della Camera dei Deputati",
-            "document_type": "regolamento_parlamentare"
-        }
-    }
-
     try:
         openai_api_key = os.getenv("OPENAI_API_KEY")
         gemini_api_key = os.getenv("GEMINI_API_KEY")
         if not openai_api_key or not gemini_api_key:
             raise ValueError("API Keys mancanti nel file .env")
 
-        genai.configure(api_key=gemini_api_key)
+        # I client dei provider vengono costruiti (e i loro SDK importati) solo al primo utilizzo
+        clients = LazyClients()
+        clients.register("genai", make_gemini_factory(gemini_api_key))
+        clients.register("openai_generator", make_openai_factory(openai_api_key))
+        clients.register("qdrant", make_qdrant_factory(os.getenv("QDRANT_HOST"), os.getenv("QDRANT_API_KEY"), config["qdrant_transport"], config["qdrant_grpc_port"]))
+        clients["gemini_models"] = build_gemini_models(clients, config["models"])
+        print("✅ Client AI e Qdrant configurati (inizializzazione al primo utilizzo).")
+
+        clients["retrieval_cache"] = RetrievalCache(
+            ingest_version=read_ingest_version(config["ingest_manifest_path"], config["qdrant_collection_name"]),
+            memory_size=config["retrieval_cache_memory_size"],
+            sqlite_path=os.path.join(config["cache_dir"], "retrieval_cache.sqlite") if config["retrieval_cache_disk"] else None
+        )
+
+        clients["router_cache"] = LRUCache(config["retrieval_cache_memory_size"])
+        clients["trace_log"] = TraceLog(config["trace_log_path"])
 
-        clients = {
-            "openai_generator": OpenAI(api_key=openai_api_key),
-            "qdrant": QdrantClient(url=os.getenv("QDRANT_HOST"), api_key=os.getenv("QDRANT_API_KEY")),
-            "gemini_models": {
-                key: genai.GenerativeModel(model_name)
-                for key, model_name in config["models"].items() if key != 'gpt'
-            }
-        }
-        print("✅ Client AI e Qdrant inizializzati.")
+        if config["retrieval_backend"] in ("local", "auto"):
+            print("🧮 Caricamento dell'indice vettoriale locale...")
+            clients["vector_index"] = build_vector_index(config["embeddings_data_dir"], os.path.join(config["cache_dir"], "vector_index"))
 
         # ======================================================================
         # --- NUOVA SEZIONE: CARICAMENTO DINAMICO DEI PROMPT DI SISTEMA ---
@@ -88,52 +145,41 @@ def load_config_and_clients():
         else:
             print(f"   - ⚠️  WARNING: Cartella dei prompt non trovata a '{prompts_dir}'.")
         # ======================================================================
+
+        if config["answer_cache_enabled"]:
+            clients["answer_cache"] = SemanticAnswerCache(
+                version=answer_cache_version(
+                    config["qdrant_collection_name"],
+                    read_ingest_version(config["ingest_manifest_path"], config["qdrant_collection_name"]),
+                    config["prompts"]
+                ),
+                sqlite_path=os.path.join(config["cache_dir"], "answer_cache.sqlite"),
+                similarity_threshold=config["answer_cache_similarity_threshold"],
+                min_chunk_overlap=config["answer_cache_min_chunk_overlap"]
+            )
             
 
         print("🔎 Caricamento e aggregazione dati da tutte le fonti...")
-        
-        all_docs_structures = []
-        all_docs_summaries = {}
-        all_docs_chunks = []
-
-        structured_dir = config["structured_data_dir"]
-        for doc_folder_name in sorted(os.listdir(structured_dir)):
-            doc_folder_path = os.path.join(structured_dir, doc_folder_name)
-            if os.path.isdir(doc_folder_path) and doc_folder_name in DOC_INFO_MAP:
-                print(f"  -> Processo fonte: '{doc_folder_name}'")
-                
-                doc_metadata = DOC_INFO_MAP[doc_folder_name]
-
-                structure_file = next((f for f in os.listdir(doc_folder_path) if f.endswith('_structure.json')), None)
-                if structure_file:
-                    with open(os.path.join(doc_folder_path, structure_file), "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                        data['document_title'] = doc_metadata['document_title']
-                        data['document_type'] = doc_metadata['document_type']
-                        all_docs_structures.append(data)
-                    print(f"     - File Struttura '{structure_file}' caricato e normalizzato.")
-                
-                summaries_file = next((f for f in os.listdir(doc_folder_path) if f.endswith('_summaries.json')), None)
-                if summaries_file:
-                    with open(os.path.join(doc_folder_path, summaries_file), "r", encoding="utf-8") as f:
-                        summaries_content = json.load(f)
-                        all_docs_summaries.update(summaries_content.get("summaries", {}))
-                    print(f"     - File Riassunti '{summaries_file}' caricato e unito.")
-        
-        chunks_folder_path = config["chunks_data_dir"]
-        for doc_folder in sorted(os.listdir(chunks_folder_path)):
-             doc_chunks_path = os.path.join(chunks_folder_path, doc_folder)
-             if os.path.isdir(doc_chunks_path):
-                 chunk_file = next((f for f in os.listdir(doc_chunks_path) if f.endswith('_chunks.json')), None)
-                 if chunk_file:
-                     with open(os.path.join(doc_chunks_path, chunk_file), "r", encoding="utf-8") as f:
-                         all_docs_chunks.extend(json.load(f))
-                     print(f"     - File Chunks '{chunk_file}' caricato e unito.")
+        corpus = load_corpus(config["structured_data_dir"], config["chunks_data_dir"], DOC_INFO_MAP, config["corpus_snapshot_path"])
+        all_docs_structures = corpus["structures"]
+        all_docs_summaries = corpus["summaries"]
+        all_docs_chunks = corpus["chunks"]
 
         print(f"\n✅ Aggregazione completata.")
         print(f"   - Totale documenti strutturati: {len(all_docs_structures)}")
         print(f"   - Totale riassunti: {len(all_docs_summaries)}")
         print(f"   - Totale chunks in memoria: {len(all_docs_chunks)}")
+
+        # Indice strutturale piatto per le query strutturali (precalcolato nello snapshot)
+        clients["structural_index"] = corpus["structural_index"]
+        print(f"   - Indice strutturale pronto: {sum(len(d['nodes']) for d in clients['structural_index'].values())} nodi, {sum(len(d['article_paths']) for d in clients['structural_index'].values())} articoli.")
+
+        # Chunk store per (documento, articolo, comma): serve le domande su articoli specifici
+        clients["chunk_store"] = corpus["chunk_store"]
+        print(f"   - Chunk store pronto: {len(clients['chunk_store']['by_article'])} articoli indicizzati.")
+
+        if config["hybrid_retrieval"]:
+            clients["bm25_index"] = corpus["bm25_index"]
         
         return config, clients, all_docs_structures, all_docs_summaries, all_docs_chunks
 
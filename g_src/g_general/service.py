@@ -0,0 +1,235 @@
+# g_src/g_general/service.py
+
+"""
+Servizio HTTP (ASGI) per l'assistente RAG, per servire più analisti in parallelo.
+
+Client, indici e corpora vengono caricati una sola volta all'avvio e condivisi tra le
+richieste; lo stato di ogni sessione (compito, modello, ultima interazione) vive in
+uno store limitato con scadenza per inattività, e i turni vengono scritti nel journal
+JSONL della sessione. Le chiamate bloccanti della pipeline
+(router, retrieval, LLM) girano in un pool di thread: sessioni diverse procedono in
+parallelo, mentre i turni di una stessa sessione sono serializzati.
+
+ENDPOINT:
+    GET    /health
+    POST   /sessions                     {"task": "...", "model": "default_generator"}
+    POST   /sessions/{id}/questions      {"question": "..."}
+    POST   /sessions/{id}/follow-up      {"style": "sintetico" | "dettagliato", "model": "..."}
+    POST   /sessions/{id}/export         -> report Word della sessione
+    DELETE /sessions/{id}
+
+USO:
+    python g_src/g_general/service.py [--host 127.0.0.1] [--port 8000]
+    (oppure: uvicorn g_src.g_general.service:app)
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Logica per aggiungere il percorso radice al sys.path
+script_dir = os.path.dirname(__file__)
+proj_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
+if proj_root not in sys.path:
+    sys.path.insert(0, proj_root)
+
+from g_src.g_general.config import load_config_and_clients
+from g_src.g_general.utils_pipeline import (
+    answer_question,
+    answer_follow_up,
+    build_last_interaction,
+    extract_model_override,
+    turn_to_record
+)
+from g_src.g_general.utils_session import SessionStore
+from g_src.g_general.utils_exporter import export_to_word
+from g_src.g_general.utils_journal import SessionJournal, read_journal
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+# Stato condiviso del servizio, inizializzato una sola volta (evento 'lifespan' o prima richiesta)
+STATE = {}
+_state_lock = asyncio.Lock()
+
+async def get_state() -> dict:
+    async with _state_lock:
+        if not STATE:
+            config, clients, all_structures, all_summaries, all_chunks = await asyncio.get_running_loop().run_in_executor(None, load_config_and_clients)
+            STATE.update({
+                "config": config,
+                "clients": clients,
+                "all_summaries": all_summaries,
+                "sessions": SessionStore(config["service_max_sessions"], config["service_session_ttl_seconds"]),
+                "executor": ThreadPoolExecutor(max_workers=config["service_workers"], thread_name_prefix="rag_service"),
+            })
+        return STATE
+
+async def run_blocking(state: dict, func, *args, **kwargs):
+    """Esegue una funzione bloccante della pipeline nel pool del servizio, senza bloccare l'event loop."""
+    return await asyncio.get_running_loop().run_in_executor(state["executor"], functools.partial(func, *args, **kwargs))
+
+def get_session(state: dict, session_id: str) -> dict:
+    session = state["sessions"].get(session_id)
+    if session is None:
+        raise HTTPError(404, f"Sessione '{session_id}' inesistente o scaduta.")
+    return session
+
+def validate_model(config: dict, model_key: str):
+    if model_key not in config["models"] or model_key == "router":
+        raise HTTPError(400, f"Modello '{model_key}' non valido.")
+
+# --- HANDLER ---
+
+async def create_session(state: dict, body: dict) -> tuple:
+    config = state["config"]
+    task_key = body.get("task") or sorted(config["prompts"])[0]
+    if task_key not in config["prompts"]:
+        raise HTTPError(400, f"Compito '{task_key}' non trovato. Disponibili: {sorted(config['prompts'])}")
+    model_key = body.get("model", "default_generator")
+    validate_model(config, model_key)
+    session = state["sessions"].create(task_key, model_key)
+    # Il lock che serializza i turni vive nella sessione: sparisce con lei (DELETE, TTL o LRU)
+    session["lock"] = asyncio.Lock()
+    session["journal"] = SessionJournal(os.path.join(config["session_journal_dir"], f"sessione_http_{session['id']}.jsonl"))
+    return 201, {"session_id": session["id"], "task": task_key, "model": model_key}
+
+async def ask_question(state: dict, session_id: str, body: dict) -> tuple:
+    question = (body.get("question") or "").strip()
+    if not question:
+        raise HTTPError(400, "Campo 'question' mancante.")
+    session = get_session(state, session_id)
+    domanda_pulita, model_override_key = extract_model_override(question)
+    model_key = model_override_key or session["model_key"]
+    async with session["lock"]:
+        turn = await run_blocking(
+            state, answer_question, state["config"], state["clients"], state["all_summaries"],
+            domanda_pulita, session["task_key"], model_key, stream=False
+        )
+        turn['question'] = question
+        record = turn_to_record(turn)
+        session["journal"].append(record)
+        session["last_interaction_info"] = build_last_interaction(turn)
+    return 200, record
+
+async def ask_follow_up(state: dict, session_id: str, body: dict) -> tuple:
+    style = body.get("style", "dettagliato")
+    if style not in ("sintetico", "dettagliato"):
+        raise HTTPError(400, "Il campo 'style' deve essere 'sintetico' o 'dettagliato'.")
+    session = get_session(state, session_id)
+    model_key = body.get("model") or session["model_key"]
+    validate_model(state["config"], model_key)
+    async with session["lock"]:
+        if not session["last_interaction_info"]:
+            raise HTTPError(409, "Nessun contesto precedente disponibile per il follow-up.")
+        turn = await run_blocking(
+            state, answer_follow_up, state["config"], state["clients"], session["last_interaction_info"],
+            f"Follow-up {style}", session["task_key"], model_key, style, stream=False
+        )
+        if turn is None:
+            raise HTTPError(409, "Stato dell'interazione precedente non valido.")
+        record = turn_to_record(turn)
+        session["journal"].append(record)
+    return 200, record
+
+async def export_session(state: dict, session_id: str) -> tuple:
+    session = get_session(state, session_id)
+    async with session["lock"]:
+        if not len(session["journal"]):
+            raise HTTPError(409, "Nessuna interazione da esportare.")
+        file_path = await run_blocking(state, export_to_word, read_journal(session["journal"].path), proj_root, state["clients"].get("chunk_store"))
+    if not file_path:
+        raise HTTPError(500, "Creazione del report Word fallita.")
+    return 200, {"path": file_path}
+
+async def route(method: str, path: str, body: dict) -> tuple:
+    parts = [p for p in path.split("/") if p]
+    if method == "GET" and parts == ["health"]:
+        return 200, {"status": "ok", "sessions": len(STATE["sessions"]) if STATE else 0}
+
+    state = await get_state()
+    if method == "POST" and parts == ["sessions"]:
+        return await create_session(state, body)
+    if len(parts) == 2 and parts[0] == "sessions" and method == "DELETE":
+        if not state["sessions"].delete(parts[1]):
+            raise HTTPError(404, f"Sessione '{parts[1]}' inesistente o scaduta.")
+        return 200, {"deleted": parts[1]}
+    if len(parts) == 3 and parts[0] == "sessions" and method == "POST":
+        session_id, action = parts[1], parts[2]
+        if action == "questions":
+            return await ask_question(state, session_id, body)
+        if action == "follow-up":
+            return await ask_follow_up(state, session_id, body)
+        if action == "export":
+            return await export_session(state, session_id)
+    raise HTTPError(404, f"Endpoint non trovato: {method} {path}")
+
+# --- APPLICAZIONE ASGI ---
+
+async def read_json_body(receive) -> dict:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    raw = b"".join(chunks)
+    if not raw:
+        return {}
+    try:
+        body = json.loads(raw)
+    except json.JSONDecodeError:
+        raise HTTPError(400, "Corpo della richiesta non è JSON valido.")
+    if not isinstance(body, dict):
+        raise HTTPError(400, "Il corpo della richiesta deve essere un oggetto JSON.")
+    return body
+
+async def send_json(send, status: int, payload: dict):
+    data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json; charset=utf-8"), (b"content-length", str(len(data)).encode())]})
+    await send({"type": "http.response.body", "body": data})
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await get_state()
+                    await send({"type": "lifespan.startup.complete"})
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+            elif message["type"] == "lifespan.shutdown":
+                if STATE:
+                    STATE["executor"].shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    try:
+        body = await read_json_body(receive)
+        status, payload = await route(scope["method"], scope["path"], body)
+    except HTTPError as e:
+        status, payload = e.status, {"error": e.message}
+    except Exception as e:
+        print(f"❌ ERRORE non gestito nel servizio: {e}")
+        status, payload = 500, {"error": "Errore interno del servizio."}
+    await send_json(send, status, payload)
+
+def main():
+    parser = argparse.ArgumentParser(description="Avvia il servizio HTTP dell'assistente RAG.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
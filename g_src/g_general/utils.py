@@ -1,10 +1,21 @@
 import os
 import re
 import sys
+import time
+import copy
 import json
-from qdrant_client import models
-import google.generativeai as genai
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+from g_src.g_general.utils_vector_index import search_vector_index, get_chunk_id
+from g_src.g_general.utils_cache import read_ingest_version, normalize_query, answer_cache_version
+from g_src.g_general.utils_router import fast_analyze_query
+from g_src.g_general.utils_structure import handle_structural_query
+from g_src.g_general.utils_chunk_store import lookup_targets
+from g_src.g_general.utils_bm25 import search_bm25, reciprocal_rank_fusion
+from g_src.g_general.utils_fanout import plan_search_targets, per_target_limit, merge_with_quotas
+from g_src.g_general.utils_tracing import span, traced, run_in_trace
+
+# Pool condiviso per le chiamate di rete indipendenti della pipeline (router, embedding)
+QUERY_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag_query")
 
 def preprocess_query_for_ordinals(query: str) -> str:
     """
@@ -24,80 +35,48 @@ def clean_json_from_text(text: str) -> str:
     start, end = text.find('{'), text.rfind('}')
     return text[start:end+1] if start != -1 and end != -1 else "{}"
 
-def analyze_query_for_rag(router_client, model_name, user_query: str) -> dict:
-    """Analizza la query dell'utente per estrarre l'intent e le entità."""
+def analyze_query_with_llm(router_client, user_query: str) -> dict:
+    """Analizza la query dell'utente con il router LLM per estrarre l'intent e le entità."""
     prompt = ( "Sei un analista di query legali. Il tuo compito è analizzare la domanda di un utente e classificarla, estraendo le entità chiave. Restituisci un oggetto JSON.\n\n" "**INTENT POSSIBILI:**\n" "- `ricerca_contenuto`: Domande sul contenuto di uno o più articoli (es. 'cosa dice l'articolo 5?', 'spiega gli articoli 3 e 4 della Costituzione').\n" "- `ricerca_strutturale`: Domande sulla struttura di un documento (es. 'quanti capi ha la parte prima del regolamento?', 'qual è il titolo del capo I?', 'a quale parte appartiene l'art. 50?').\n" "- `ricerca_generale`: Domande tematiche che non specificano articoli o strutture (es. 'parlami delle immunità parlamentari').\n\n" "**ENTITIES DA ESTRARRE:**\n" "- `documento`: Il nome del documento (es. 'costituzione', 'regolamento'). Se non specificato, non estrarre nulla.\n" "- `articolo`: Il numero dell'articolo o una lista di numeri (es. '5', ['3', '4'], 'V').\n" "- `nome_sezione`: Il nome o numero di una sezione (es. 'parte prima', 'principi fondamentali', 'capo 1', 'capo x', 'titolo 2').\n\n" "**ESEMPI:**\n" "- Domanda: 'spiega l'art. 1 della costituzione' -> intent: 'ricerca_contenuto', entities: {'articolo': '1', 'documento': 'costituzione'}\n" "- Domanda: 'quanti titoli ha la parte seconda della costituzione?' -> intent: 'ricerca_strutturale', entities: {'nome_sezione': 'parte seconda', 'documento': 'costituzione'}\n" "- Domanda: 'cosa dice l'art. 5 del regolamento?' -> intent: 'ricerca_contenuto', entities: {'articolo': '5', 'documento': 'regolamento'}\n" "- Domanda: 'parlami della libertà di stampa' -> intent: 'ricerca_generale', entities: {}\n" f"**Analizza la seguente domanda e produci SOLO l'oggetto JSON:**\n**Domanda Utente:** \"{user_query}\"" )
     try:
         response = router_client.generate_content(prompt)
-        return json.loads(clean_json_from_text(response.text))
+        analysis = json.loads(clean_json_from_text(response.text))
+        analysis["router_source"] = "llm"
+        return analysis
     except Exception as e:
         print(f"⚠️ Errore durante l'analisi della query: {e}")
-        return {"intent": "ricerca_generale", "entities": {}}
-
-def handle_structural_query(analysis: dict, all_structures: list) -> str | None:
-    """Gestisce le query strutturali navigando le strutture canoniche."""
-    if analysis.get("intent") != 'ricerca_strutturale':
-        return None
+        return {"intent": "ricerca_generale", "entities": {}, "router_source": "error"}
 
-    entities = analysis.get("entities", {})
-    doc_entity = entities.get("documento")
-    article_entity = str(entities.get("articolo")) if entities.get("articolo") else None
-    section_entity = entities.get("nome_sezione")
+@traced("router")
+def analyze_query_for_rag(gemini_models, model_name, user_query: str, cache=None, confidence_threshold: float = 0.8) -> dict:
+    """
+    Analizza la query dell'utente per estrarre l'intent e le entità.
+    Prova prima il router deterministico a regex; l'LLM viene chiamato solo se la
+    confidenza è sotto soglia. Le analisi vengono memorizzate per domanda normalizzata.
+    Il modello 'router' viene preso da 'gemini_models' solo quando serve davvero.
+    """
+    cache_key = normalize_query(user_query)
+    if cache is not None:
+        cached_analysis = cache.get(cache_key)
+        if cached_analysis is not None:
+            print("⚡ Analisi della query recuperata dalla cache del router.")
+            return copy.deepcopy(cached_analysis)
 
-    doc_type_map = {"costituzione": "costituzione", "regolamento": "regolamento_parlamentare"}
-    target_doc_type = doc_type_map.get(doc_entity.lower()) if doc_entity else None
-    
-    docs_to_search = [doc for doc in all_structures if not target_doc_type or doc.get('document_type') == target_doc_type]
+    analysis, confidence = fast_analyze_query(user_query)
+    if confidence >= confidence_threshold:
+        print(f"⚡ Router deterministico (confidenza {confidence:.2f}): intent '{analysis['intent']}'.")
+        analysis["router_source"] = "rules"
+    else:
+        print(f"🧠 Confidenza del router deterministico bassa ({confidence:.2f}). Analisi con '{model_name}'...")
+        analysis = analyze_query_with_llm(gemini_models["router"], user_query)
+        if analysis.get("router_source") == "error":
+            return analysis
 
-    for doc in docs_to_search:
-        doc_title = doc.get('document_title', 'Sconosciuto')
-        
-        if article_entity:
-            path_to_article = []
-            def find_article_path_recursive(nodes, current_path):
-                for node in nodes:
-                    articles_as_str = [str(a) for a in node.get("articles", [])]
-                    if article_entity in articles_as_str:
-                        path_to_article.extend(current_path + [node.get("title")])
-                        return True
-                    if node.get("children") and find_article_path_recursive(node["children"], current_path + [node.get("title")]):
-                        return True
-                return False
-
-            if find_article_path_recursive(doc.get("structure", []), []):
-                return f"L'articolo {article_entity} si trova nel documento '{doc_title}' all'interno del percorso: {' -> '.join(path_to_article)}."
-
-        if section_entity:
-            search_term_norm = section_entity.lower().replace(" ", "").replace("-", "")
-            def normalize_title_with_romans(title: str) -> str:
-                roman_map = {'i': '1', 'ii': '2', 'iii': '3', 'iv': '4', 'v': '5', 'vi': '6', 'vii': '7', 'viii': '8', 'ix': '9', 'x': '10'}
-                title_lower = title.lower()
-                for roman, arabic in roman_map.items():
-                    title_lower = re.sub(rf'\b{roman}\b', arabic, title_lower)
-                return title_lower.replace(" ", "").replace("-", "")
-
-            def find_node_by_title_recursive(nodes, name_to_find):
-                for node in nodes:
-                    title_norm = normalize_title_with_romans(node.get("title", ""))
-                    if name_to_find in title_norm:
-                        return node
-                    if node.get("children"):
-                        found = find_node_by_title_recursive(node["children"], name_to_find)
-                        if found: return found
-                return None
-                
-            found_node = find_node_by_title_recursive(doc.get("structure", []), search_term_norm)
-            if found_node:
-                return f"Nel documento '{doc_title}', la sezione trovata per '{section_entity}' è: \"{found_node.get('title')}\"."
-
-    if article_entity:
-        doc_info = f"nel documento '{doc_entity}'" if doc_entity else "in nessun documento"
-        return f"Non è stato possibile trovare l'articolo {article_entity} {doc_info}."
-    if section_entity:
-        doc_info = f"nel documento '{doc_entity}'" if doc_entity else "in nessun documento"
-        return f"Nessuna sezione corrispondente a '{section_entity}' è stata trovata {doc_info}."
-    return "Query strutturale non riconosciuta."
+    if cache is not None:
+        cache.put(cache_key, copy.deepcopy(analysis))
+    return analysis
 
+@traced("rerank")
 def rerank_results(search_results: list, user_query: str) -> list:
     """Aggiunge un bonus allo score se le parole della query sono nelle keyword."""
     query_words = set(re.findall(r'\b\w{3,}\b', user_query.lower()))
@@ -110,42 +89,266 @@ def rerank_results(search_results: list, user_query: str) -> list:
     reranked_results.sort(key=lambda x: x[0], reverse=True)
     return [hit for score, hit in reranked_results]
 
-def run_rag_search(clients, config, domanda_pulita, analysis):
-    """Esegue la ricerca vettoriale su Qdrant, applicando filtri e re-ranking."""
+def resolve_filter_targets(entities: dict) -> tuple:
+    """Traduce le entità del router nel tipo di documento e nella lista di articoli da filtrare."""
+    target_doc_type = None
+    doc_entity = entities.get("documento")
+    if doc_entity:
+        doc_type_map = {"costituzione": "costituzione", "regolamento": "regolamento_parlamentare"}
+        target_doc_type = doc_type_map.get(doc_entity.lower())
+    target_articles = []
+    if entities.get("articolo"):
+        article_values = entities["articolo"]
+        target_articles = [str(val) for val in article_values] if isinstance(article_values, list) else [str(article_values)]
+    return target_doc_type, target_articles
+
+def build_qdrant_filter(target_doc_type: str | None, target_articles: list):
+    """Costruisce il filtro Qdrant equivalente ai target di documento/articolo."""
+    from qdrant_client import models
+    must_conditions = []
+    if target_doc_type:
+        must_conditions.append(models.FieldCondition(key="document_type", match=models.MatchValue(value=target_doc_type)))
+    if len(target_articles) > 1:
+        should_conditions = [models.FieldCondition(key="articolo", match=models.MatchValue(value=val)) for val in target_articles]
+        must_conditions.append(models.Filter(should=should_conditions))
+    elif target_articles:
+        must_conditions.append(models.FieldCondition(key="articolo", match=models.MatchValue(value=target_articles[0])))
+    return models.Filter(must=must_conditions) if must_conditions else None
+
+def embed_query(clients, config, text: str) -> list:
+    """Calcola l'embedding RETRIEVAL_QUERY della domanda, passando per la cache se disponibile."""
+    cache = clients.get("retrieval_cache")
+    model_name = config["gemini_embedding_model"]
+    if cache:
+        cached_vector = cache.get_embedding(model_name, text)
+        if cached_vector is not None:
+            print("⚡ Embedding della domanda recuperato dalla cache.")
+            return cached_vector
+    with span("embedding"):
+        embedding_result = clients["genai"].embed_content(model=f'models/{model_name}', content=[text], task_type="RETRIEVAL_QUERY")
+    query_vector = embedding_result['embedding'][0]
+    if cache:
+        cache.put_embedding(model_name, text, query_vector)
+    return query_vector
+
+def embed_queries(clients, config, texts: list, known_vectors: dict | None = None) -> list:
+    """
+    Embedding RETRIEVAL_QUERY di più testi con una sola chiamata 'embed_content': i testi già
+    in 'known_vectors' (testo -> vettore) o nella cache non vengono ricalcolati.
+    Restituisce i vettori nello stesso ordine di 'texts'.
+    """
+    cache = clients.get("retrieval_cache")
+    model_name = config["gemini_embedding_model"]
+    vectors = dict(known_vectors or {})
+    for text in texts:
+        if text not in vectors and cache:
+            cached_vector = cache.get_embedding(model_name, text)
+            if cached_vector is not None:
+                vectors[text] = cached_vector
+    missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+    if missing:
+        with span("embedding", texts=len(missing)):
+            embedding_result = clients["genai"].embed_content(model=f'models/{model_name}', content=missing, task_type="RETRIEVAL_QUERY")
+        for text, vector in zip(missing, embedding_result['embedding']):
+            vectors[text] = vector
+            if cache:
+                cache.put_embedding(model_name, text, vector)
+    return [vectors[text] for text in texts]
+
+def plan_query_targets(config, user_query: str, analysis: dict) -> list:
+    """Target della ricerca ({'text', 'document_type', 'articles'}): scomposti se il fan-out è attivo, altrimenti uno solo."""
+    target_doc_type, target_articles = resolve_filter_targets(analysis.get("entities", {}))
+    if config.get("multi_query_fanout"):
+        return plan_search_targets(user_query, target_doc_type, target_articles, config["fanout_max_targets"])
+    return [{"text": user_query, "document_type": target_doc_type, "articles": target_articles}]
+
+def is_direct_article_query(clients, config, user_query: str, analysis: dict) -> bool:
+    """True se tutti i target della domanda citano articoli presenti nel chunk store: si risponde senza embedding né Qdrant."""
+    chunk_store = clients.get("chunk_store")
+    if not chunk_store or analysis.get("intent") == "ricerca_strutturale":
+        return False
+    direct_hits, missing_targets = lookup_targets(chunk_store, plan_query_targets(config, user_query, analysis))
+    return bool(direct_hits) and not missing_targets
+
+def analyze_and_embed_query(clients, config, user_query: str) -> tuple:
+    """
+    Esegue in parallelo l'analisi del router e l'embedding RETRIEVAL_QUERY della domanda:
+    l'embedding non dipende dall'output del router, solo il filtro sì.
+    Restituisce (analysis, query_vector); il vettore è None se l'embedding fallisce,
+    se la domanda è strutturale o se cita articoli serviti dal lookup diretto.
+    Se il router deterministico riconosce già un lookup diretto, l'embedding non viene lanciato.
+    """
+    fast_analysis, confidence = fast_analyze_query(user_query)
+    skip_embedding = confidence >= config["router_confidence_threshold"] and is_direct_article_query(clients, config, user_query, fast_analysis)
+    embedding_future = None if skip_embedding else QUERY_EXECUTOR.submit(run_in_trace(embed_query), clients, config, user_query)
+    analysis = analyze_query_for_rag(
+        clients["gemini_models"], config["models"]["router"], user_query,
+        cache=clients.get("router_cache"), confidence_threshold=config["router_confidence_threshold"]
+    )
+    if analysis.get("intent") == "ricerca_strutturale" or is_direct_article_query(clients, config, user_query, analysis) or embedding_future is None:
+        return analysis, None
+    try:
+        return analysis, embedding_future.result()
+    except Exception as e:
+        print(f"⚠️ Errore durante l'embedding della domanda: {e}")
+        return analysis, None
+
+def _results_cache_key(clients, config, query_vector: list, target_doc_type: str | None, target_articles: list, limit: int, backend_key: str) -> str | None:
+    """Chiave della cache dei risultati per una ricerca (invalida la cache se la versione di ingest è cambiata)."""
+    cache = clients.get("retrieval_cache")
+    if not cache:
+        return None
+    current_version = read_ingest_version(config["ingest_manifest_path"], config["qdrant_collection_name"])
+    if current_version != cache.ingest_version:
+        print("ℹ️  Versione di ingest della collezione cambiata. Cache dei risultati invalidata.")
+        cache.invalidate(current_version)
+    return cache.results_key(query_vector, [target_doc_type, target_articles, limit], config["qdrant_collection_name"], backend_key)
+
+def _use_local_index(clients, config) -> bool:
+    return bool(config.get("retrieval_backend") == "local" and clients.get("vector_index"))
+
+def vector_search(clients, config, query_vector: list, target_doc_type: str | None, target_articles: list, limit: int = 20) -> list:
+    """Ricerca vettoriale filtrata (Qdrant o indice locale), con cache dei risultati e fallback locale."""
+    query_filter = build_qdrant_filter(target_doc_type, target_articles)
+    vector_index = clients.get("vector_index")
+    use_local = _use_local_index(clients, config)
+    backend_key = f"local:{vector_index['version']}" if use_local else "qdrant"
+
+    cache = clients.get("retrieval_cache")
+    cache_key = _results_cache_key(clients, config, query_vector, target_doc_type, target_articles, limit, backend_key)
+    if cache_key:
+        cached_results = cache.get_results(cache_key)
+        if cached_results is not None:
+            print("⚡ Risultati della ricerca recuperati dalla cache.")
+            return cached_results
+
+    if use_local:
+        print("⚙️ Backend di retrieval: indice vettoriale locale.")
+        with span("local_search"):
+            results = search_vector_index(vector_index, query_vector, target_doc_type, target_articles, limit=limit)
+    else:
+        try:
+            with span("qdrant_search"):
+                results = clients["qdrant"].search(
+                    collection_name=config["qdrant_collection_name"],
+                    query_vector=query_vector,
+                    query_filter=query_filter,
+                    limit=limit
+                )
+        except Exception as e:
+            if not vector_index:
+                raise
+            print(f"⚠️ Qdrant non raggiungibile ({e}). Uso l'indice vettoriale locale.")
+            with span("local_search"):
+                results = search_vector_index(vector_index, query_vector, target_doc_type, target_articles, limit=limit)
+            cache_key = None # Non memorizza i risultati di fallback come risultati Qdrant
+    if cache and cache_key:
+        cache.put_results(cache_key, results)
+    return results
+
+def vector_search_batch(clients, config, searches: list) -> list:
+    """
+    Esegue più ricerche vettoriali filtrate in un solo round-trip ('search_batch' di Qdrant, o
+    l'indice locale). 'searches' è una lista di tuple (vettore, documento, articoli, limite);
+    restituisce le liste di risultati nello stesso ordine. Cache e fallback come in vector_search.
+    """
+    vector_index = clients.get("vector_index")
+    use_local = _use_local_index(clients, config)
+    backend_key = f"local:{vector_index['version']}" if use_local else "qdrant"
+    cache = clients.get("retrieval_cache")
+
+    results = [None] * len(searches)
+    cache_keys = [_results_cache_key(clients, config, *search, backend_key) for search in searches]
+    for i, cache_key in enumerate(cache_keys):
+        if cache_key:
+            results[i] = cache.get_results(cache_key)
+    pending = [i for i, result in enumerate(results) if result is None]
+    if len(pending) < len(searches):
+        print(f"⚡ {len(searches) - len(pending)}/{len(searches)} ricerche recuperate dalla cache.")
+    if not pending:
+        return results
+
+    def search_locally():
+        with span("local_search", searches=len(pending)):
+            for i in pending:
+                query_vector, target_doc_type, target_articles, limit = searches[i]
+                results[i] = search_vector_index(vector_index, query_vector, target_doc_type, target_articles, limit=limit)
+
+    if use_local:
+        search_locally()
+    else:
+        from qdrant_client import models
+        try:
+            with span("qdrant_search", searches=len(pending)):
+                batch_results = clients["qdrant"].search_batch(
+                    collection_name=config["qdrant_collection_name"],
+                    requests=[
+                        models.SearchRequest(
+                            vector=searches[i][0],
+                            filter=build_qdrant_filter(searches[i][1], searches[i][2]),
+                            limit=searches[i][3],
+                            with_payload=True
+                        )
+                        for i in pending
+                    ]
+                )
+            for i, batch_result in zip(pending, batch_results):
+                results[i] = batch_result
+        except Exception as e:
+            if not vector_index:
+                raise
+            print(f"⚠️ Qdrant non raggiungibile ({e}). Uso l'indice vettoriale locale.")
+            search_locally()
+            cache_keys = [None] * len(searches) # Non memorizza i risultati di fallback come risultati Qdrant
+    for i in pending:
+        if cache_keys[i]:
+            cache.put_results(cache_keys[i], results[i])
+    return results
+
+def run_rag_search(clients, config, domanda_pulita, analysis, query_vector: list | None = None):
+    """
+    Esegue la ricerca: la domanda viene prima scomposta in target (sotto-domande, articoli,
+    documenti); i target su articoli specifici sono serviti dal chunk store in memoria (tutti i
+    commi, in ordine), ognuno con il proprio documento. I target restanti passano dalla ricerca
+    vettoriale (Qdrant o indice locale), fusa con la ricerca lessicale BM25 (RRF) o, se il
+    retrieval ibrido è disattivato, riordinata con il re-ranking per keyword.
+    """
     try:
         entities = analysis.get("entities", {})
-        query_filter = None
-        must_conditions = []
-        doc_entity = entities.get("documento")
-        if doc_entity:
-            doc_type_map = {"costituzione": "costituzione", "regolamento": "regolamento_parlamentare"}
-            if doc_entity.lower() in doc_type_map:
-                must_conditions.append(models.FieldCondition(key="document_type", match=models.MatchValue(value=doc_type_map[doc_entity.lower()])))
-        if "articolo" in entities:
-            article_values = entities["articolo"]
-            if isinstance(article_values, list):
-                should_conditions = [models.FieldCondition(key="articolo", match=models.MatchValue(value=str(val))) for val in article_values]
-                must_conditions.append(models.Filter(should=should_conditions))
-            else:
-                must_conditions.append(models.FieldCondition(key="articolo", match=models.MatchValue(value=str(article_values))))
-        
-        if must_conditions:
-            query_filter = models.Filter(must=must_conditions)
+        targets = plan_query_targets(config, domanda_pulita, analysis)
+        with span("direct_lookup"):
+            direct_hits, missing_targets = lookup_targets(clients.get("chunk_store"), targets)
+        if direct_hits and not missing_targets:
+            print(f"⚡ Lookup diretto degli articoli {[a for t in targets for a in t['articles']]}: {len(direct_hits)} commi, nessuna ricerca vettoriale.")
+            return direct_hits
+        if direct_hits:
+            # Articoli serviti dal chunk store, ricerca solo per i target rimasti senza commi
+            print(f"⚡ Lookup diretto: {len(direct_hits)} commi; ricerca per {len(missing_targets)} target rimanenti.")
+            searched_hits = run_fanout_search(clients, config, domanda_pulita, missing_targets, query_vector)
+            served = {hit.id for hit in direct_hits}
+            return direct_hits + [hit for hit in searched_hits if get_chunk_id(hit.payload) not in served]
+
+        if len(targets) > 1:
+            return run_fanout_search(clients, config, domanda_pulita, targets, query_vector)
+        target_doc_type, target_articles = targets[0]["document_type"], targets[0]["articles"]
+
+        if target_doc_type or target_articles:
             print(f"⚙️ Filtro RAG attivato. Condizioni: {entities}")
         else:
             print("⚙️ Ricerca RAG Tematica (Vettoriale Pura) attivata.")
 
-        embedding_model = f'models/{config["gemini_embedding_model"]}'
-        embedding_result = genai.embed_content(model=embedding_model, content=[domanda_pulita], task_type="RETRIEVAL_QUERY")
-        query_vector = embedding_result['embedding'][0]
-        
-        initial_results = clients["qdrant"].search(
-            collection_name=config["qdrant_collection_name"], 
-            query_vector=query_vector, 
-            query_filter=query_filter, 
-            limit=20
-        )
-        
+        if query_vector is None:
+            query_vector = embed_query(clients, config, domanda_pulita)
+
+        initial_results = vector_search(clients, config, query_vector, target_doc_type, target_articles, limit=20)
+
+        bm25_index = clients.get("bm25_index")
+        if config.get("hybrid_retrieval") and bm25_index:
+            print("🔍 Fusione dei risultati vettoriali con la ricerca lessicale BM25 (RRF)...")
+            with span("bm25_fusion"):
+                lexical_results = search_bm25(bm25_index, domanda_pulita, target_doc_type, target_articles, limit=20)
+                return reciprocal_rank_fusion([initial_results, lexical_results], k=config["rrf_k"], limit=20)
+
         print("🔍 Eseguo re-ranking dei risultati basato su keyword...")
         reranked_hits = rerank_results(initial_results, domanda_pulita)
         return reranked_hits
@@ -154,11 +357,80 @@ def run_rag_search(clients, config, domanda_pulita, analysis):
         print(f"❌ ERRORE durante la ricerca RAG: {e}")
         return []
 
-def generate_response(clients, config, context: str, domanda: str, model_key: str, system_prompt: str) -> str:
+def run_fanout_search(clients, config, domanda_pulita: str, targets: list, query_vector: list | None = None, limit: int = 20) -> list:
+    """
+    Ricerca a ventaglio: un embedding per testo distinto (una sola chiamata), una ricerca per
+    target (un solo 'search_batch'), fusione BM25 o re-ranking per target e unione a turno,
+    così ogni target ha la sua quota di posti nei risultati.
+    """
+    print(f"🔀 Ricerca a ventaglio su {len(targets)} target: " + "; ".join(
+        f"[{t['document_type'] or 'tutti'}{' art. ' + ', '.join(t['articles']) if t['articles'] else ''}] {t['text'][:40]}" for t in targets
+    ))
+    target_limit = per_target_limit(limit, len(targets))
+    known_vectors = {domanda_pulita: query_vector} if query_vector is not None else {}
+    vectors = embed_queries(clients, config, [t["text"] for t in targets], known_vectors)
+    # Ogni target chiede più candidati della sua quota, per lasciare margine a fusione e deduplica
+    vector_results = vector_search_batch(clients, config, [
+        (vector, t["document_type"], t["articles"], limit) for vector, t in zip(vectors, targets)
+    ])
+
+    bm25_index = clients.get("bm25_index")
+    per_target = []
+    for target, results in zip(targets, vector_results):
+        if config.get("hybrid_retrieval") and bm25_index:
+            with span("bm25_fusion"):
+                lexical_results = search_bm25(bm25_index, target["text"], target["document_type"], target["articles"], limit=limit)
+                per_target.append(reciprocal_rank_fusion([results, lexical_results], k=config["rrf_k"], limit=limit))
+        else:
+            per_target.append(rerank_results(results, target["text"]))
+    merged = merge_with_quotas(per_target, limit=limit)
+    print(f"   - {len(merged)} commi unici, quota minima di {target_limit} per target.")
+    return merged
+
+def current_answer_cache_version(config) -> str:
+    """Versione corrente della cache delle risposte (collezione, versione di ingest, prompt caricati)."""
+    return answer_cache_version(
+        config["qdrant_collection_name"],
+        read_ingest_version(config["ingest_manifest_path"], config["qdrant_collection_name"]),
+        config.get("prompts", {})
+    )
+
+def print_token(text: str):
+    """Stampa un frammento della risposta appena arriva, senza andare a capo."""
+    print(text, end="", flush=True)
+
+def _iter_stream_text(model_key: str, stream):
+    """Estrae i frammenti di testo dallo stream di OpenAI o di Gemini."""
+    for chunk in stream:
+        if model_key == "gpt":
+            text = chunk.choices[0].delta.content if chunk.choices else None
+        else:
+            try:
+                text = chunk.text
+            except ValueError: # Chunk senza parti di testo (es. solo metadati o blocco di sicurezza)
+                text = None
+        if text:
+            yield text
+
+def _record_total(timings: dict | None, start_time: float, text: str) -> str:
+    """Registra il tempo di una generazione non in streaming (il primo token coincide con la fine)."""
+    if timings is not None:
+        total = time.perf_counter() - start_time
+        timings.update({"ttft_s": total, "total_s": total})
+    return text
+
+@traced("generation")
+def generate_response(clients, config, context: str, domanda: str, model_key: str, system_prompt: str, stream: bool = False, on_token=print_token, timings: dict | None = None) -> str:
     """
     Genera una risposta utilizzando un modello LLM, basandosi su un contesto,
     una domanda e un prompt di sistema fornito dinamicamente.
+    Con stream=True i token vengono passati a 'on_token' man mano che arrivano (di default
+    stampati a terminale) e la risposta completa viene comunque restituita. Se 'timings' è
+    un dizionario, vi vengono scritti 'ttft_s' (tempo al primo token) e 'total_s' e, se la
+    generazione non si è conclusa (risposta di errore o troncata), 'error'.
     """
+    start_time = time.perf_counter()
+    collected = []
     try:
         model_to_use_name = config["models"][model_key]
         
@@ -169,20 +441,43 @@ def generate_response(clients, config, context: str, domanda: str, model_key: st
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": f"**Contesto:**\n{context}\n\n**Domanda:**\n{domanda}"}
-                ]
+                ],
+                stream=stream
             )
-            return response.choices[0].message.content
-        
-        model_instance = clients["gemini_models"].get(model_key)
-        if model_instance:
-             final_prompt = f"{system_prompt}\n\n**Contesto:**\n{context}\n\n**Domanda:**\n{domanda}"
-             response = model_instance.generate_content(final_prompt)
-             return response.text
+            if not stream:
+                return _record_total(timings, start_time, response.choices[0].message.content)
         else:
-            return f"⚠️ Errore: Modello '{model_key}' non trovato."
+            model_instance = clients["gemini_models"].get(model_key)
+            if not model_instance:
+                if timings is not None:
+                    timings["error"] = f"Modello '{model_key}' non trovato."
+                return f"⚠️ Errore: Modello '{model_key}' non trovato."
+            final_prompt = f"{system_prompt}\n\n**Contesto:**\n{context}\n\n**Domanda:**\n{domanda}"
+            response = model_instance.generate_content(final_prompt, stream=stream)
+            if not stream:
+                return _record_total(timings, start_time, response.text)
+
+        ttft = None
+        for text in _iter_stream_text(model_key, response):
+            if ttft is None:
+                ttft = time.perf_counter() - start_time
+            collected.append(text)
+            if on_token:
+                on_token(text)
+        total = time.perf_counter() - start_time
+        if on_token:
+            on_token("\n")
+        if timings is not None:
+            timings.update({"ttft_s": ttft, "total_s": total})
+        print(f"⏱️ Primo token dopo {ttft if ttft is not None else total:.2f}s, generazione completata in {total:.2f}s.")
+        return "".join(collected)
 
     except Exception as e:
         print(f"❌ ERRORE CRITICO in generate_response (modello: {model_key}): {e}")
+        if timings is not None:
+            timings["error"] = str(e)
+        if collected:
+            return "".join(collected) + "\n\n⚠️ Generazione interrotta da un errore."
         return f"⚠️ Si è verificato un errore durante la generazione della risposta."
     
 def confirm_execution(settings: dict) -> bool:
@@ -0,0 +1,128 @@
+import os
+import re
+import json
+import hashlib
+from datetime import datetime
+import docx
+from docx.oxml.ns import qn
+
+# ==============================================================================
+# --- ESTRAZIONE DEGLI ARTICOLI DAI DOCX (PARSING UNICO CON CACHE) ---
+# Il testo dei documenti viene letto una sola volta con python-docx (senza
+# sottoprocesso pandoc) e diviso in articoli. Il risultato è salvato in
+# d_outputs/06_cache/articles/ insieme all'hash SHA-256 del docx e alla versione
+# del parser: gli stadi successivi lo caricano direttamente finché il docx non
+# cambia.
+# ==============================================================================
+
+PARSER_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', "d_outputs", "06_cache", "articles"))
+
+# Come si riconosce l'inizio di un articolo in ciascun documento
+ARTICLE_LAYOUTS = {
+    # Costituzione: "Art. N" oppure le disposizioni finali in numeri romani su una riga a sé; l'intestazione resta fuori dal testo
+    "cost": {"pattern": re.compile(r'(?m)^Art\.\s*(\d+)|^([IVXLCDM]+)$'), "include_header": False},
+    # Regolamento della Camera: "Art. N", "Art. N-bis" ...; l'intestazione (es. "Art. 3 (*)") fa parte del testo
+    "regcam": {"pattern": re.compile(r'(?mi)^ART\.\s+(\d+(?:-bis|-ter|-quater|-quinquies|-sexies)?)'), "include_header": True},
+}
+
+_TEXT_TAGS = {qn("w:t"): None, qn("w:tab"): "\t", qn("w:br"): "\n", qn("w:cr"): "\n"}
+_PARAGRAPH_TAG = qn("w:p")
+_CAPS_TAGS = (qn("w:caps"), qn("w:smallCaps"))
+_FALSE_VALUES = {"0", "false", "off"}
+
+def is_capitalized(text_element) -> bool:
+    """Vero se il run ha la formattazione maiuscolo/maiuscoletto (pandoc la rende in maiuscolo, es. "ART. 4")."""
+    run_properties = text_element.getparent().find(qn("w:rPr"))
+    if run_properties is None:
+        return False
+    return any(
+        flag is not None and flag.get(qn("w:val"), "true").lower() not in _FALSE_VALUES
+        for flag in (run_properties.find(tag) for tag in _CAPS_TAGS)
+    )
+
+def paragraph_text(paragraph) -> str:
+    """
+    Testo di un paragrafo (elemento w:p) comprese le parti che `Paragraph.text` di python-docx
+    salta, come i run dentro gli smart tag (es. "la Camera" nel Regolamento). I run in
+    maiuscolo/maiuscoletto sono resi in maiuscolo come fa pandoc. I paragrafi annidati
+    (caselle di testo) vengono letti a parte.
+    """
+    parts = []
+    for element in paragraph.iter(*_TEXT_TAGS):
+        if next(element.iterancestors(_PARAGRAPH_TAG), None) is not paragraph:
+            continue
+        replacement = _TEXT_TAGS[element.tag]
+        if replacement is None:
+            text = element.text or ""
+            parts.append(text.upper() if is_capitalized(element) else text)
+        else:
+            parts.append(replacement)
+    return "".join(parts)
+
+def iter_docx_paragraphs(file_path: str):
+    """Paragrafi non vuoti del corpo del documento, in ordine (anche quelli nelle tabelle)."""
+    body = docx.Document(file_path).element.body
+    for paragraph in body.iter(_PARAGRAPH_TAG):
+        text = paragraph_text(paragraph).strip()
+        if text:
+            yield text
+
+def read_docx_text(file_path: str) -> str:
+    """Testo semplice del documento: un paragrafo per blocco, separati da una riga vuota (come l'output 'plain' di pandoc)."""
+    return "\n\n".join(iter_docx_paragraphs(file_path))
+
+def split_articles(full_text: str, layout: str) -> dict:
+    """Divide il testo in {id_articolo: testo} secondo il layout del documento."""
+    settings = ARTICLE_LAYOUTS[layout]
+    matches = list(settings["pattern"].finditer(full_text))
+    articles_map = {}
+    for i, match in enumerate(matches):
+        article_id = next(group for group in match.groups() if group)
+        start_pos = match.start() if settings["include_header"] else match.end()
+        end_pos = matches[i + 1].start() if i + 1 < len(matches) else len(full_text)
+        articles_map[article_id] = full_text[start_pos:end_pos].strip()
+    return articles_map
+
+def file_sha256(file_path: str) -> str:
+    with open(file_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def articles_cache_path(file_path: str, layout: str, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(cache_dir, f"{stem}_{layout}_articles.json")
+
+def load_articles(file_path: str, layout: str, cache_dir: str = DEFAULT_CACHE_DIR, verbose: bool = True) -> dict:
+    """
+    Articoli di un docx ({id: testo}). Se la cache ha lo stesso hash del docx e la stessa
+    versione del parser viene restituita senza rileggere il documento; altrimenti il docx
+    viene analizzato e la cache riscritta. Un docx mancante solleva FileNotFoundError.
+    """
+    source_hash = file_sha256(file_path)
+    cache_path = articles_cache_path(file_path, layout, cache_dir)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("source_sha256") == source_hash and cached.get("parser_version") == PARSER_VERSION:
+            return cached["articles"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    if verbose:
+        print(f"📄 Estrazione testo degli articoli da: {os.path.basename(file_path)}")
+    articles_map = split_articles(read_docx_text(file_path), layout)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "source": os.path.basename(file_path),
+            "source_sha256": source_hash,
+            "parser_version": PARSER_VERSION,
+            "layout": layout,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "articles": articles_map,
+        }, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, cache_path)
+    if verbose:
+        print(f"✅ Estratti {len(articles_map)} articoli dal testo (salvati in cache).")
+    return articles_map
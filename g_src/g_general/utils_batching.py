@@ -0,0 +1,102 @@
+import os
+import re
+import json
+
+# ==============================================================================
+# --- PROMPT A PIÙ ELEMENTI (ARRICCHIMENTO IN BATCH) ---
+# Invece di una chiamata per comma, i commi di un articolo (o di una finestra
+# di articoli consecutivi) vanno in un unico prompt: istruzioni, liste di
+# valori ammessi e riassunti delle sezioni compaiono una sola volta
+# nell'intestazione condivisa. La risposta è un oggetto JSON indicizzato per
+# chiave; gli elementi mancanti o non validi vengono richiesti di nuovo, da soli.
+# ==============================================================================
+
+DEFAULT_BATCH_SIZE = 20
+MAX_BATCH_ROUNDS = 3
+
+def batch_size_from_env(default: int = DEFAULT_BATCH_SIZE) -> int:
+    """Commi per prompt da ENRICHMENT_BATCH_SIZE; 1 (o meno) ripristina una chiamata per comma."""
+    return int(os.getenv("ENRICHMENT_BATCH_SIZE", default))
+
+def item_key(article_id, comma_id) -> str:
+    return f"art_{article_id}_comma_{comma_id}"
+
+def group_into_windows(article_sizes: list, max_items: int) -> list:
+    """
+    Raggruppa articoli consecutivi (coppie (articolo, numero di commi)) in finestre di al più
+    max_items commi. Gli articoli non vengono mai spezzati: uno più grande della finestra fa
+    finestra da solo, così il checkpoint resta per articolo.
+    """
+    windows, current, current_size = [], [], 0
+    for article_id, size in article_sizes:
+        if current and current_size + size > max_items:
+            windows.append(current)
+            current, current_size = [], 0
+        current.append(article_id)
+        current_size += size
+    if current:
+        windows.append(current)
+    return windows
+
+def parse_keyed_json(text: str) -> dict:
+    """Estrae l'oggetto JSON della risposta (anche dentro ```json ... ```); {} se non è valido."""
+    text = text or ""
+    match = re.search(r'```json\s*(\{[\s\S]*\})\s*```', text)
+    candidate = match.group(1) if match else text[text.find('{'):text.rfind('}') + 1]
+    try:
+        parsed = json.loads(candidate)
+    except json.JSONDecodeError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+def build_batched_prompt(header: str, items: dict) -> str:
+    """Intestazione condivisa seguita dagli elementi, ognuno preceduto dalla sua chiave tra parentesi quadre."""
+    body = "\n\n".join(f"[{key}]\n{text}" for key, text in items.items())
+    return (
+        f"{header.strip()}\n\n"
+        f"**ELEMENTI DA ANALIZZARE ({len(items)}):**\n\n{body}\n\n"
+        "Restituisci SOLO un oggetto JSON valido che abbia come chiavi gli identificativi tra parentesi quadre "
+        "(tutti, nessuno escluso) e come valore l'array JSON di stringhe richiesto per quell'elemento."
+    )
+
+def string_list_validator(allowed: list | None = None):
+    """
+    Validatore per liste di stringhe: restituisce il valore ripulito o None se non valido.
+    Con 'allowed' scarta i valori fuori lista; una lista non vuota tutta fuori lista è non valida.
+    """
+    allowed_set = set(allowed) if allowed else None
+
+    def validate(value):
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            return None
+        if allowed_set is None:
+            return value
+        kept = [v for v in value if v in allowed_set]
+        return kept if kept or not value else None
+    return validate
+
+def generate_keyed(pool, model, header: str, items: dict, validate, max_rounds: int = MAX_BATCH_ROUNDS) -> dict:
+    """
+    Chiede al modello un valore per ogni elemento in un solo prompt e restituisce {chiave: valore}.
+    Gli elementi mancanti o non validi vengono richiesti di nuovo (solo loro) fino a max_rounds;
+    se ne restano, solleva ValueError. Una risposta senza alcun elemento valido non entra nella
+    cache e i nuovi tentativi non la leggono, così non viene servita di nuovo la stessa risposta.
+    """
+    results, pending = {}, dict(items)
+    for round_number in range(max_rounds):
+        if not pending:
+            break
+        if round_number:
+            print(f"     ↻ {len(pending)} elementi mancanti o non validi: nuova richiesta.")
+        keys = set(pending)
+        has_valid_item = lambda text: any(validate(value) is not None for key, value in parse_keyed_json(text).items() if key in keys)
+        response = pool.generate(model, build_batched_prompt(header, pending), validate=has_valid_item, refresh=bool(round_number))
+        parsed = parse_keyed_json(response.text)
+        for key in list(pending):
+            value = validate(parsed.get(key))
+            if value is not None:
+                results[key] = value
+                del pending[key]
+    if pending:
+        raise ValueError(f"Risposta incompleta dopo {max_rounds} tentativi per: {sorted(pending)}")
+    return results
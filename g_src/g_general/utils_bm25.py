@@ -0,0 +1,146 @@
+import os
+import re
+import json
+import math
+import hashlib
+import unicodedata
+from types import SimpleNamespace
+from g_src.g_general.utils_vector_index import get_chunk_id
+
+# Parametri standard di Okapi BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"\w+")
+ITALIAN_STOPWORDS = set("""
+a ad agli ai al alla alle allo anche c che chi ci coi col come con cosa cui d da dagli dai dal dalla dalle dallo qual
+dei del dell della delle dello degli di dove e ed essere fra gli ha hanno i il in l la le lo ma ne negli nei nel nell
+nella nelle nello non o per piu puo possono quale quali quando quanti quanto questa queste questi questo se si sono
+su sugli sui sul sull sulla sulle sullo tra un una uno
+""".split())
+# Suffissi derivazionali rimossi dallo stemmer leggero, dal più lungo al più corto
+STEM_SUFFIXES = ("amente", "imente", "mente", "zioni", "zione", "sioni", "sione", "tori", "tore", "trici", "trice")
+
+def fold_accents(text: str) -> str:
+    """Rimuove i segni diacritici ('è' -> 'e', 'più' -> 'piu')."""
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+def light_stem(token: str) -> str:
+    """
+    Stemmer leggero per l'italiano: rimuove alcuni suffissi derivazionali e la vocale finale
+    di genere/numero, così 'parlamentare'/'parlamentari' e 'legale'/'legali' coincidono.
+    """
+    if len(token) <= 4 or token.isdigit():
+        return token
+    for suffix in STEM_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    if token[-1] in "aeio":
+        token = token[:-1]
+        if token.endswith(("ch", "gh")):
+            token = token[:-1]
+    return token
+
+def tokenize_italian(text: str) -> list:
+    """Normalizzazione per la ricerca lessicale: minuscolo, senza accenti, senza stopword, con stemming leggero."""
+    tokens = TOKEN_PATTERN.findall(fold_accents(text.lower()))
+    return [light_stem(t) for t in tokens if t not in ITALIAN_STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+def _chunk_text(chunk: dict) -> str:
+    """Testo indicizzato di un chunk: testo del comma più le sue keyword."""
+    return f"{chunk.get('testo_originale_comma', '')} {' '.join(chunk.get('keywords', []) or [])}"
+
+def _corpus_signature(all_chunks: list) -> str:
+    digest = hashlib.sha256()
+    for chunk in all_chunks:
+        digest.update(get_chunk_id(chunk).encode("utf-8"))
+        digest.update(_chunk_text(chunk).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def build_bm25_index(all_chunks: list, index_path: str | None = None) -> dict:
+    """
+    Costruisce l'indice invertito BM25 sui chunk (testo del comma e keyword).
+    Per ogni termine memorizza le coppie (chunk, peso BM25) già calcolate: la ricerca è
+    solo una somma sui posting dei termini della query. Se 'index_path' è indicato, l'indice
+    viene letto da quel file quando il corpus non è cambiato, e riscritto altrimenti.
+    """
+    signature = _corpus_signature(all_chunks)
+    postings = None
+    if index_path and os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            prebuilt = json.load(f)
+        if prebuilt.get("signature") == signature:
+            postings = prebuilt["postings"]
+            print(f"   - Indice BM25 caricato da '{os.path.basename(index_path)}'.")
+
+    if postings is None:
+        term_frequencies = []
+        document_frequency = {}
+        for chunk in all_chunks:
+            frequencies = {}
+            for token in tokenize_italian(_chunk_text(chunk)):
+                frequencies[token] = frequencies.get(token, 0) + 1
+            term_frequencies.append(frequencies)
+            for token in frequencies:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+
+        doc_count = len(all_chunks)
+        doc_lengths = [sum(f.values()) for f in term_frequencies]
+        avg_length = sum(doc_lengths) / max(doc_count, 1)
+        postings = {}
+        for doc_idx, frequencies in enumerate(term_frequencies):
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[doc_idx] / max(avg_length, 1e-9))
+            for token, tf in frequencies.items():
+                idf = math.log(1 + (doc_count - document_frequency[token] + 0.5) / (document_frequency[token] + 0.5))
+                postings.setdefault(token, []).append([doc_idx, round(idf * tf * (BM25_K1 + 1) / (tf + length_norm), 6)])
+
+        if index_path:
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            with open(index_path, "w", encoding="utf-8") as f:
+                json.dump({"signature": signature, "postings": postings}, f, ensure_ascii=False)
+
+    print(f"   - Indice BM25 pronto: {len(all_chunks)} chunk, {len(postings)} termini.")
+    return {
+        "signature": signature,
+        "postings": postings,
+        "payloads": all_chunks,
+        "ids": [get_chunk_id(chunk) for chunk in all_chunks],
+    }
+
+def search_bm25(index: dict, query: str, document_type: str | None = None, articles: list | None = None, limit: int = 20) -> list:
+    """
+    Ricerca lessicale BM25 con gli stessi filtri 'document_type'/'articolo' della ricerca vettoriale.
+    Restituisce oggetti con gli attributi 'id', 'score' e 'payload' come gli ScoredPoint.
+    """
+    scores = {}
+    for token in set(tokenize_italian(query)):
+        for doc_idx, weight in index["postings"].get(token, []):
+            scores[doc_idx] = scores.get(doc_idx, 0.0) + weight
+
+    article_set = {str(a) for a in articles} if articles else None
+    ranked = []
+    for doc_idx, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+        payload = index["payloads"][doc_idx]
+        if document_type and payload.get("document_type") != document_type:
+            continue
+        if article_set and str(payload.get("articolo")) not in article_set:
+            continue
+        ranked.append(SimpleNamespace(id=index["ids"][doc_idx], score=score, payload=payload, score_type="bm25"))
+        if len(ranked) >= limit:
+            break
+    return ranked
+
+def reciprocal_rank_fusion(result_lists: list, k: int = 60, limit: int = 20) -> list:
+    """
+    Fonde più liste di risultati con la Reciprocal Rank Fusion: score = somma di 1 / (k + rank).
+    I chunk sono identificati dal loro id stabile (documento, articolo, comma), così gli hit di
+    Qdrant (id uuid) e quelli BM25 si sommano correttamente.
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results, start=1):
+            chunk_id = get_chunk_id(hit.payload)
+            entry = fused.setdefault(chunk_id, {"score": 0.0, "hit": hit})
+            entry["score"] += 1.0 / (k + rank)
+    ordered = sorted(fused.items(), key=lambda item: item[1]["score"], reverse=True)[:limit]
+    return [SimpleNamespace(id=chunk_id, score=entry["score"], payload=entry["hit"].payload, score_type="rrf") for chunk_id, entry in ordered]
@@ -0,0 +1,423 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from datetime import datetime
+from collections import OrderedDict
+from types import SimpleNamespace
+import numpy as np
+
+def normalize_query(text: str) -> str:
+    """Normalizza una domanda per l'uso come chiave di cache (maiuscole, spazi, punteggiatura finale)."""
+    text = unicodedata.normalize("NFKC", text).lower().strip()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" ?!.;:,")
+
+def hash_key(*parts) -> str:
+    """Calcola una chiave SHA-256 stabile a partire da più componenti serializzabili."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# --- VERSIONE DI INGEST DELLE COLLEZIONI ---
+
+def read_ingest_version(manifest_path: str, collection_name: str) -> str:
+    """Legge la versione di ingest registrata per una collezione ('0' se assente)."""
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f).get(collection_name, {}).get("version", "0")
+    except (FileNotFoundError, json.JSONDecodeError):
+        return "0"
+
+def record_ingest_version(manifest_path: str, collection_name: str, note: str = "") -> str:
+    """
+    Registra una nuova versione di ingest per la collezione. Va chiamata dagli script
+    di ingest/cancellazione dopo ogni modifica ai punti, per invalidare le cache.
+    """
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+    version = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    manifest[collection_name] = {"version": version, "note": note}
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return version
+
+# --- CACHE LRU IN MEMORIA ---
+
+class LRUCache:
+    """Cache LRU thread-safe con capienza massima."""
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+# --- CACHE DI RETRIEVAL A DUE LIVELLI ---
+
+def serialize_hits(hits: list) -> list:
+    """Converte i risultati di ricerca (ScoredPoint o equivalenti) in dizionari JSON."""
+    return [{"id": str(hit.id), "score": hit.score, "payload": hit.payload} for hit in hits]
+
+def deserialize_hits(records: list) -> list:
+    """Ricostruisce oggetti con 'id', 'score' e 'payload' dai dizionari in cache."""
+    return [SimpleNamespace(**record) for record in records]
+
+class RetrievalCache:
+    """
+    Cache a due livelli davanti a run_rag_search:
+    - 'embeddings': chiave (modello di embedding, domanda normalizzata) -> vettore;
+    - 'results': chiave (hash del vettore, filtro, collezione, backend) -> risultati grezzi.
+    Ogni livello ha uno strato LRU in memoria e uno strato SQLite opzionale su disco.
+    I risultati sono legati alla versione di ingest: se cambia, le voci vecchie vengono scartate.
+    """
+
+    def __init__(self, ingest_version: str, memory_size: int = 512, sqlite_path: str | None = None):
+        self.ingest_version = ingest_version
+        self.memory = {"embeddings": LRUCache(memory_size), "results": LRUCache(memory_size)}
+        self.stats = {"hits": 0, "misses": 0}
+        self._db = None
+        self._db_lock = threading.Lock()
+        if sqlite_path:
+            os.makedirs(os.path.dirname(sqlite_path), exist_ok=True)
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            with self._db_lock, self._db:
+                for table in self.memory:
+                    self._db.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, version TEXT, value TEXT)")
+                self._db.execute("DELETE FROM results WHERE version != ?", (ingest_version,))
+
+    def _get(self, level: str, key: str):
+        value = self.memory[level].get(key)
+        if value is None and self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(f"SELECT value, version FROM {level} WHERE key = ?", (key,)).fetchone()
+            if row and (level != "results" or row[1] == self.ingest_version):
+                value = json.loads(row[0])
+                self.memory[level].put(key, value)
+        self.stats["hits" if value is not None else "misses"] += 1
+        return value
+
+    def _put(self, level: str, key: str, value):
+        self.memory[level].put(key, value)
+        if self._db is not None:
+            with self._db_lock, self._db:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {level} (key, version, value) VALUES (?, ?, ?)",
+                    (key, self.ingest_version, json.dumps(value, ensure_ascii=False))
+                )
+
+    @staticmethod
+    def embedding_key(model_name: str, query: str) -> str:
+        return hash_key(model_name, normalize_query(query))
+
+    def results_key(self, query_vector: list, query_filter, collection_name: str, backend: str) -> str:
+        vector_hash = hashlib.sha256(json.dumps(query_vector).encode("utf-8")).hexdigest()
+        return hash_key(vector_hash, repr(query_filter), collection_name, backend, self.ingest_version)
+
+    def get_embedding(self, model_name: str, query: str) -> list | None:
+        return self._get("embeddings", self.embedding_key(model_name, query))
+
+    def put_embedding(self, model_name: str, query: str, vector: list):
+        self._put("embeddings", self.embedding_key(model_name, query), list(vector))
+
+    def get_results(self, key: str) -> list | None:
+        records = self._get("results", key)
+        return deserialize_hits(records) if records is not None else None
+
+    def put_results(self, key: str, hits: list):
+        self._put("results", key, serialize_hits(hits))
+
+    def invalidate(self, new_ingest_version: str):
+        """Svuota il livello dei risultati quando la versione di ingest della collezione cambia."""
+        self.ingest_version = new_ingest_version
+        self.memory["results"].clear()
+        if self._db is not None:
+            with self._db_lock, self._db:
+                self._db.execute("DELETE FROM results WHERE version != ?", (new_ingest_version,))
+
+# --- CACHE SEMANTICA DELLE RISPOSTE ---
+
+def answer_cache_version(collection_name: str, ingest_version: str, prompts: dict) -> str:
+    """Versione della cache delle risposte: cambia con la collezione, il suo ingest o i prompt di sistema."""
+    return hash_key(collection_name, ingest_version, sorted(prompts.items()))[:16]
+
+class SemanticAnswerCache:
+    """
+    Cache delle risposte finali per domande quasi identiche (parafrasi).
+    Una risposta è riutilizzabile se è stata generata con lo stesso prompt di sistema e lo
+    stesso modello ('scope'), su commi recuperati che si sovrappongono almeno per
+    'min_chunk_overlap' (Jaccard), e per una domanda il cui embedding ha similarità coseno
+    almeno 'similarity_threshold' con quella attuale (ricerca del vicino più prossimo).
+    Senza embedding (es. lookup diretto degli articoli) serve la stessa domanda normalizzata.
+    Le voci sono persistite in SQLite e scartate quando cambia la versione.
+    """
+
+    def __init__(self, version: str, sqlite_path: str | None = None, similarity_threshold: float = 0.95, min_chunk_overlap: float = 0.8):
+        self.version = version
+        self.similarity_threshold = similarity_threshold
+        self.min_chunk_overlap = min_chunk_overlap
+        self.stats = {"hits": 0, "misses": 0}
+        self._entries = {}  # scope -> lista di voci
+        self._matrices = {}  # scope -> matrice dei vettori normalizzati (ricostruita quando serve)
+        self._lock = threading.Lock()
+        self._db = None
+        if sqlite_path:
+            os.makedirs(os.path.dirname(sqlite_path), exist_ok=True)
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            with self._db:
+                self._db.execute("CREATE TABLE IF NOT EXISTS answers (version TEXT, scope TEXT, question TEXT, vector TEXT, chunk_ids TEXT, answer TEXT)")
+                self._db.execute("DELETE FROM answers WHERE version != ?", (version,))
+            for scope, question, vector, chunk_ids, answer in self._db.execute("SELECT scope, question, vector, chunk_ids, answer FROM answers"):
+                self._add_entry(scope, question, json.loads(vector), json.loads(chunk_ids), answer)
+
+    @staticmethod
+    def scope_key(system_prompt: str, model_name: str) -> str:
+        return hash_key(system_prompt, model_name)
+
+    @staticmethod
+    def _normalize_vector(vector: list | None):
+        if vector is None:
+            return None
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    def _add_entry(self, scope: str, question: str, vector: list | None, chunk_ids: list, answer: str):
+        self._entries.setdefault(scope, []).append({
+            "question": normalize_query(question),
+            "vector": self._normalize_vector(vector),
+            "chunk_ids": frozenset(chunk_ids),
+            "answer": answer,
+        })
+        self._matrices.pop(scope, None)
+
+    def _overlap(self, entry: dict, chunk_ids: frozenset) -> float:
+        union = entry["chunk_ids"] | chunk_ids
+        return len(entry["chunk_ids"] & chunk_ids) / len(union) if union else 1.0
+
+    def lookup(self, scope: str, question: str, query_vector: list | None, chunk_ids: list) -> dict | None:
+        """Restituisce {'answer', 'question', 'similarity'} della voce più simile compatibile, o None."""
+        chunk_ids = frozenset(chunk_ids)
+        with self._lock:
+            entries = self._entries.get(scope, [])
+            best = None
+            if query_vector is not None:
+                with_vectors = [e for e in entries if e["vector"] is not None]
+                if with_vectors:
+                    if scope not in self._matrices:
+                        self._matrices[scope] = (with_vectors, np.stack([e["vector"] for e in with_vectors]))
+                    candidates, matrix = self._matrices[scope]
+                    similarities = matrix @ self._normalize_vector(query_vector)
+                    for i in np.argsort(-similarities):
+                        if similarities[i] < self.similarity_threshold:
+                            break
+                        if self._overlap(candidates[i], chunk_ids) >= self.min_chunk_overlap:
+                            best = {"answer": candidates[i]["answer"], "question": candidates[i]["question"], "similarity": float(similarities[i])}
+                            break
+            else:
+                normalized = normalize_query(question)
+                for entry in entries:
+                    if entry["question"] == normalized and self._overlap(entry, chunk_ids) >= self.min_chunk_overlap:
+                        best = {"answer": entry["answer"], "question": entry["question"], "similarity": 1.0}
+                        break
+        self.stats["hits" if best else "misses"] += 1
+        return best
+
+    def store(self, scope: str, question: str, query_vector: list | None, chunk_ids: list, answer: str):
+        with self._lock:
+            self._add_entry(scope, question, query_vector, chunk_ids, answer)
+            if self._db is not None:
+                with self._db:
+                    self._db.execute(
+                        "INSERT INTO answers (version, scope, question, vector, chunk_ids, answer) VALUES (?, ?, ?, ?, ?, ?)",
+                        (self.version, scope, normalize_query(question), json.dumps(list(map(float, query_vector)) if query_vector is not None else None), json.dumps(sorted(chunk_ids)), answer)
+                    )
+
+    def ensure_version(self, version: str):
+        """Svuota la cache se la versione (collezione, ingest, prompt) è cambiata."""
+        if version == self.version:
+            return
+        with self._lock:
+            self.version = version
+            self._entries.clear()
+            self._matrices.clear()
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM answers WHERE version != ?", (version,))
+
+# --- CACHE PERSISTENTE DELLE RISPOSTE LLM (SCRIPT DI PROCESSAMENTO) ---
+
+def model_identity(model) -> tuple:
+    """Nome del modello e configurazione di generazione di un GenerativeModel, per la chiave di cache."""
+    model_name = getattr(model, "model_name", None) or getattr(model, "_model_name", None) or repr(model)
+    generation_config = getattr(model, "_generation_config", None)
+    return model_name, generation_config
+
+def response_is_valid(text: str, validate=None) -> bool:
+    """
+    Esito del controllo del chiamante su una risposta: 'validate(text)' (es. il parsing del JSON)
+    non deve sollevare errori né restituire None/False. Senza 'validate' ogni testo è valido.
+    """
+    if validate is None:
+        return True
+    try:
+        result = validate(text)
+    except Exception:
+        return False
+    return result is not None and result is not False
+
+class CachedResponse:
+    """Risposta minima compatibile con quelle del modello (solo '.text'), servita dalla cache o appena generata."""
+
+    def __init__(self, text: str, cached: bool):
+        self.text = text
+        self.cached = cached
+
+class LLMResponseCache:
+    """
+    Cache su disco (SQLite) delle risposte dei modelli generativi, indirizzata dal contenuto:
+    chiave = hash(modello, prompt, configurazione di generazione). È condivisa da tutti gli
+    script di c_processors, quindi lo stesso prompt costa una sola chiamata in tutta la pipeline.
+    Le voci meno usate di recente vengono eliminate quando si supera 'max_bytes'.
+    Con 'bypass' la cache non viene letta ma le nuove risposte vengono comunque salvate.
+    """
+
+    def __init__(self, sqlite_path: str, max_bytes: int = 256 * 1024 * 1024, bypass: bool = False):
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(sqlite_path), exist_ok=True)
+        # Più script possono usare la stessa cache in parallelo: attesa sui lock invece di errore
+        self._db = sqlite3.connect(sqlite_path, check_same_thread=False, timeout=30)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, last_access REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(model_name: str, prompt: str, generation_config=None) -> str:
+        return hash_key(model_name, prompt, generation_config)
+
+    def get(self, key: str) -> str | None:
+        if self.bypass:
+            self.stats["misses"] += 1
+            return None
+        with self._lock, self._db:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (datetime.now().timestamp(), key))
+        self.stats["hits" if row else "misses"] += 1
+        return row[0] if row else None
+
+    def put(self, key: str, model_name: str, response: str):
+        size = len(response.encode("utf-8"))
+        with self._lock, self._db:
+            previous = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, response, size, datetime.now().timestamp())
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Elimina le voci usate meno di recente fino a scendere al 90% della capienza."""
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        target = int(self.max_bytes * 0.9)
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            if self._total_bytes <= target:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total_bytes -= size
+            self.stats["evictions"] += 1
+
+    def summary(self) -> str:
+        total = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / total if total else 0.0
+        return (
+            f"{self.stats['hits']} hit, {self.stats['misses']} miss ({hit_rate:.0%}), "
+            f"{self.stats['evictions']} eliminate, {self._total_bytes / (1024 * 1024):.1f} MB su disco"
+            + (" [bypass]" if self.bypass else "")
+        )
+
+def llm_cache_from_env(cache_dir: str) -> LLMResponseCache | None:
+    """
+    Cache delle risposte LLM degli script di processamento in cache_dir/llm_cache.sqlite.
+    LLM_CACHE=0 la disattiva, LLM_CACHE_BYPASS=1 ignora le voci esistenti (ma salva le nuove),
+    LLM_CACHE_MAX_MB ne limita la dimensione.
+    """
+    if os.getenv("LLM_CACHE", "1") == "0":
+        return None
+    return LLMResponseCache(
+        os.path.join(cache_dir, "llm_cache.sqlite"),
+        max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024),
+        bypass=os.getenv("LLM_CACHE_BYPASS", "0") == "1",
+    )
+
+class CachedModel:
+    """
+    Modello generativo con la cache delle risposte davanti: `generate_content` restituisce la
+    risposta in cache se il prompt è già stato inviato allo stesso modello con la stessa
+    configurazione, altrimenti chiama il modello e salva il testo. Con 'validate' (es. il
+    parsing del JSON atteso) una risposta viene salvata, e servita dalla cache, solo se supera
+    il controllo: una risposta malformata non si ripresenta identica a ogni nuovo tentativo.
+    Le risposte senza testo (es. bloccate) sollevano l'errore del modello e non vengono salvate.
+    """
+
+    def __init__(self, model, cache: LLMResponseCache | None):
+        self.model = model
+        self.cache = cache
+        self.model_name, self.generation_config = model_identity(model)
+
+    def _key(self, prompt: str, kwargs: dict) -> str:
+        return LLMResponseCache.key(self.model_name, prompt, [self.generation_config, kwargs])
+
+    def lookup(self, prompt: str, validate=None, **kwargs) -> CachedResponse | None:
+        """Solo lettura dalla cache (nessuna chiamata al modello); una voce che non supera 'validate' è ignorata."""
+        if self.cache is None:
+            return None
+        text = self.cache.get(self._key(prompt, kwargs))
+        if text is None or not response_is_valid(text, validate):
+            return None
+        return CachedResponse(text, cached=True)
+
+    def generate_content(self, prompt: str, validate=None, **kwargs) -> CachedResponse:
+        cached = self.lookup(prompt, validate=validate, **kwargs)
+        if cached is not None:
+            return cached
+        return self.generate_uncached(prompt, validate=validate, **kwargs)
+
+    def generate_uncached(self, prompt: str, validate=None, **kwargs) -> CachedResponse:
+        """Chiama sempre il modello; salva la risposta (sostituendo quella in cache) solo se supera 'validate'."""
+        text = self.model.generate_content(prompt, **kwargs).text
+        if self.cache is not None and response_is_valid(text, validate):
+            self.cache.put(self._key(prompt, kwargs), self.model_name, text)
+        return CachedResponse(text, cached=False)
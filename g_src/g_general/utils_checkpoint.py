@@ -0,0 +1,156 @@
+import os
+import json
+
+# ==============================================================================
+# --- CHECKPOINT APPEND-ONLY (JSONL) ---
+# Gli script che salvano i progressi dopo ogni articolo o batch (keyword, tag,
+# embedding) non riscrivono più l'intero file accumulato: ogni unità completata
+# viene aggiunta come una riga JSON {"key": ..., "value": ...}, sincronizzata su
+# disco. Il costo di un salvataggio resta costante, la ripresa legge solo le
+# chiavi e l'artefatto finale (JSON) viene scritto una volta sola, a fine lavoro.
+# ==============================================================================
+
+KEY_PREFIX = '{"key": '
+_decoder = json.JSONDecoder()
+
+def _line_key(line: str) -> str:
+    """Chiave di una riga, decodificando solo la stringa iniziale (non il valore, es. un vettore)."""
+    if line.startswith(KEY_PREFIX):
+        return _decoder.raw_decode(line, len(KEY_PREFIX))[0]
+    return json.loads(line)["key"]
+
+def _fsync_write(path: str, text: str, mode: str):
+    with open(path, mode, encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+def write_json_durable(path: str, data):
+    """Scrive un file JSON in modo atomico (file temporaneo sincronizzato, poi rename)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    _fsync_write(tmp_path, json.dumps(data, ensure_ascii=False, indent=2), "w")
+    os.replace(tmp_path, path)
+
+class JsonlCheckpoint:
+    """
+    Checkpoint su file JSONL: una riga per unità completata (articolo o comma).
+    Se una chiave compare più volte vale l'ultima riga; una riga finale troncata
+    (crash durante la scrittura) viene ignorata in lettura e rimossa al primo append.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tail_checked = False
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _repair_tail(self):
+        """Tronca un'eventuale riga incompleta in coda, così il prossimo append inizia su una riga nuova."""
+        self._tail_checked = True
+        if not self.exists() or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            content = f.read()
+            f.truncate(content.rfind(b"\n") + 1)
+        print(f"⚠️ Riga incompleta rimossa in coda al checkpoint '{os.path.basename(self.path)}'.")
+
+    def append(self, entries: list):
+        """Aggiunge le coppie (chiave, valore) con una sola scrittura sincronizzata su disco."""
+        if not self._tail_checked:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._repair_tail()
+        lines = "".join(json.dumps({"key": str(key), "value": value}, ensure_ascii=False) + "\n" for key, value in entries)
+        _fsync_write(self.path, lines, "a")
+
+    def _lines(self):
+        if not self.exists():
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    # Riga in coda senza terminatore: scrittura interrotta, il record non è completo
+                    print(f"⚠️ Riga incompleta ignorata in coda al checkpoint '{os.path.basename(self.path)}'.")
+                elif line.strip():
+                    yield line
+
+    def keys(self) -> set:
+        """Chiavi già salvate, senza decodificare i valori."""
+        keys = set()
+        for line in self._lines():
+            try:
+                keys.add(_line_key(line))
+            except (json.JSONDecodeError, KeyError, TypeError):
+                print(f"⚠️ Riga non valida ignorata nel checkpoint '{os.path.basename(self.path)}'.")
+        return keys
+
+    def items(self) -> dict:
+        """{chiave: valore} nell'ordine di prima scrittura (per chiavi ripetute vale l'ultimo valore)."""
+        items = {}
+        for line in self._lines():
+            try:
+                record = json.loads(line)
+                items[record["key"]] = record["value"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                print(f"⚠️ Riga non valida ignorata nel checkpoint '{os.path.basename(self.path)}'.")
+        return items
+
+    def rewrite(self, entries: list):
+        """Sostituisce in modo atomico l'intero checkpoint (usato solo per potatura e ripristino)."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        _fsync_write(tmp_path, "".join(json.dumps({"key": str(key), "value": value}, ensure_ascii=False) + "\n" for key, value in entries), "w")
+        os.replace(tmp_path, self.path)
+        self._tail_checked = True
+
+    def compact(self, final_path: str, flatten: bool = False) -> list:
+        """
+        Scrive l'artefatto finale (lista JSON dei valori; con 'flatten' i valori sono liste
+        da concatenare, es. i commi di un articolo), sostituendo in modo atomico quello
+        precedente, e rimuove il checkpoint.
+        """
+        values = list(self.items().values())
+        data = [record for group in values for record in group] if flatten else values
+        write_json_durable(final_path, data)
+        os.remove(self.path)
+        return data
+
+def reopen_checkpoint(final_path: str, checkpoint: JsonlCheckpoint, key_of, drop_keys: set = frozenset(), grouped: bool = False):
+    """
+    Riporta uno stadio in 'progresso' senza le chiavi indicate: se manca il checkpoint lo
+    ricostruisce dall'artefatto finale (record raggruppati per chiave con 'grouped'). Lo script
+    riprende dal checkpoint e rigenera solo ciò che manca; il file finale precedente resta al suo
+    posto (es. per l'indice vettoriale locale) finché `compact` non lo sostituisce, anche se il
+    lavoro si interrompe prima.
+    """
+    if checkpoint.exists():
+        entries = list(checkpoint.items().items())
+    elif os.path.exists(final_path):
+        with open(final_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        if grouped:
+            groups = {}
+            for record in records:
+                groups.setdefault(str(key_of(record)), []).append(record)
+            entries = list(groups.items())
+        else:
+            entries = [(str(key_of(record)), record) for record in records]
+    else:
+        return
+    checkpoint.rewrite([(key, value) for key, value in entries if key not in drop_keys])
+
+def completed_keys(final_path: str, checkpoint_path: str, key_of) -> set:
+    """Chiavi completate di uno stadio: dal checkpoint se il lavoro è in corso, altrimenti dal file finale."""
+    checkpoint = JsonlCheckpoint(checkpoint_path)
+    if checkpoint.exists():
+        return checkpoint.keys()
+    try:
+        with open(final_path, "r", encoding="utf-8") as f:
+            return {str(key_of(record)) for record in json.load(f)}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return set()
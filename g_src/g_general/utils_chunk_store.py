@@ -0,0 +1,83 @@
+import re
+from types import SimpleNamespace
+from g_src.g_general.utils_router import ARTICLE_SUFFIXES
+from g_src.g_general.utils_vector_index import get_chunk_id
+
+SUFFIX_RANK = {suffix: rank for rank, suffix in enumerate(ARTICLE_SUFFIXES.split("|"), start=1)}
+COMMA_PATTERN = re.compile(r"(\d+)(?:\s*-?\s*([a-z]+))?", re.IGNORECASE)
+
+def comma_sort_key(comma) -> tuple:
+    """Chiave di ordinamento dei commi: '1' < '1-bis' < '1-ter' < '2' (i valori non numerici in coda)."""
+    match = COMMA_PATTERN.fullmatch(str(comma).strip())
+    if not match:
+        return (float("inf"), 0)
+    suffix = (match.group(2) or "").lower()
+    return (int(match.group(1)), SUFFIX_RANK.get(suffix, 0 if not suffix else len(SUFFIX_RANK) + 1))
+
+def build_chunk_store(all_chunks: list) -> dict:
+    """
+    Indicizza in memoria i chunk caricati all'avvio:
+    - 'by_key': (document_type, articolo, comma) -> chunk;
+    - 'by_article': (document_type, articolo) -> chunk dell'articolo in ordine di comma;
+    - 'doc_types': articolo -> tipi di documento che lo contengono (in ordine di caricamento).
+    """
+    store = {"by_key": {}, "by_article": {}, "doc_types": {}}
+    for chunk in all_chunks:
+        doc_type, article_id, comma = chunk.get("document_type"), str(chunk.get("articolo")), str(chunk.get("comma"))
+        store["by_key"][(doc_type, article_id, comma)] = chunk
+        store["by_article"].setdefault((doc_type, article_id), []).append(chunk)
+        doc_types = store["doc_types"].setdefault(article_id, [])
+        if doc_type not in doc_types:
+            doc_types.append(doc_type)
+    for chunks in store["by_article"].values():
+        chunks.sort(key=lambda c: comma_sort_key(c.get("comma")))
+    return store
+
+def lookup_articles(chunk_store: dict, target_doc_type: str | None, target_articles: list) -> list:
+    """
+    Restituisce tutti i commi degli articoli richiesti, articolo per articolo e in ordine di comma,
+    come oggetti con gli attributi 'id', 'score' e 'payload' (come gli ScoredPoint di Qdrant).
+    Senza documento indicato, l'articolo viene cercato in tutti i documenti che lo contengono.
+    """
+    hits = []
+    for article_id in target_articles:
+        doc_types = [target_doc_type] if target_doc_type else chunk_store["doc_types"].get(str(article_id), [])
+        for doc_type in doc_types:
+            for chunk in chunk_store["by_article"].get((doc_type, str(article_id)), []):
+                hits.append(SimpleNamespace(id=get_chunk_id(chunk), score=1.0, payload=chunk, score_type="direct"))
+    return hits
+
+def lookup_targets(chunk_store: dict | None, targets: list) -> tuple:
+    """
+    Lookup diretto per target ({'text', 'document_type', 'articles'}): ogni target usa il proprio
+    filtro di documento. Restituisce (commi trovati, nell'ordine dei target e senza duplicati;
+    target senza articoli o senza commi nel chunk store, da cercare con la ricerca vettoriale).
+    """
+    hits, missing_targets, seen = [], [], set()
+    for target in targets:
+        target_hits = lookup_articles(chunk_store, target["document_type"], target["articles"]) if chunk_store and target["articles"] else []
+        if not target_hits:
+            missing_targets.append(target)
+        for hit in target_hits:
+            if hit.id not in seen:
+                seen.add(hit.id)
+                hits.append(hit)
+    return hits, missing_targets
+
+def chunk_ref(hit) -> dict:
+    """Riferimento compatto a un chunk recuperato (id stabile, coordinate e score, senza testo né payload)."""
+    payload = hit.payload
+    return {
+        "id": get_chunk_id(payload),
+        "document_type": payload.get("document_type"),
+        "document_title": payload.get("document_title"),
+        "articolo": str(payload.get("articolo")),
+        "comma": str(payload.get("comma")),
+        "score": round(float(hit.score), 6),
+    }
+
+def resolve_chunk_ref(chunk_store: dict | None, ref: dict) -> dict | None:
+    """Chunk completo corrispondente a un riferimento compatto, se presente nel chunk store."""
+    if not chunk_store:
+        return None
+    return chunk_store["by_key"].get((ref.get("document_type"), str(ref.get("articolo")), str(ref.get("comma"))))
@@ -0,0 +1,76 @@
+import threading
+from g_src.g_general.utils_qdrant import make_qdrant_client, DEFAULT_GRPC_PORT
+
+# ==============================================================================
+# --- CLIENT A INIZIALIZZAZIONE PIGRA ---
+# I client dei provider (Gemini, OpenAI, Qdrant) e i relativi SDK vengono
+# importati e costruiti solo al primo accesso: un provider mai usato nella
+# sessione non costa nulla all'avvio.
+# ==============================================================================
+
+class LazyClients(dict):
+    """
+    Dizionario dei client in cui alcune chiavi sono registrate con una factory:
+    il valore viene costruito (una sola volta, anche con più thread) al primo accesso.
+    Le chiavi normali si comportano come in un dict qualunque.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._factories = {}
+        self._lock = threading.RLock()
+
+    def register(self, key: str, factory):
+        self._factories[key] = factory
+
+    def __missing__(self, key):
+        factory = self._factories.get(key)
+        if factory is None:
+            raise KeyError(key)
+        with self._lock:
+            if not dict.__contains__(self, key):
+                dict.__setitem__(self, key, factory())
+            return dict.__getitem__(self, key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self._factories
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def is_loaded(self, key: str) -> bool:
+        return dict.__contains__(self, key)
+
+    def load_all(self):
+        """Costruisce tutti i client registrati (anche annidati): equivale all'avvio non pigro."""
+        for key in list(self._factories):
+            value = self[key]
+            if isinstance(value, LazyClients):
+                value.load_all()
+
+def make_gemini_factory(api_key: str):
+    """Factory del modulo google.generativeai, importato e configurato al primo uso."""
+    def factory():
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        return genai
+    return factory
+
+def make_openai_factory(api_key: str):
+    def factory():
+        from openai import OpenAI
+        return OpenAI(api_key=api_key)
+    return factory
+
+def make_qdrant_factory(url: str | None, api_key: str | None, transport: str = "rest", grpc_port: int = DEFAULT_GRPC_PORT):
+    def factory():
+        return make_qdrant_client(url, api_key, transport, grpc_port)
+    return factory
+
+def build_gemini_models(clients: LazyClients, models: dict) -> LazyClients:
+    """Modelli Gemini per chiave ('router', 'default_generator', ...), costruiti al primo uso."""
+    gemini_models = LazyClients()
+    for key, model_name in models.items():
+        if key != 'gpt':
+            gemini_models.register(key, lambda model_name=model_name: clients["genai"].GenerativeModel(model_name))
+    return gemini_models
@@ -0,0 +1,160 @@
+from functools import lru_cache
+from g_src.g_general.utils_vector_index import get_chunk_id
+from g_src.g_general.utils_tracing import traced
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+# Codifica usata quando tiktoken non conosce il modello (es. Gemini): è un'approssimazione
+FALLBACK_ENCODING = "o200k_base"
+
+# Caratteri per token usati per la stima quando il vocabolario tiktoken non è disponibile
+CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=None)
+def get_encoder(model_name: str):
+    """
+    Restituisce il tokenizer tiktoken del modello, o quello di riferimento per i modelli non OpenAI.
+    Se il vocabolario non può essere caricato (es. macchina offline) restituisce None e i token
+    vengono stimati dalla lunghezza del testo.
+    """
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception as e:
+        print(f"⚠️ Tokenizer tiktoken non disponibile ({e.__class__.__name__}). Conteggio dei token stimato.")
+        return None
+
+def count_tokens(encoder, text: str) -> int:
+    if not text:
+        return 0
+    return len(encoder.encode(text)) if encoder else len(text) // CHARS_PER_TOKEN + 1
+
+def format_chunk(hit) -> str:
+    """Formatta un comma recuperato come estratto del contesto, con la sua fonte."""
+    return f"Fonte: [{hit.payload.get('document_title', 'N/D')}] Art. {hit.payload.get('articolo')}, Comma {hit.payload.get('comma')}.\nTesto: {hit.payload.get('testo_originale_comma', '')}"
+
+def format_summary(titolo: str, riassunto: str) -> str:
+    return f"**Contesto dalla Sezione ({titolo}):**\n{riassunto}"
+
+def assemble_context(summaries: list, chunk_texts: list) -> str:
+    """Compone il contesto finale: riassunti delle sezioni seguiti dagli estratti in ordine di pertinenza."""
+    contesto_riassunti_str = CONTEXT_SEPARATOR.join(summaries) + (CONTEXT_SEPARATOR if summaries else "")
+    return f"{contesto_riassunti_str}**Estratti Rilevanti (Ordinati per Pertinenza):**\n{CONTEXT_SEPARATOR.join(chunk_texts)}"
+
+def score_type(hit) -> str:
+    """Tipo di score di un hit: 'direct', 'rrf', 'bm25'; gli hit di Qdrant e dell'indice locale sono coseno."""
+    return getattr(hit, "score_type", "cosine")
+
+def drop_low_score_tail(hits: list, min_relative_score: dict) -> list:
+    """
+    Scarta i commi con score sotto 'min_relative_score[tipo]' × score migliore dello stesso tipo,
+    così ogni fonte (coseno, RRF) è confrontata solo con sé stessa; i tipi senza soglia restano tutti.
+    """
+    top_scores = {}
+    for hit in hits:
+        top_scores[score_type(hit)] = max(top_scores.get(score_type(hit), hit.score), hit.score)
+    kept = []
+    for hit in hits:
+        threshold, top_score = min_relative_score.get(score_type(hit)), top_scores[score_type(hit)]
+        if threshold is None or top_score <= 0 or hit.score >= threshold * top_score:
+            kept.append(hit)
+    return kept
+
+def weight_summaries(hits: list, all_summaries: dict) -> list:
+    """
+    Pesa ogni riassunto di sezione con la somma degli score dei commi che vi appartengono.
+    Restituisce i titoli disponibili in ordine di peso decrescente (a parità, ordine di comparsa).
+    """
+    weights = {}
+    for hit in hits:
+        for titolo in [hit.payload.get(f'livello_{i}_title') for i in range(3, 0, -1)]:
+            if titolo and all_summaries.get(titolo):
+                weights[titolo] = weights.get(titolo, 0.0) + hit.score
+    return sorted(weights, key=lambda t: -weights[t])
+
+@traced("context_assembly")
+def build_rag_context(retrieved_hits: list, all_summaries: dict, model_name: str, token_budget: int, summary_share: float = 0.3, min_relative_score: dict | None = None) -> tuple:
+    """
+    Costruisce il contesto per la generazione entro un budget di token:
+    1. elimina i commi duplicati (stesso chunk o stesso testo);
+    2. scarta la coda a basso score (sotto 'min_relative_score[tipo]' × score migliore dello
+       stesso tipo di score, soglie da config["context_min_relative_score"]; senza soglie
+       non viene scartato nulla);
+    3. riempie il budget con i commi in ordine di pertinenza, riservando ai riassunti
+       fino a 'summary_share' del budget, e con i riassunti pesati per score;
+    4. usa l'eventuale budget residuo per i commi rimasti fuori.
+    Restituisce (contesto, commi inclusi, statistiche sui token).
+    """
+    encoder = get_encoder(model_name)
+
+    unique_hits, seen_ids, seen_texts = [], set(), set()
+    for hit in retrieved_hits:
+        chunk_id = get_chunk_id(hit.payload)
+        text = hit.payload.get("testo_originale_comma", "").strip()
+        if chunk_id in seen_ids or (text and text in seen_texts):
+            continue
+        seen_ids.add(chunk_id)
+        seen_texts.add(text)
+        unique_hits.append(hit)
+
+    candidate_hits = drop_low_score_tail(unique_hits, min_relative_score or {})
+
+    chunk_texts = [format_chunk(hit) for hit in candidate_hits]
+    chunk_tokens = [count_tokens(encoder, text) for text in chunk_texts]
+    summary_titles = weight_summaries(candidate_hits, all_summaries)
+    summary_texts = [format_summary(titolo, all_summaries[titolo]) for titolo in summary_titles]
+    summary_tokens = [count_tokens(encoder, text) for text in summary_texts]
+
+    # Token del contesto non limitato (tutti i commi e tutti i riassunti), per misurare il risparmio
+    full_titles = weight_summaries(retrieved_hits, all_summaries)
+    full_context = assemble_context(
+        [format_summary(t, all_summaries[t]) for t in full_titles],
+        [format_chunk(hit) for hit in retrieved_hits]
+    )
+    tokens_full = count_tokens(encoder, full_context)
+
+    separator_tokens = count_tokens(encoder, CONTEXT_SEPARATOR)
+    used = count_tokens(encoder, assemble_context([], []))
+    kept_chunks = set()
+    chunk_budget = token_budget * (1 - summary_share)
+    for i, tokens in enumerate(chunk_tokens):
+        # Il comma più pertinente entra sempre, anche se da solo supera il budget
+        if i == 0 or used + tokens + separator_tokens <= chunk_budget:
+            kept_chunks.add(i)
+            used += tokens + separator_tokens
+
+    kept_summaries = []
+    for i, tokens in enumerate(summary_tokens):
+        if used + tokens + separator_tokens <= token_budget:
+            kept_summaries.append(i)
+            used += tokens + separator_tokens
+
+    for i, tokens in enumerate(chunk_tokens):
+        if i not in kept_chunks and used + tokens + separator_tokens <= token_budget:
+            kept_chunks.add(i)
+            used += tokens + separator_tokens
+
+    for i in kept_summaries:
+        print(f"✅ Riassunto per '{summary_titles[i]}' aggiunto al contesto.")
+
+    kept_hits = [candidate_hits[i] for i in sorted(kept_chunks)]
+    context = assemble_context([summary_texts[i] for i in kept_summaries], [chunk_texts[i] for i in sorted(kept_chunks)])
+    tokens_final = count_tokens(encoder, context)
+    stats = {
+        "token_budget": token_budget,
+        "tokens_full": tokens_full,
+        "tokens_final": tokens_final,
+        "tokens_saved": max(tokens_full - tokens_final, 0),
+        "chunks_retrieved": len(retrieved_hits),
+        "chunks_kept": len(kept_hits),
+        "summaries_available": len(full_titles),
+        "summaries_kept": len(kept_summaries),
+    }
+    print(
+        f"✂️  Contesto: {tokens_final} token su budget {token_budget} "
+        f"(senza limiti: {tokens_full}, risparmiati {stats['tokens_saved']}). "
+        f"Commi {len(kept_hits)}/{len(retrieved_hits)}, riassunti {len(kept_summaries)}/{len(full_titles)}."
+    )
+    return context, kept_hits, stats
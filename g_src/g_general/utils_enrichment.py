@@ -0,0 +1,209 @@
+import os
+import re
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from g_src.g_general.utils_context import CHARS_PER_TOKEN
+
+# ==============================================================================
+# --- POOL DI ARRICCHIMENTO LLM CON RATE LIMITING ---
+# Gli script di arricchimento (riassunti, keyword, tag) eseguono le chiamate al
+# modello in parallelo su un pool di thread. Un limitatore a token bucket
+# condiviso rispetta il budget di richieste e di token al minuto; gli errori
+# 429/5xx vengono ripetuti con backoff esponenziale con jitter al posto delle
+# pause fisse. I risultati tornano nell'ordine di input, così ogni script salva
+# il checkpoint per articolo esattamente come prima, da un solo thread.
+# ==============================================================================
+
+DEFAULT_WORKERS = 4
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_TOKENS_PER_MINUTE = 250_000
+# Token di output stimati per chiamata, sommati a quelli del prompt nella prenotazione del budget
+EXPECTED_OUTPUT_TOKENS = 512
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Solo se l'errore non ha tipo né codice riconoscibili: il codice HTTP in testa al messaggio
+# (formato degli errori di google.api_core, es. "503 The service is currently unavailable.")
+RETRYABLE_MESSAGE = re.compile(r'^\s*(?:429|500|502|503|504)\b|resource has been exhausted|rate limit exceeded', re.IGNORECASE)
+# Quote giornaliere esaurite: ripetere con backoff non serve fino al giorno dopo
+EXHAUSTED_QUOTA_MESSAGE = re.compile(r'per ?day', re.IGNORECASE)
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    RETRYABLE_EXCEPTIONS = (
+        google_exceptions.TooManyRequests,  # include ResourceExhausted (429)
+        google_exceptions.InternalServerError,
+        google_exceptions.BadGateway,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.GatewayTimeout,
+        google_exceptions.DeadlineExceeded,
+    )
+except ImportError:
+    RETRYABLE_EXCEPTIONS = ()
+
+class TokenBucket:
+    """Bucket che si ricarica a velocità costante (unità al minuto), fino alla capacità."""
+
+    def __init__(self, per_minute: float, capacity: float | None = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.available = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0):
+        """Preleva 'amount' unità, attendendo la ricarica se necessario."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                wait = (amount - self.available) / self.rate
+            time.sleep(wait)
+
+class RateLimiter:
+    """Budget condiviso di richieste al minuto e (opzionale) di token al minuto."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float | None = None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens: int = 0):
+        self.requests.acquire(1)
+        if self.tokens and tokens:
+            self.tokens.acquire(tokens)
+
+def estimate_tokens(text: str) -> int:
+    return len(text or "") // CHARS_PER_TOKEN + 1
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Vero per errori di rate limit (429) e lato server (5xx), riconosciuti dal tipo di eccezione
+    (google.api_core) o dal codice di stato; il messaggio conta solo per errori senza codice.
+    Gli errori di parsing (ValueError) e le quote giornaliere esaurite non vengono ripetuti.
+    """
+    if isinstance(error, ValueError) or EXHAUSTED_QUOTA_MESSAGE.search(str(error)):
+        return False
+    if RETRYABLE_EXCEPTIONS and isinstance(error, RETRYABLE_EXCEPTIONS):
+        return True
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if callable(code):
+        code = code()
+    try:
+        return int(code) in RETRYABLE_STATUS_CODES
+    except (TypeError, ValueError):
+        pass
+    return bool(RETRYABLE_MESSAGE.search(str(error)))
+
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 60.0) -> float:
+    """Backoff esponenziale con jitter completo: attesa casuale in [0, min(max, base * 2^tentativo)]."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+class EnrichmentPool:
+    """
+    Pool di thread per le chiamate di arricchimento. `generate` applica rate limiting e
+    retry a una singola chiamata; `run_ordered` esegue un lavoro per elemento (es. tutti
+    i commi di un articolo) e restituisce i risultati nell'ordine di input.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float | None = DEFAULT_TOKENS_PER_MINUTE, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "prompt_tokens": 0, "cache_hits": 0}
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """Pool configurato da ENRICHMENT_WORKERS, ENRICHMENT_RPM ed ENRICHMENT_TPM (0 = nessun limite sui token)."""
+        settings = {
+            "max_workers": int(os.getenv("ENRICHMENT_WORKERS", DEFAULT_WORKERS)),
+            "requests_per_minute": float(os.getenv("ENRICHMENT_RPM", DEFAULT_REQUESTS_PER_MINUTE)),
+            "tokens_per_minute": float(os.getenv("ENRICHMENT_TPM", DEFAULT_TOKENS_PER_MINUTE)) or None,
+        }
+        settings.update(overrides)
+        return cls(**settings)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def call(self, function, estimated_tokens: int = 0):
+        """Esegue `function()` entro il budget, ripetendola con backoff sugli errori 429/5xx."""
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(estimated_tokens)
+            self._count("calls")
+            try:
+                return function()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    self._count("failures")
+                    raise
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                self._count("retries")
+                print(f"     ⏳ Errore temporaneo ({e.__class__.__name__}), nuovo tentativo tra {delay:.1f}s ({attempt + 1}/{self.max_retries}).")
+                time.sleep(delay)
+
+    def generate(self, model, prompt: str, validate=None, refresh: bool = False, **kwargs):
+        """
+        `model.generate_content(prompt)` con rate limiting e retry. Se il modello ha una cache
+        delle risposte (CachedModel) la si consulta prima: un hit non consuma il budget.
+        'validate' (es. il parsing della risposta) decide se una risposta può essere salvata o
+        servita dalla cache; con 'refresh' (nuovo tentativo dopo una risposta non valida) la
+        cache non viene letta.
+        """
+        if hasattr(model, "lookup") and not refresh:
+            cached = model.lookup(prompt, validate=validate, **kwargs)
+            if cached is not None:
+                self._count("cache_hits")
+                return cached
+        if hasattr(model, "generate_uncached"):
+            generate = lambda: model.generate_uncached(prompt, validate=validate, **kwargs)
+        else:
+            generate = lambda: model.generate_content(prompt, **kwargs)
+        prompt_tokens = estimate_tokens(prompt)
+        self._count("prompt_tokens", prompt_tokens)
+        return self.call(generate, prompt_tokens + EXPECTED_OUTPUT_TOKENS)
+
+    def run_ordered(self, items: list, work):
+        """
+        Esegue `work(item)` in parallelo e produce (item, risultato, errore) nell'ordine di input.
+        Restano in volo al massimo 2 x max_workers elementi: se il chiamante interrompe il ciclo
+        (es. circuit breaker) gli elementi non ancora avviati vengono annullati.
+        """
+        window = max(1, 2 * self.max_workers)
+        pending = deque()
+        items_iter = iter(items)
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="enrichment") as executor:
+            try:
+                for item in items_iter:
+                    pending.append((item, executor.submit(work, item)))
+                    if len(pending) >= window:
+                        yield self._collect(*pending.popleft())
+                while pending:
+                    yield self._collect(*pending.popleft())
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    @staticmethod
+    def _collect(item, future) -> tuple:
+        try:
+            return item, future.result(), None
+        except Exception as e:
+            return item, None, e
+
+    def summary(self) -> str:
+        return (
+            f"{self.stats['calls']} chiamate, {self.stats['retries']} ripetute, {self.stats['failures']} fallite, "
+            f"{self.stats['cache_hits']} dalla cache, ~{self.stats['prompt_tokens']} token di prompt"
+        )
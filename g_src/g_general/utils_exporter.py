@@ -1,20 +1,38 @@
 import os
+import itertools
 from datetime import datetime
-from docx import Document
-from docx.shared import Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-import json
-
-# --- FUNZIONE ESISTENTE (INVARIATA) ---
-def export_to_word(session_log: list, base_dir: str):
+from g_src.g_general.utils_chunk_store import resolve_chunk_ref
+
+def _first_and_rest(records):
+    """Separa il primo record da un iterabile (anche un generatore dal journal); None se è vuoto."""
+    iterator = iter(records)
+    first = next(iterator, None)
+    return (None, None) if first is None else (first, itertools.chain([first], iterator))
+
+def _hit_payload_and_score(hit, chunk_store: dict | None) -> tuple:
+    """Payload e score di un hit: oggetto con 'payload'/'score' o riferimento compatto dal journal."""
+    if isinstance(hit, dict):
+        return resolve_chunk_ref(chunk_store, hit) or hit, hit.get("score", 0.0)
+    return hit.payload, hit.score
+
+# --- FUNZIONE ESISTENTE ---
+def export_to_word(session_records, base_dir: str, chunk_store: dict | None = None):
     """
-    Crea un documento Word formattato a partire dal log di una sessione di '5_ask.py'.
+    Crea un documento Word formattato a partire dai record di una sessione di 'ask.py'
+    (righe del journal di sessione, vedi `turn_to_record`). I record possono arrivare da
+    un generatore (`read_journal`): vengono letti e resi uno alla volta. Il testo dei commi
+    citati nei riferimenti di contesto viene recuperato dal chunk store, se fornito.
     """
-    if not session_log:
+    first, records = _first_and_rest(session_records)
+    if first is None:
         print("ℹ️  Nessuna interazione da salvare. Il file non verrà creato.")
         return
 
     try:
+        from docx import Document
+        from docx.shared import Pt
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+
         doc = Document()
         doc.styles['Normal'].font.name = 'Times New Roman'
         doc.styles['Normal'].font.size = Pt(11)
@@ -27,7 +45,9 @@ def export_to_word(session_log: list, base_dir: str):
         subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
         doc.add_paragraph()
 
-        for i, turn_data in enumerate(session_log):
+        for i, turn_data in enumerate(records):
+            if i > 0:
+                doc.add_page_break()
             doc.add_heading(f"Interazione #{i+1}", level=1)
 
             doc.add_heading("Domanda Utente", level=2)
@@ -55,27 +75,25 @@ def export_to_word(session_log: list, base_dir: str):
 
             elif path_taken == 'rag':
                 p.add_run("RAG (Retrieval-Augmented Generation)")
-                if turn_data.get('context_chunks'):
+                if turn_data.get('context_refs'):
                     doc.add_heading("Contesto Recuperato", level=3)
-                    for chunk in turn_data['context_chunks']:
+                    for ref in turn_data['context_refs']:
+                        payload, score = _hit_payload_and_score(ref, chunk_store)
                         fonte_str = (
-                            f"Fonte: [{chunk.payload.get('document_title', 'N/D')}] "
-                            f"Art. {chunk.payload.get('articolo', 'N/A')}, "
-                            f"Comma {chunk.payload.get('comma', 'N/A')} "
-                            f"(Score: {chunk.score:.4f})"
+                            f"Fonte: [{payload.get('document_title', 'N/D')}] "
+                            f"Art. {payload.get('articolo', 'N/A')}, "
+                            f"Comma {payload.get('comma', 'N/A')} "
+                            f"(Score: {score:.4f})"
                         )
                         doc.add_paragraph(fonte_str, style='Intense Quote')
-                        doc.add_paragraph(chunk.payload.get('testo_originale_comma', ''))
+                        doc.add_paragraph(payload.get('testo_originale_comma', ''))
                         doc.add_paragraph()
 
             elif path_taken == 'fallback':
                 p.add_run("Fallback con Keyword")
             
             doc.add_heading("Risposta Finale", level=2)
-            doc.add_paragraph(turn_data.get('final_answer', 'Nessuna risposta generata.'))
-            
-            if i < len(session_log) - 1:
-                doc.add_page_break()
+            doc.add_paragraph(turn_data.get('answer') or 'Nessuna risposta generata.')
 
         reports_dir = os.path.join(base_dir, "e_reports", "01_words")
         os.makedirs(reports_dir, exist_ok=True)
@@ -83,20 +101,29 @@ def export_to_word(session_log: list, base_dir: str):
         file_path = os.path.join(reports_dir, filename)
         doc.save(file_path)
         print(f"✅ Report della sessione salvato con successo in:\n   {file_path}")
+        return file_path
 
     except Exception as e:
         print(f"❌ ERRORE CRITICO durante la creazione del file Word: {e}")
 
 # --- NUOVA FUNZIONE PER L'EXPORT DELLA DIAGNOSTICA ---
-def export_diagnostics_to_word(diagnostic_log: list, base_dir: str):
+def export_diagnostics_to_word(diagnostic_log, base_dir: str, chunk_store: dict | None = None):
     """
-    Crea un documento Word formattato a partire dal log di una sessione di diagnostica.
+    Crea un documento Word formattato a partire dal log di una sessione di diagnostica
+    (record {'query', 'hits'}, anche letti uno alla volta dal journal). Gli hit possono
+    essere oggetti con 'payload'/'score' o riferimenti compatti (`chunk_ref`), risolti
+    tramite il chunk store.
     """
-    if not diagnostic_log:
+    first, records = _first_and_rest(diagnostic_log)
+    if first is None:
         print("ℹ️  Nessuna diagnostica da salvare. Il file non verrà creato.")
         return
 
     try:
+        from docx import Document
+        from docx.shared import Pt
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+
         doc = Document()
         doc.styles['Normal'].font.name = 'Calibri'
         doc.styles['Normal'].font.size = Pt(11)
@@ -109,7 +136,9 @@ def export_diagnostics_to_word(diagnostic_log: list, base_dir: str):
         subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
         doc.add_paragraph()
 
-        for i, turn_data in enumerate(diagnostic_log):
+        for i, turn_data in enumerate(records):
+            if i > 0:
+                doc.add_page_break()
             doc.add_heading(f"Diagnostica Query #{i+1}", level=1)
             
             p_query = doc.add_paragraph()
@@ -125,11 +154,11 @@ def export_diagnostics_to_word(diagnostic_log: list, base_dir: str):
             else:
                 for j, hit in enumerate(retrieved_hits):
                     doc.add_heading(f"Risultato #{j+1}", level=3)
-                    payload = hit.payload
+                    payload, score = _hit_payload_and_score(hit, chunk_store)
                     
                     p_score = doc.add_paragraph()
                     p_score.add_run("Score: ").bold = True
-                    p_score.add_run(f"{hit.score:.4f}")
+                    p_score.add_run(f"{score:.4f}")
                     p_score.add_run(f"\nFonte: ").bold = True
                     p_score.add_run(f"[{payload.get('document_title', 'N/D')}] Art. {payload.get('articolo')}, Comma {payload.get('comma')}")
 
@@ -143,9 +172,6 @@ def export_diagnostics_to_word(diagnostic_log: list, base_dir: str):
                     doc.add_paragraph(keywords_str)
                     doc.add_paragraph()
 
-            if i < len(diagnostic_log) - 1:
-                doc.add_page_break()
-
         reports_dir = os.path.join(base_dir, "e_reports")
         os.makedirs(reports_dir, exist_ok=True)
         filename = f"Report_Diagnostica_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.docx"
@@ -153,6 +179,7 @@ def export_diagnostics_to_word(diagnostic_log: list, base_dir: str):
         
         doc.save(file_path)
         print(f"\n✅ Report di diagnostica salvato con successo in:\n   {file_path}")
+        return file_path
 
     except Exception as e:
         print(f"❌ ERRORE CRITICO durante la creazione del file Word di diagnostica: {e}")
\ No newline at end of file
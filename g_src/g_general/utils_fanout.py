@@ -0,0 +1,73 @@
+import re
+import math
+from g_src.g_general.utils_router import DOCUMENT_PATTERNS, fast_analyze_query
+from g_src.g_general.utils_vector_index import get_chunk_id
+
+# ==============================================================================
+# --- FAN-OUT DELLA RICERCA SU PIÙ TARGET ---
+# Una domanda su più articoli, su entrambi i documenti o composta da più
+# sotto-domande viene scomposta in target (testo, documento, articoli): ognuno
+# ha la sua ricerca e una quota garantita di posti nei risultati finali.
+# ==============================================================================
+
+DOC_TYPE_MAP = {"costituzione": "costituzione", "regolamento": "regolamento_parlamentare"}
+SUB_QUESTION_SPLIT = re.compile(r"(?<=\?)\s+|\s*;\s*")
+MIN_SUB_QUESTION_WORDS = 3
+
+def split_sub_questions(query: str) -> list:
+    """Divide una domanda composta ('...? ...?' o '...; ...') nelle sue sotto-domande, se abbastanza lunghe."""
+    parts = [part.strip() for part in SUB_QUESTION_SPLIT.split(query) if part and part.strip()]
+    if len(parts) < 2 or any(len(re.findall(r"\w{3,}", part)) < MIN_SUB_QUESTION_WORDS for part in parts):
+        return [query]
+    return parts
+
+def mentioned_doc_types(text: str) -> list:
+    return [DOC_TYPE_MAP[document] for pattern, document in DOCUMENT_PATTERNS if pattern.search(text)]
+
+def _target(text: str, doc_type: str | None, articles: list) -> dict:
+    return {"text": text, "document_type": doc_type, "articles": articles}
+
+def plan_search_targets(query: str, target_doc_type: str | None, target_articles: list, max_targets: int = 4) -> list:
+    """
+    Scompone la ricerca in target indipendenti. Restituisce una lista di dizionari
+    {'text', 'document_type', 'articles'}; con un solo target non serve il fan-out.
+    - sotto-domande: ognuna con il proprio testo e i propri filtri (regole deterministiche);
+    - più articoli: un target per articolo, così nessun articolo oscura gli altri;
+    - entrambi i documenti citati senza articoli: un target per documento.
+    """
+    sub_questions = split_sub_questions(query)
+    if len(sub_questions) > 1:
+        targets = []
+        for sub_question in sub_questions:
+            entities = fast_analyze_query(sub_question)[0]["entities"]
+            doc_entity = entities.get("documento")
+            articles = entities.get("articolo", [])
+            articles = [str(a) for a in articles] if isinstance(articles, list) else [str(articles)]
+            targets.append(_target(sub_question, DOC_TYPE_MAP.get(doc_entity) if doc_entity else target_doc_type, articles))
+    elif len(target_articles) > 1:
+        targets = [_target(query, target_doc_type, [article]) for article in target_articles]
+    elif not target_articles and len(mentioned_doc_types(query)) > 1:
+        targets = [_target(query, doc_type, []) for doc_type in mentioned_doc_types(query)]
+    else:
+        targets = [_target(query, target_doc_type, target_articles)]
+    return targets[:max_targets]
+
+def per_target_limit(total_limit: int, target_count: int) -> int:
+    return max(1, math.ceil(total_limit / max(target_count, 1)))
+
+def merge_with_quotas(result_lists: list, limit: int = 20) -> list:
+    """
+    Unisce i risultati dei target a turno (il primo di ogni target, poi il secondo, ...),
+    senza duplicati: ogni target ottiene almeno limit / numero di target posti, se ha risultati.
+    """
+    merged, seen = [], set()
+    for rank in range(max((len(results) for results in result_lists), default=0)):
+        for results in result_lists:
+            if rank < len(results):
+                chunk_id = get_chunk_id(results[rank].payload)
+                if chunk_id not in seen:
+                    seen.add(chunk_id)
+                    merged.append(results[rank])
+            if len(merged) >= limit:
+                return merged
+    return merged
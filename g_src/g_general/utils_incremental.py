@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import subprocess
+from datetime import datetime
+from g_src.g_general.utils_checkpoint import JsonlCheckpoint, reopen_checkpoint
+
+# ==============================================================================
+# --- PIPELINE INCREMENTALE (DAG DI STADI CON HASH DEL CONTENUTO) ---
+# Ogni documento è un DAG di stadi (struttura, riassunti, keyword, tag, chunk,
+# embedding, punti). Per ogni stadio il manifest registra l'hash dei file di
+# input e, dove lo stadio lavora per record (nodo, articolo, comma), l'hash di
+# ciascun record. Al rilancio si ricalcolano solo i record i cui input sono
+# cambiati: gli output obsoleti vengono potati e lo script dello stadio, che
+# riprende da dove si era fermato, rigenera solo ciò che manca.
+# ==============================================================================
+
+# Versione 2: testo degli articoli letto con python-docx (utils_articles) invece di pandoc.
+# Un manifest di versione diversa viene ignorato e gli output esistenti riadottati come base.
+MANIFEST_VERSION = 2
+
+def file_hash(path: str) -> str | None:
+    """SHA-256 del contenuto di un file (None se il file non esiste)."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def record_hash(*parts) -> str:
+    """SHA-256 della serializzazione JSON canonica dei valori (chiavi ordinate)."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def load_json(path: str, default=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+def write_json_atomic(path: str, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+class PipelineManifest:
+    """
+    Stato della pipeline su disco: documento -> stadio -> {'inputs': {percorso: hash},
+    'records': {chiave: hash}, 'updated_at'}. I percorsi sono relativi alla radice del progetto.
+    """
+
+    def __init__(self, path: str, project_root: str):
+        self.path = path
+        self.project_root = project_root
+        data = load_json(path, {})
+        self.documents = data.get("documents", {}) if data.get("version") == MANIFEST_VERSION else {}
+
+    def relative(self, path: str) -> str:
+        return os.path.relpath(path, self.project_root).replace(os.sep, "/")
+
+    def stage_state(self, doc_name: str, stage_name: str) -> dict | None:
+        return self.documents.get(doc_name, {}).get(stage_name)
+
+    def update(self, doc_name: str, stage_name: str, inputs: dict, records: dict | None):
+        self.documents.setdefault(doc_name, {})[stage_name] = {
+            "inputs": inputs,
+            "records": records,
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.save()
+
+    def save(self):
+        write_json_atomic(self.path, {"version": MANIFEST_VERSION, "documents": self.documents})
+
+# --- Potatura degli output obsoleti (gli script riprendono da ciò che resta) ---
+
+def prune_summaries(summaries_path: str, node_titles: set):
+    """Rimuove i riassunti dei nodi indicati: lo script dei riassunti li rigenera al rilancio."""
+    data = load_json(summaries_path, {"summaries": {}})
+    data["summaries"] = {title: text for title, text in data.get("summaries", {}).items() if title not in node_titles}
+    write_json_atomic(summaries_path, data)
+
+def prune_article_records(final_path: str, checkpoint_path: str, articles: set):
+    """
+    Toglie i record degli articoli indicati e riporta lo stadio in 'progresso': lo script
+    riprende dal checkpoint JSONL e il file finale viene sostituito solo a lavoro completato.
+    """
+    reopen_checkpoint(final_path, JsonlCheckpoint(checkpoint_path), article_key, drop_keys=articles, grouped=True)
+
+def prune_comma_records(final_path: str, checkpoint_path: str, comma_keys: set):
+    """Toglie i commi indicati (chiave 'art_{articolo}_comma_{comma}') e riporta lo stadio in 'progresso'."""
+    reopen_checkpoint(final_path, JsonlCheckpoint(checkpoint_path), comma_key, drop_keys=comma_keys)
+
+def article_key(record: dict) -> str:
+    return str(record.get("articolo"))
+
+def comma_key(record: dict) -> str:
+    return f"art_{record.get('articolo')}_comma_{record.get('comma')}"
+
+# --- Esecuzione degli stadi ---
+
+def script_runner(script_path: str, cwd: str):
+    """Esecutore di uno stadio basato su uno script esistente, lanciato come sottoprocesso."""
+    def run(stale_keys: set, removed_keys: set) -> bool:
+        print(f"   ▶️  python {os.path.relpath(script_path, cwd)}")
+        return subprocess.run([sys.executable, script_path], cwd=cwd).returncode == 0
+    return run
+
+def plan_stage(stage: dict, state: dict | None, input_hashes: dict, force: bool) -> dict:
+    """
+    Decide cosa ricalcolare per uno stadio. Restituisce {'dirty', 'reason', 'stale', 'removed', 'records'}.
+    Senza stato precedente e con gli output presenti, lo stadio viene adottato come base
+    (si assume che gli output esistenti derivino dagli input attuali).
+    """
+    outputs_exist = all(os.path.exists(path) for path in stage["outputs"])
+    records = stage["records"]() if stage.get("records") else None
+    plan = {"dirty": False, "reason": "", "stale": set(), "removed": set(), "records": records}
+
+    if records is None:
+        if force:
+            plan.update(dirty=True, reason="forzato")
+        elif not outputs_exist:
+            plan.update(dirty=True, reason="output mancanti")
+        elif state is not None and state.get("inputs") != input_hashes:
+            plan.update(dirty=True, reason="input modificati")
+        return plan
+
+    previous = (state or {}).get("records") or {}
+    if stage.get("output_keys"):
+        present = stage["output_keys"]()
+    else:
+        # Output non ispezionabili (es. punti su Qdrant): valgono i record già registrati
+        present = set(previous) if state is not None else set(records)
+    if force:
+        stale = set(records)
+    elif state is None:
+        stale = set()
+    else:
+        stale = {key for key, digest in records.items() if previous.get(key) != digest}
+    missing = set(records) - present - stale
+    removed = set(previous) - set(records) if state is not None else set()
+
+    plan.update(stale=stale, removed=removed)
+    if stale or missing or removed:
+        plan.update(dirty=True, reason=f"{len(stale)} modificati, {len(missing)} mancanti, {len(removed)} rimossi su {len(records)}")
+    return plan
+
+def run_document_pipeline(doc_name: str, stages: list, manifest: PipelineManifest, dry_run: bool = False, force: set = frozenset()) -> bool:
+    """
+    Esegue gli stadi di un documento in ordine topologico. Uno stadio viene saltato se
+    i suoi input (e i suoi record) non sono cambiati; se un ricalcolo produce output
+    identici, gli stadi a valle risultano invariati e si fermano lì (early cutoff).
+    Restituisce False se la pipeline si è fermata su uno stadio fallito o manuale.
+    """
+    print(f"\n=== Documento '{doc_name}' ===")
+    for stage in stages:
+        name = stage["name"]
+        missing_inputs = [manifest.relative(path) for path in stage["inputs"] if not os.path.exists(path)]
+        if missing_inputs:
+            print(f"❌ [{name}] Input mancanti: {missing_inputs}. Interruzione.")
+            return False
+
+        input_hashes = {manifest.relative(path): file_hash(path) for path in stage["inputs"]}
+        state = manifest.stage_state(doc_name, name)
+        plan = plan_stage(stage, state, input_hashes, name in force)
+
+        if not plan["dirty"]:
+            if state is None and not dry_run:
+                manifest.update(doc_name, name, input_hashes, plan["records"])
+                print(f"📌 [{name}] Output esistenti adottati come base.")
+            else:
+                print(f"✅ [{name}] Invariato.")
+            continue
+
+        print(f"🔄 [{name}] Da ricalcolare: {plan['reason']}.")
+        if dry_run:
+            print("   (dry-run: gli stadi a valle sono valutati sugli output attuali)")
+            continue
+
+        if stage.get("run") is None:
+            print(f"✋ [{name}] Stadio manuale ({stage.get('note', 'nessuno script eseguibile')}). Aggiornare gli output e rilanciare.")
+            return False
+
+        if stage.get("invalidate") and (plan["stale"] or plan["removed"]):
+            stage["invalidate"](plan["stale"] | plan["removed"])
+
+        started_at = time.time()
+        if not stage["run"](plan["stale"], plan["removed"]):
+            print(f"❌ [{name}] Stadio fallito. Interruzione.")
+            return False
+
+        if plan["records"] is not None and stage.get("output_keys"):
+            still_missing = set(plan["records"]) - stage["output_keys"]()
+            if still_missing:
+                print(f"⚠️ [{name}] Incompleto: {len(still_missing)} record ancora mancanti. Rilanciare per riprendere.")
+                return False
+        elif not all(os.path.exists(path) and os.path.getmtime(path) >= started_at for path in stage["outputs"]):
+            # Gli script escono con codice 0 anche quando si interrompono: conta che abbiano riscritto gli output
+            print(f"❌ [{name}] Output non prodotti. Interruzione.")
+            return False
+
+        manifest.update(doc_name, name, input_hashes, plan["records"])
+        print(f"✅ [{name}] Completato.")
+    return True
@@ -0,0 +1,54 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+# ==============================================================================
+# --- JOURNAL DI SESSIONE (JSONL APPEND-ONLY) ---
+# Ogni turno completato viene scritto subito su disco come una riga JSON
+# compatta (riferimenti ai chunk, non i payload): una sessione interrotta non
+# va persa e i report Word si generano dal journal, anche in background.
+# ==============================================================================
+
+def new_journal_path(journal_dir: str, prefix: str = "sessione") -> str:
+    return os.path.join(journal_dir, f"{prefix}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.jsonl")
+
+class SessionJournal:
+    """Journal append-only di una sessione: una riga per turno, scritta e sincronizzata su disco subito."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def append(self, record: dict):
+        line = json.dumps({"timestamp": datetime.now().isoformat(timespec="seconds"), **record}, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.count += 1
+
+    def __len__(self):
+        return self.count
+
+def read_journal(path: str):
+    """Legge i record del journal uno alla volta; una riga finale troncata (crash in scrittura) viene ignorata."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"⚠️ Riga non valida ignorata nel journal '{os.path.basename(path)}'.")
+
+def render_in_background(render, *args, **kwargs) -> threading.Thread:
+    """Avvia la generazione di un report in un thread separato (non daemon: il processo ne attende la fine)."""
+    thread = threading.Thread(target=render, args=args, kwargs=kwargs, name="report_renderer")
+    thread.start()
+    return thread
@@ -0,0 +1,218 @@
+import re
+import time
+from g_src.g_general.utils import (
+    preprocess_query_for_ordinals,
+    analyze_and_embed_query,
+    handle_structural_query,
+    run_rag_search,
+    generate_response,
+    current_answer_cache_version
+)
+from g_src.g_general.utils_context import build_rag_context
+from g_src.g_general.utils_vector_index import get_chunk_id
+from g_src.g_general.utils_chunk_store import chunk_ref
+from g_src.g_general.utils_tracing import trace, stage_totals
+
+MODEL_ALIASES = {"@flash": "default_generator", "@gpt": "gpt", "@pro": "pro"}
+FOLLOW_UP_PATTERN = re.compile(r'\b(sintetico|dettagliato)\b', re.IGNORECASE)
+
+def detect_follow_up_style(question: str) -> str | None:
+    """Restituisce lo stile richiesto ('sintetico'/'dettagliato') se la domanda è un follow-up, altrimenti None."""
+    match = FOLLOW_UP_PATTERN.search(question)
+    return match.group(1).lower() if match else None
+
+def build_last_interaction(turn: dict) -> dict:
+    """Stato minimo di una domanda nuova necessario ai follow-up successivi."""
+    path_taken = turn.get('path_taken')
+    return {
+        "domanda": turn.get('preprocessed_query'),
+        "contesto": turn.get('final_context') if path_taken == 'rag' else None,
+        "risposta": turn.get('final_answer') if path_taken == 'structural_query' else None
+    }
+
+def extract_model_override(question: str) -> tuple:
+    """Riconosce un alias di modello nella domanda ('@gpt', ...) e lo rimuove. Restituisce (domanda, chiave modello o None)."""
+    lower_question = question.lower()
+    for alias, key in MODEL_ALIASES.items():
+        if alias in lower_question:
+            return question.replace(alias, "").strip(), key
+    return question, None
+
+def turn_to_record(turn: dict) -> dict:
+    """
+    Riduce i dati di un turno a un dizionario serializzabile in JSON (batch, servizio HTTP,
+    journal di sessione): i chunk del contesto diventano riferimenti compatti, senza testo.
+    """
+    return {
+        "question": turn.get("question"),
+        "original_question": turn.get("original_question"),
+        "task": turn.get("task"),
+        "model_key": turn.get("model_key"),
+        "path_taken": turn.get("path_taken"),
+        "analysis": turn.get("analysis"),
+        "timings": {stage: round(seconds, 4) for stage, seconds in turn.get("timings", {}).items()},
+        "spans": turn.get("spans", []),
+        "generation_timings": turn.get("generation_timings"),
+        "context_refs": [chunk_ref(hit) for hit in turn.get("context_chunks", [])],
+        "context_stats": turn.get("context_stats"),
+        "answer_cache_hit": turn.get("answer_cache_hit", False),
+        "answer": turn.get("final_answer"),
+    }
+
+def print_retrieved_hits(retrieved_hits: list):
+    print("\n" + "*"*25 + " CONTESTO RECUPERATO (RAG) " + "*"*25)
+    for i, hit in enumerate(retrieved_hits[:15]):
+        fonte_str = (
+            f"Fonte: [{hit.payload.get('document_title', 'N/D')}] "
+            f"Art. {hit.payload.get('articolo', 'N/A')}, "
+            f"Comma {hit.payload.get('comma', 'N/A')} "
+            f"(Score: {hit.score:.4f})"
+        )
+        print(f"--- [Chunk #{i+1}] {fonte_str}")
+    print("*"*73 + "\n")
+
+def answer_question(config, clients, all_summaries, question: str, task_key: str, model_key: str, stream: bool = False) -> dict:
+    """
+    Esegue il percorso completo di una domanda nuova dentro una traccia: gli span delle fasi
+    (router, embedding, ricerca, rerank, contesto, generazione) finiscono in 'spans', i tempi
+    totali per fase (secondi) in 'timings' e la traccia nel log JSONL (se configurato).
+    Restituisce i dati del turno (come in session_log) con, in più, 'preprocessed_query',
+    'final_context' e 'answer_streamed'.
+    """
+    with trace() as spans:
+        total_start = time.perf_counter()
+        turn = _answer_question(config, clients, all_summaries, question, task_key, model_key, stream)
+        total = time.perf_counter() - total_start
+    turn['spans'] = list(spans)
+    turn['timings'] = {**stage_totals(turn['spans']), 'total': total}
+    if clients.get("trace_log"):
+        clients["trace_log"].write(question, turn.get('path_taken'), turn['spans'])
+    return turn
+
+def _answer_question(config, clients, all_summaries, question: str, task_key: str, model_key: str, stream: bool) -> dict:
+    """Corpo di answer_question, eseguito all'interno della traccia della domanda."""
+    system_prompt = config["prompts"][task_key]
+    turn = {'question': question, 'task': task_key, 'model_key': model_key}
+
+    preprocessed_query = preprocess_query_for_ordinals(question)
+    turn['preprocessed_query'] = preprocessed_query
+    # Router ed embedding della domanda in parallelo: la ricerca parte appena entrambi sono pronti
+    analysis, query_vector = analyze_and_embed_query(clients, config, preprocessed_query)
+    turn['analysis'] = analysis
+
+    final_answer = None
+    final_context = None
+    turn['answer_streamed'] = False
+
+    if analysis.get('intent') == 'ricerca_strutturale':
+        turn['path_taken'] = 'structural_query'
+        final_answer = handle_structural_query(analysis, clients["structural_index"], preprocessed_query)
+        print(f"\n✅ Risposta (da Query Strutturale):")
+    else:
+        retrieved_hits = run_rag_search(clients, config, preprocessed_query, analysis, query_vector=query_vector)
+
+        if not retrieved_hits:
+            turn['path_taken'] = 'fallback'
+            final_answer = "🚫 NESSUNA INFORMAZIONE TROVATA."
+        else:
+            turn['path_taken'] = 'rag'
+            print_retrieved_hits(retrieved_hits)
+
+            final_context, context_hits, context_stats = build_rag_context(
+                retrieved_hits, all_summaries,
+                model_name=config['models'][model_key],
+                token_budget=config["context_token_budget"].get(model_key, config["context_token_budget"]["default_generator"]),
+                summary_share=config["context_summary_share"],
+                min_relative_score=config["context_min_relative_score"]
+            )
+            turn['context_chunks'] = context_hits
+            turn['context_stats'] = context_stats
+
+            model_full_name = config['models'].get(model_key, "Sconosciuto")
+            answer_cache = clients.get("answer_cache")
+            cached_answer = None
+            if answer_cache:
+                answer_cache.ensure_version(current_answer_cache_version(config))
+                cache_scope = answer_cache.scope_key(system_prompt, model_full_name)
+                context_chunk_ids = [get_chunk_id(hit.payload) for hit in context_hits]
+                cached_answer = answer_cache.lookup(cache_scope, preprocessed_query, query_vector, context_chunk_ids)
+
+            if cached_answer:
+                print(f"⚡ Risposta recuperata dalla cache semantica (similarità {cached_answer['similarity']:.3f} con \"{cached_answer['question']}\").")
+                final_answer = cached_answer["answer"]
+                turn['answer_cache_hit'] = True
+                print(f"\n✅ Risposta (da Cache - Compito: '{task_key}', Modello: '{model_full_name}'):")
+            else:
+                if stream:
+                    # In streaming l'intestazione precede i token, che vengono stampati man mano
+                    print(f"\n✅ Risposta (da RAG - Compito: '{task_key}', Modello: '{model_full_name}'):")
+                    print("="*50)
+                generation_timings = {}
+                final_answer = generate_response(
+                    clients, config, final_context, preprocessed_query,
+                    model_key=model_key,
+                    system_prompt=system_prompt,
+                    stream=stream,
+                    timings=generation_timings
+                )
+                turn['generation_timings'] = generation_timings
+                turn['answer_streamed'] = stream
+                # Le risposte di errore o troncate da un errore nello stream non vanno in cache
+                if answer_cache and not generation_timings.get("error"):
+                    answer_cache.store(cache_scope, preprocessed_query, query_vector, context_chunk_ids, final_answer)
+
+                if not stream:
+                    print(f"\n✅ Risposta (da RAG - Compito: '{task_key}', Modello: '{model_full_name}'):")
+
+    turn['final_answer'] = final_answer
+    turn['final_context'] = final_context
+    return turn
+
+def answer_follow_up(config, clients, last_interaction_info: dict, question: str, task_key: str, model_key: str, style: str, stream: bool = False) -> dict | None:
+    """
+    Rielabora l'ultima risposta nello stile richiesto, riusando il contesto RAG (o la risposta
+    strutturale) dell'interazione precedente. Restituisce i dati del turno, o None se lo stato
+    dell'interazione precedente non è utilizzabile.
+    """
+    original_question = last_interaction_info.get("domanda", "")
+    rag_context = last_interaction_info.get("contesto")
+    metadata_answer = last_interaction_info.get("risposta")
+
+    if metadata_answer:
+        followup_prompt = f"Rielabora la seguente risposta in modo più {style}:\n\nRisposta Originale: \"{metadata_answer}\"\n\nDomanda Originale: \"{original_question}\""
+        context_for_generation = f"La domanda originale era: {original_question}"
+    elif rag_context:
+        followup_prompt = f"Rispondi in modo più {style} e articolato alla seguente domanda:\n\n{original_question}"
+        context_for_generation = rag_context
+    else:
+        print("⚠️ Errore di memoria: stato dell'interazione non valido.")
+        return None
+
+    turn = {
+        'question': question, 'task': task_key, 'model_key': model_key, 'path_taken': 'follow_up',
+        'analysis': {'style': style}, 'original_question': original_question, 'answer_streamed': stream
+    }
+    model_full_name = config['models'].get(model_key, "Sconosciuto")
+    if stream:
+        print(f"\n✅ Risposta (Follow-up con Modello: {model_key.upper()} → {model_full_name}):\n" + "="*50)
+    generation_timings = {}
+    with trace() as spans:
+        total_start = time.perf_counter()
+        response_text = generate_response(
+            clients, config, context_for_generation, followup_prompt,
+            model_key=model_key,
+            system_prompt=config["prompts"][task_key],
+            stream=stream,
+            timings=generation_timings
+        )
+        total = time.perf_counter() - total_start
+    if not stream:
+        print(f"\n✅ Risposta (Follow-up con Modello: {model_key.upper()} → {model_full_name}):\n" + "="*50)
+
+    turn['final_answer'] = response_text
+    turn['generation_timings'] = generation_timings
+    turn['spans'] = list(spans)
+    turn['timings'] = {**stage_totals(turn['spans']), 'total': total}
+    if clients.get("trace_log"):
+        clients["trace_log"].write(question, 'follow_up', turn['spans'])
+    return turn
@@ -0,0 +1,66 @@
+import asyncio
+import inspect
+import threading
+
+# ==============================================================================
+# --- TRASPORTO DEL CLIENT QDRANT ---
+# 'rest'        QdrantClient via HTTP/JSON (comportamento storico)
+# 'grpc'        QdrantClient con prefer_grpc: vettori e payload in protobuf
+# 'async'       AsyncQdrantClient (HTTP) con connessione persistente
+# 'async_grpc'  AsyncQdrantClient su gRPC
+# Le varianti asincrone girano su un event loop dedicato ed espongono la stessa
+# interfaccia sincrona (search, scroll, upsert, delete, ...) del client classico.
+# ==============================================================================
+
+QDRANT_TRANSPORTS = ("rest", "grpc", "async", "async_grpc")
+DEFAULT_GRPC_PORT = 6334
+
+class AsyncQdrantBridge:
+    """
+    AsyncQdrantClient su un event loop in un thread dedicato: la connessione resta aperta
+    tra una chiamata e l'altra. I metodi asincroni del client vengono esposti come
+    metodi sincroni, così il client è intercambiabile con QdrantClient nel codice esistente.
+    """
+
+    def __init__(self, url: str | None, api_key: str | None, prefer_grpc: bool = False, grpc_port: int = DEFAULT_GRPC_PORT):
+        from qdrant_client import AsyncQdrantClient
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="qdrant_async", daemon=True)
+        self._thread.start()
+
+        async def create_client():
+            # Il client va creato dentro il loop che userà, per legare lì le sue connessioni
+            return AsyncQdrantClient(url=url, api_key=api_key, prefer_grpc=prefer_grpc, grpc_port=grpc_port)
+
+        self.client = self.run(create_client())
+
+    def run(self, coroutine):
+        """Esegue una coroutine sul loop del client e ne attende il risultato."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not inspect.iscoroutinefunction(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            return self.run(attribute(*args, **kwargs))
+        return call
+
+    def close(self):
+        try:
+            self.run(self.client.close())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+
+def make_qdrant_client(url: str | None, api_key: str | None, transport: str = "rest", grpc_port: int = DEFAULT_GRPC_PORT):
+    """Crea il client Qdrant per il trasporto richiesto (vedi QDRANT_TRANSPORTS)."""
+    if transport not in QDRANT_TRANSPORTS:
+        raise ValueError(f"Trasporto Qdrant '{transport}' non valido. Valori ammessi: {QDRANT_TRANSPORTS}")
+    if transport.startswith("async"):
+        return AsyncQdrantBridge(url, api_key, prefer_grpc=(transport == "async_grpc"), grpc_port=grpc_port)
+
+    from qdrant_client import QdrantClient
+    return QdrantClient(url=url, api_key=api_key, prefer_grpc=(transport == "grpc"), grpc_port=grpc_port)
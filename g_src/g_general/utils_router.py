@@ -0,0 +1,181 @@
+import re
+
+# ==============================================================================
+# --- ROUTER DETERMINISTICO (FAST PATH) ---
+# Classificatore basato su regex compilate che replica l'output JSON del router
+# LLM ({"intent": ..., "entities": {...}}) per le domande "facili". Restituisce
+# anche un punteggio di confidenza: sotto la soglia si ricade sull'LLM.
+# ==============================================================================
+
+ARTICLE_SUFFIXES = "bis|ter|quater|quinquies|sexies|septies|octies|novies|decies"
+ORDINALS = {
+    "primo": 1, "prima": 1, "secondo": 2, "seconda": 2, "terzo": 3, "terza": 3,
+    "quarto": 4, "quarta": 4, "quinto": 5, "quinta": 5, "sesto": 6, "sesta": 6,
+    "settimo": 7, "settima": 7, "ottavo": 8, "ottava": 8, "nono": 9, "nona": 9,
+    "decimo": 10, "decima": 10
+}
+ROMAN_VALUES = {"i": 1, "v": 5, "x": 10, "l": 50, "c": 100}
+
+DOCUMENT_PATTERNS = [
+    (re.compile(r"\bcostituzion\w*", re.IGNORECASE), "costituzione"),
+    (re.compile(r"\bregolament\w*", re.IGNORECASE), "regolamento"),
+]
+
+ARTICLE_NUMBER = rf"\d+(?:\s*-?\s*(?:{ARTICLE_SUFFIXES})\b)?"
+ARTICLE_SEPARATOR = r"\s*(?:,|\be\b|\bed\b|-|–|\bal\b|\ba\b|\bfino\s+al?\b)\s*"
+ARTICLE_PATTERN = re.compile(
+    rf"\b(?:artt?\.?|articol[oi])\s*(?:n\.\s*)?(?:(?:dal|dall'|da)\s*)?({ARTICLE_NUMBER}(?:{ARTICLE_SEPARATOR}{ARTICLE_NUMBER})*)",
+    re.IGNORECASE
+)
+ARTICLE_TOKEN = re.compile(rf"{ARTICLE_NUMBER}|-|–|\bal?\b|\bfino\b", re.IGNORECASE)
+ARTICLE_SPLIT = re.compile(rf"(\d+)\s*-?\s*({ARTICLE_SUFFIXES})?", re.IGNORECASE)
+TRANSITIONAL_PATTERN = re.compile(r"\bdisposizion[ei]\s+(?:transitori[ae]\s+(?:e\s+final[ei]\s+)?)?([ivxlc]+)\b", re.IGNORECASE)
+
+SECTION_NUMBER = rf"(?:\d+|[ivxlc]+|{'|'.join(ORDINALS)})(?:\s*-?\s*(?:bis|ter))?"
+SECTION_PATTERN = re.compile(rf"\b(parte|titolo|capo|sezione)\s+({SECTION_NUMBER})\b", re.IGNORECASE)
+# Forma con l'ordinale anteposto: 'il primo capo', 'della 2 parte'
+SECTION_PATTERN_REVERSED = re.compile(
+    rf"\b(?:il|la|del|della|nel|nella|al|alla)\s+(\d+|{'|'.join(ORDINALS)})\s*[°ª]?\s+(parte|titolo|capo|sezione)\b",
+    re.IGNORECASE
+)
+NAMED_SECTION_PATTERN = re.compile(
+    r"\b(principi\s+fondamentali|disposizioni\s+transitorie\s+e\s+finali|disposizione\s+transitoria|disposizioni\s+finali)\b",
+    re.IGNORECASE
+)
+VALID_ROMAN = re.compile(r"^c{0,3}(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})$", re.IGNORECASE)
+
+STRUCTURAL_CUES = [re.compile(p, re.IGNORECASE) for p in (
+    r"\bquant[ie]\s+(?:sono\s+(?:i|le|gli)\s+)?(?:parti|titoli|capi|sezioni|articoli|disposizioni)\b",
+    r"\b(?:a|in|di|da)\s+(?:quale|quali|che)\s+(?:parte|capo|titolo|sezione)\b",
+    r"\bcome\s+si\s+intitol\w*",
+    r"\bqual\s*(?:è|e'|e)\s+(?:il\s+)?(?:titolo|nome|rubrica)\b",
+    r"\b(?:titolo|nome|rubrica|intitolazione)\s+del(?:la|l'|lo)?\s*(?:\w+\s+)?(?:parte|capo|titolo|sezione)\b",
+    r"\b(?:quali\s+sono|elenc\w*)\s+(?:tutti\s+|tutte\s+)?(?:i|le|gli)\s+(?:parti|titoli|capi|sezioni)\b",
+    r"\bfa\s+parte\b",
+    r"\bappartien\w*",
+    r"\bsi\s+trova\w*",
+    r"\bcollocat\w*",
+    r"\bstruttura\b",
+    r"\bindice\b",
+    r"\bda\s+quant[ie]\b",
+    r"\bcompost[oa]\b",
+    r"\bsuddivis[oa]\b",
+)]
+STRUCTURE_VOCABULARY = re.compile(r"\b(?:parte|parti|titol[oi]|capo|capi|sezion[ei]|articol\w*|artt?\.)", re.IGNORECASE)
+
+def roman_to_int(value: str) -> int | None:
+    """Converte un numero romano valido in intero (None se non valido)."""
+    value = value.lower()
+    if not value or not VALID_ROMAN.match(value):
+        return None
+    total = 0
+    for i, char in enumerate(value):
+        current = ROMAN_VALUES[char]
+        following = ROMAN_VALUES.get(value[i + 1]) if i + 1 < len(value) else 0
+        total += -current if following and following > current else current
+    return total
+
+def normalize_section_number(raw: str) -> str | None:
+    """Normalizza il numero di una sezione ('IV', 'quarto', '4', 'XIX-bis') in forma araba ('4', '19-bis')."""
+    raw = raw.lower().strip()
+    suffix_match = re.search(r"\s*-?\s*(bis|ter)$", raw)
+    suffix = f"-{suffix_match.group(1)}" if suffix_match else ""
+    base = raw[:suffix_match.start()] if suffix_match else raw
+    if base.isdigit():
+        number = int(base)
+    elif base in ORDINALS:
+        number = ORDINALS[base]
+    else:
+        number = roman_to_int(base)
+    return f"{number}{suffix}" if number else None
+
+def normalize_article_id(raw: str) -> str:
+    """Normalizza un identificativo di articolo ('15 bis', '15bis', '15-BIS') nella forma '15-bis'."""
+    match = ARTICLE_SPLIT.match(raw.strip())
+    if not match:
+        return raw.strip()
+    return f"{match.group(1)}-{match.group(2).lower()}" if match.group(2) else match.group(1)
+
+def extract_articles(query: str) -> list:
+    """Estrae gli articoli citati, espandendo liste ('3 e 4') e intervalli ('dal 3 al 5', '3-5')."""
+    articles = []
+    for match in ARTICLE_PATTERN.finditer(query):
+        tokens = ARTICLE_TOKEN.findall(match.group(1))
+        pending_range = False
+        for token in tokens:
+            token_lower = token.lower()
+            if token_lower in ("-", "–", "a", "al", "fino"):
+                pending_range = bool(articles)
+                continue
+            article_id = normalize_article_id(token)
+            if pending_range and article_id.isdigit() and articles[-1].isdigit():
+                start, end = int(articles[-1]), int(article_id)
+                if start < end <= start + 50:
+                    articles.extend(str(n) for n in range(start + 1, end + 1))
+                    pending_range = False
+                    continue
+            articles.append(article_id)
+            pending_range = False
+    for match in TRANSITIONAL_PATTERN.finditer(query):
+        if roman_to_int(match.group(1)):
+            articles.append(match.group(1).upper())
+    return list(dict.fromkeys(articles))
+
+def extract_section(query: str) -> str | None:
+    """Estrae il riferimento alla sezione (es. 'Titolo IV della Parte Seconda') come appare nel testo."""
+    spans = [m.span() for m in SECTION_PATTERN.finditer(query) if normalize_section_number(m.group(2))]
+    if spans:
+        return query[spans[0][0]:spans[-1][1]]
+    reversed_match = SECTION_PATTERN_REVERSED.search(query)
+    if reversed_match:
+        return f"{reversed_match.group(2).lower()} {reversed_match.group(1).lower()}"
+    named = NAMED_SECTION_PATTERN.search(query)
+    return named.group(1) if named else None
+
+def section_signature(section: str | None) -> tuple:
+    """Forma canonica di un riferimento di sezione, per confronti: (('titolo', '4'), ('parte', '2'))."""
+    if not section:
+        return ()
+    pairs = tuple(
+        (m.group(1).lower(), normalize_section_number(m.group(2)))
+        for m in SECTION_PATTERN.finditer(section)
+        if normalize_section_number(m.group(2))
+    )
+    return pairs or (re.sub(r"\s+", " ", section.lower().strip()),)
+
+def fast_analyze_query(user_query: str) -> tuple:
+    """
+    Classifica la domanda con sole regole deterministiche.
+    Restituisce (analysis, confidence) con 'analysis' nello stesso formato del router LLM.
+    """
+    entities = {}
+    documents = [document for pattern, document in DOCUMENT_PATTERNS if pattern.search(user_query)]
+    if len(documents) == 1:
+        entities["documento"] = documents[0]
+
+    articles = extract_articles(user_query)
+    section = extract_section(user_query)
+    if articles:
+        entities["articolo"] = articles[0] if len(articles) == 1 else articles
+    if section:
+        entities["nome_sezione"] = section
+
+    is_structural = any(cue.search(user_query) for cue in STRUCTURAL_CUES)
+
+    if is_structural and (articles or section):
+        intent, confidence = "ricerca_strutturale", 0.95
+    elif is_structural:
+        intent, confidence = "ricerca_strutturale", 0.6
+    elif articles:
+        intent, confidence = "ricerca_contenuto", 0.9
+    elif section or STRUCTURE_VOCABULARY.search(user_query):
+        intent, confidence = "ricerca_generale", 0.5
+    else:
+        intent, confidence = "ricerca_generale", 0.85
+
+    # Entrambi i documenti, o articolo e sezione insieme: le regole non sanno a quale
+    # riferimento legare l'intent, quindi si lascia decidere al router LLM.
+    if len(documents) > 1 or (articles and section):
+        confidence = min(confidence, 0.6)
+
+    return {"intent": intent, "entities": entities}, confidence
@@ -0,0 +1,137 @@
+import re
+import threading
+
+# ==============================================================================
+# --- SEGMENTAZIONE DETERMINISTICA DEGLI ARTICOLI IN COMMI ---
+# I testi normativi sono ben strutturati: i commi sono numerati ("1.", "2.",
+# "3-bis.") come nel Regolamento della Camera, oppure sono paragrafi separati
+# da una riga vuota come nella Costituzione. Le regole coprono entrambi i casi;
+# se la segmentazione non supera la validazione la funzione restituisce None e
+# lo script chiamante ripiega sull'LLM per quel solo articolo.
+# ==============================================================================
+
+LATIN_SUFFIXES = "bis|ter|quater|quinquies|sexies|septies|octies|novies|decies"
+# "1. Testo", "3-bis. Testo", "2.Testo", "01. Testo" (comma premesso al primo; non "1.5", che è un numero decimale)
+COMMA_NUMBER = re.compile(rf'^(\d+)(?:\s*-\s*({LATIN_SUFFIXES}))?\.(?!\d)\s*')
+# Elementi di elenco che proseguono il comma precedente: "a)", "1)", trattini e punti elenco
+LIST_ITEM = re.compile(r'^(?:[a-z]{1,2}\)|\d+\)|[-–•])\s')
+# Materiale che segue il testo dell'articolo: note, titoli di Capo/Parte/Titolo/Sezione
+TRAILING_MATERIAL = re.compile(r'^(?:NOTE:|\(\*+\)\s*\S|(?:Capo|CAPO|Parte|parte|PARTE|Titolo|TITOLO|Sezione|SEZIONE)(?:\s|$))')
+# Intestazione dell'articolo, presente quando il testo la include (es. "Art. 3-bis (*)" nel Regolamento)
+ARTICLE_HEADER = re.compile(r'^Art\.\s*\d+(?:-[a-z]+)?(?:\s*\(\*+\))?$', re.IGNORECASE)
+# Richiami alle note nel testo del comma, es. "... reati politici. (*)"
+NOTE_MARKER = re.compile(r'\s*\(\*+\)')
+
+def split_paragraphs(text: str) -> list:
+    """Paragrafi separati da righe vuote; le righe spezzate dall'a-capo automatico vengono riunite."""
+    paragraphs = []
+    for block in re.split(r'\n\s*\n', (text or "").replace('\r\n', '\n')):
+        paragraph = " ".join(line.strip() for line in block.splitlines() if line.strip())
+        if paragraph:
+            paragraphs.append(paragraph)
+    return paragraphs
+
+def strip_trailing_material(paragraphs: list) -> list:
+    """Taglia i paragrafi dal primo che apre note o un nuovo titolo di sezione (anche tutto maiuscolo)."""
+    for i, paragraph in enumerate(paragraphs):
+        if TRAILING_MATERIAL.match(paragraph) or paragraph.isupper():
+            return paragraphs[:i]
+    return paragraphs
+
+def continues_previous(previous: str, paragraph: str) -> bool:
+    """Un paragrafo prosegue il comma precedente se è un elemento di elenco o se il precedente introduce un elenco."""
+    return bool(LIST_ITEM.match(paragraph)) or previous.rstrip().endswith((":", ";"))
+
+def comma_label(match) -> str:
+    number, suffix = match.group(1), match.group(2)
+    return f"{number}-{suffix}" if suffix else number
+
+def segment_numbered(paragraphs: list) -> list | None:
+    """Commi numerati: ogni paragrafo che inizia con "N." apre un comma (il testo conserva il numero, come negli output esistenti)."""
+    commi = []
+    for paragraph in paragraphs:
+        match = COMMA_NUMBER.match(paragraph)
+        if match:
+            commi.append({"comma": comma_label(match), "testo": paragraph})
+        elif commi:
+            commi[-1]["testo"] += " " + paragraph
+        else:
+            return None
+    return commi
+
+def segment_unnumbered(paragraphs: list) -> list:
+    """Commi non numerati: un comma per paragrafo, con elenchi e continuazioni uniti al comma che li introduce."""
+    commi = []
+    for paragraph in paragraphs:
+        if commi and continues_previous(commi[-1]["testo"], paragraph):
+            commi[-1]["testo"] += " " + paragraph
+        else:
+            commi.append({"comma": str(len(commi) + 1), "testo": paragraph})
+    return commi
+
+def comma_rank(label: str) -> int:
+    """Posizione di un comma numerato nella sequenza: i commi premessi ("01", "02") valgono 0."""
+    number = label.split("-")[0]
+    return 0 if number.startswith("0") else int(number)
+
+def validate_commi(commi: list | None, numbered: bool) -> bool:
+    """
+    Controlli di coerenza: almeno un comma, nessun testo vuoto e, per i commi numerati,
+    una sequenza che avanza di un'unità a partire da 1 (i commi premessi "01", "02"
+    vengono prima; i commi "-bis", "-ter" ripetono il numero) senza etichette ripetute.
+    """
+    if not commi or any(not item["testo"].strip() for item in commi):
+        return False
+    if not numbered:
+        # Un paragrafo numerato in un articolo non numerato indica una struttura non riconosciuta
+        return not any(COMMA_NUMBER.match(item["testo"]) for item in commi[1:])
+    labels = [item["comma"] for item in commi]
+    if len(set(labels)) != len(labels):
+        return False
+    previous = 0
+    for label in labels:
+        rank = comma_rank(label)
+        if rank not in (previous, previous + 1) or (rank == previous and rank and "-" not in label):
+            return False
+        previous = rank
+    return previous >= 1
+
+def segment_commi(article_text: str) -> list | None:
+    """
+    Divide il testo di un articolo in commi ([{'comma', 'testo'}]) con regole deterministiche.
+    Restituisce None se il testo non ha una struttura riconoscibile: il chiamante usa allora l'LLM.
+    """
+    paragraphs = split_paragraphs(article_text)
+    if paragraphs and ARTICLE_HEADER.match(paragraphs[0]):
+        paragraphs = paragraphs[1:]
+    paragraphs = [NOTE_MARKER.sub("", p).strip() for p in strip_trailing_material(paragraphs)]
+    paragraphs = [p for p in paragraphs if p]
+    if not paragraphs:
+        return None
+    numbered = bool(COMMA_NUMBER.match(paragraphs[0]))
+    commi = segment_numbered(paragraphs) if numbered else segment_unnumbered(paragraphs)
+    return commi if validate_commi(commi, numbered) else None
+
+class SegmentationReport:
+    """Conteggio degli articoli segmentati con le regole e di quelli che hanno richiesto l'LLM."""
+
+    def __init__(self):
+        self.rule_based = 0
+        self.fallback = []
+        self._lock = threading.Lock()
+
+    def record(self, article_id, used_fallback: bool):
+        with self._lock:
+            if used_fallback:
+                self.fallback.append(str(article_id))
+            else:
+                self.rule_based += 1
+
+    def summary(self) -> str:
+        total = self.rule_based + len(self.fallback)
+        if not total:
+            return "nessun articolo segmentato"
+        text = f"{self.rule_based}/{total} articoli segmentati con le regole, {len(self.fallback)} con l'LLM ({len(self.fallback) / total:.0%})"
+        if self.fallback:
+            text += f" - articoli: {', '.join(self.fallback)}"
+        return text
@@ -0,0 +1,62 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+class SessionStore:
+    """
+    Stato per sessione utente (compito, modello, ultima interazione, journal della sessione),
+    con numero massimo di sessioni e scadenza per inattività (TTL).
+    Le sessioni scadute vengono rimosse a ogni accesso; oltre la capienza viene
+    rimossa la sessione usata meno di recente.
+    """
+
+    def __init__(self, max_sessions: int = 256, ttl_seconds: float = 3600):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: float):
+        expired = [sid for sid, session in self._sessions.items() if now - session["last_seen"] > self.ttl_seconds]
+        for sid in expired:
+            del self._sessions[sid]
+
+    def create(self, task_key: str, model_key: str) -> dict:
+        now = time.time()
+        session = {
+            "id": uuid.uuid4().hex,
+            "task_key": task_key,
+            "model_key": model_key,
+            "last_interaction_info": {},
+            "journal": None,
+            "lock": None,
+            "created": now,
+            "last_seen": now,
+        }
+        with self._lock:
+            self._evict_expired(now)
+            self._sessions[session["id"]] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> dict | None:
+        """Restituisce la sessione (aggiornandone l'ultimo accesso) o None se assente o scaduta."""
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session["last_seen"] = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        with self._lock:
+            self._evict_expired(time.time())
+            return len(self._sessions)
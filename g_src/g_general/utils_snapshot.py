@@ -0,0 +1,129 @@
+import os
+import mmap
+import json
+import pickle
+import hashlib
+from g_src.g_general.utils_structure import build_structural_index
+from g_src.g_general.utils_chunk_store import build_chunk_store
+from g_src.g_general.utils_bm25 import build_bm25_index
+
+# ==============================================================================
+# --- SNAPSHOT BINARIO DEL CORPUS ---
+# Strutture, riassunti, chunk e tabelle derivate (indice strutturale, chunk store,
+# posting BM25) in un unico file: intestazione fissa (magic + hash del contenuto
+# dei JSON sorgente) seguita dal pickle del bundle. All'avvio il file viene aperto
+# in memory-map e usato solo se l'hash coincide; altrimenti si rileggono i JSON
+# e lo snapshot viene riscritto.
+# ==============================================================================
+
+SNAPSHOT_MAGIC = b"RAGSNAP1"
+HASH_LENGTH = 64
+HEADER_SIZE = len(SNAPSHOT_MAGIC) + HASH_LENGTH
+# Da incrementare quando cambia il formato delle tabelle derivate (invalida gli snapshot esistenti)
+SNAPSHOT_FORMAT_VERSION = "1"
+
+def find_corpus_files(structured_dir: str, chunks_dir: str, doc_info_map: dict) -> list:
+    """
+    File JSON del corpus nell'ordine di caricamento, come tuple (tipo, cartella, percorso):
+    struttura e riassunti per ogni fonte nota, poi i chunk di ogni cartella.
+    """
+    files = []
+    for doc_folder_name in sorted(os.listdir(structured_dir)):
+        doc_folder_path = os.path.join(structured_dir, doc_folder_name)
+        if os.path.isdir(doc_folder_path) and doc_folder_name in doc_info_map:
+            for kind, suffix in (("structure", "_structure.json"), ("summaries", "_summaries.json")):
+                filename = next((f for f in sorted(os.listdir(doc_folder_path)) if f.endswith(suffix)), None)
+                if filename:
+                    files.append((kind, doc_folder_name, os.path.join(doc_folder_path, filename)))
+    for doc_folder in sorted(os.listdir(chunks_dir)):
+        doc_chunks_path = os.path.join(chunks_dir, doc_folder)
+        if os.path.isdir(doc_chunks_path):
+            filename = next((f for f in sorted(os.listdir(doc_chunks_path)) if f.endswith('_chunks.json')), None)
+            if filename:
+                files.append(("chunks", doc_folder, os.path.join(doc_chunks_path, filename)))
+    return files
+
+def corpus_content_hash(corpus_files: list, doc_info_map: dict) -> str:
+    """Hash SHA-256 del contenuto dei file sorgente, dei metadati delle fonti e della versione del formato."""
+    digest = hashlib.sha256(SNAPSHOT_FORMAT_VERSION.encode("utf-8"))
+    digest.update(json.dumps(doc_info_map, sort_keys=True).encode("utf-8"))
+    for kind, doc_folder, path in corpus_files:
+        digest.update(f"{kind}:{doc_folder}:{os.path.basename(path)}".encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+def load_corpus_from_json(corpus_files: list, doc_info_map: dict) -> tuple:
+    """Legge e normalizza i JSON del corpus. Restituisce (strutture, riassunti, chunk)."""
+    all_docs_structures = []
+    all_docs_summaries = {}
+    all_docs_chunks = []
+    for kind, doc_folder, path in corpus_files:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if kind == "structure":
+            data['document_title'] = doc_info_map[doc_folder]['document_title']
+            data['document_type'] = doc_info_map[doc_folder]['document_type']
+            all_docs_structures.append(data)
+            print(f"     - File Struttura '{os.path.basename(path)}' caricato e normalizzato.")
+        elif kind == "summaries":
+            all_docs_summaries.update(data.get("summaries", {}))
+            print(f"     - File Riassunti '{os.path.basename(path)}' caricato e unito.")
+        else:
+            all_docs_chunks.extend(data)
+            print(f"     - File Chunks '{os.path.basename(path)}' caricato e unito.")
+    return all_docs_structures, all_docs_summaries, all_docs_chunks
+
+def build_corpus_bundle(corpus_files: list, doc_info_map: dict) -> dict:
+    """Carica il corpus dai JSON e costruisce le tabelle derivate usate all'avvio."""
+    all_docs_structures, all_docs_summaries, all_docs_chunks = load_corpus_from_json(corpus_files, doc_info_map)
+    return {
+        "structures": all_docs_structures,
+        "summaries": all_docs_summaries,
+        "chunks": all_docs_chunks,
+        "structural_index": build_structural_index(all_docs_structures),
+        "chunk_store": build_chunk_store(all_docs_chunks),
+        "bm25_index": build_bm25_index(all_docs_chunks),
+    }
+
+def write_corpus_snapshot(snapshot_path: str, content_hash: str, bundle: dict):
+    """Scrive lo snapshot in modo atomico (file temporaneo + rename)."""
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    tmp_path = f"{snapshot_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC + content_hash.encode("ascii"))
+        pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, snapshot_path)
+
+def read_corpus_snapshot(snapshot_path: str, content_hash: str) -> dict | None:
+    """Apre lo snapshot in memory-map; restituisce None se manca, è corrotto o non corrisponde all'hash."""
+    if not os.path.exists(snapshot_path) or os.path.getsize(snapshot_path) <= HEADER_SIZE:
+        return None
+    try:
+        with open(snapshot_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC or mapped[len(SNAPSHOT_MAGIC):HEADER_SIZE].decode("ascii") != content_hash:
+                return None
+            with memoryview(mapped) as view:
+                with view[HEADER_SIZE:] as payload:
+                    return pickle.loads(payload)
+    except Exception as e:
+        print(f"   - ⚠️  WARNING: Snapshot del corpus illeggibile ({e}). Si ricaricano i JSON.")
+        return None
+
+def load_corpus(structured_dir: str, chunks_dir: str, doc_info_map: dict, snapshot_path: str) -> dict:
+    """
+    Restituisce il bundle del corpus dallo snapshot binario se aggiornato; altrimenti lo
+    ricostruisce dai JSON sorgente e riscrive lo snapshot per gli avvii successivi.
+    """
+    corpus_files = find_corpus_files(structured_dir, chunks_dir, doc_info_map)
+    content_hash = corpus_content_hash(corpus_files, doc_info_map)
+    bundle = read_corpus_snapshot(snapshot_path, content_hash)
+    if bundle is not None:
+        print(f"   - Snapshot del corpus caricato da '{os.path.basename(snapshot_path)}' (hash {content_hash[:12]}).")
+        return bundle
+
+    print("   - Snapshot del corpus assente o obsoleto. Caricamento dai file JSON...")
+    bundle = build_corpus_bundle(corpus_files, doc_info_map)
+    write_corpus_snapshot(snapshot_path, content_hash, bundle)
+    print(f"   - Snapshot del corpus scritto in '{os.path.basename(snapshot_path)}' (hash {content_hash[:12]}).")
+    return bundle
@@ -0,0 +1,190 @@
+import re
+from g_src.g_general.utils_router import SECTION_PATTERN, normalize_section_number, section_signature
+from g_src.g_general.utils_tracing import traced
+
+DOC_TYPE_MAP = {"costituzione": "costituzione", "regolamento": "regolamento_parlamentare"}
+SECTION_KINDS_PLURAL = {"parte": "parti", "titolo": "titoli", "capo": "capi", "sezione": "sezioni"}
+KIND_FROM_PLURAL = {plural: kind for kind, plural in SECTION_KINDS_PLURAL.items()}
+
+COUNT_PATTERN = re.compile(r"\bquant[ie]\s+(parti|titoli|capi|sezioni|articoli|disposizioni)\b", re.IGNORECASE)
+LIST_PATTERN = re.compile(r"\b(?:elenc\w*|quali\s+sono)\s+(?:tutti\s+|tutte\s+)?(?:i|le|gli)\s+(parti|titoli|capi|sezioni)\b", re.IGNORECASE)
+
+def normalize_title(title: str) -> str:
+    """Normalizza un titolo di sezione: minuscolo, numerazione in cifre arabe, senza spazi e trattini."""
+    title_lower = title.lower()
+    heading = SECTION_PATTERN.match(title_lower)
+    if heading:
+        title_lower = f"{heading.group(1)}{normalize_section_number(heading.group(2))}{title_lower[heading.end():]}"
+    return re.sub(r"[\s\-–.]", "", title_lower)
+
+def build_structural_index(all_structures: list) -> dict:
+    """
+    Appiattisce una sola volta gli alberi delle strutture in tabelle di lookup per documento:
+    - 'nodes': lista piatta dei nodi con percorso, genitore, figli e conteggi;
+    - 'article_paths': articolo -> indice del nodo che lo contiene;
+    - 'title_index': titolo normalizzato -> indice del nodo;
+    - 'heading_index': 'tipo:numero' (es. 'capo:1') -> indici dei nodi.
+    """
+    structural_index = {}
+    for doc in all_structures:
+        doc_index = {
+            "document_title": doc.get("document_title", "Sconosciuto"),
+            "document_type": doc.get("document_type"),
+            "nodes": [],
+            "article_paths": {},
+            "title_index": {},
+            "heading_index": {},
+            "kind_counts": {},
+        }
+        nodes = doc_index["nodes"]
+
+        def flatten(children: list, parent: int | None, path: list) -> list:
+            indices = []
+            for node in children:
+                title = node.get("title", "")
+                heading = SECTION_PATTERN.match(title)
+                kind = heading.group(1).lower() if heading else None
+                number = normalize_section_number(heading.group(2)) if heading else None
+                node_idx = len(nodes)
+                nodes.append({
+                    "title": title,
+                    "level": node.get("level"),
+                    "kind": kind,
+                    "number": number,
+                    "path": path + [title],
+                    "parent": parent,
+                    "children": [],
+                    "articles": [str(a) for a in node.get("articles", [])],
+                })
+                doc_index["title_index"].setdefault(normalize_title(title), node_idx)
+                if kind and number:
+                    doc_index["heading_index"].setdefault(f"{kind}:{number}", []).append(node_idx)
+                    doc_index["kind_counts"][kind] = doc_index["kind_counts"].get(kind, 0) + 1
+                for article_id in nodes[node_idx]["articles"]:
+                    doc_index["article_paths"].setdefault(article_id, node_idx)
+                nodes[node_idx]["children"] = flatten(node.get("children", []), node_idx, path + [title])
+                indices.append(node_idx)
+            return indices
+
+        flatten(doc.get("structure", []), None, [])
+
+        # Conteggi aggregati dal basso: articoli totali e sottonodi per tipo
+        for node in reversed(nodes):
+            node["article_count"] = len(node["articles"]) + sum(nodes[c]["article_count"] for c in node["children"])
+            node["child_count"] = len(node["children"])
+            kinds = {}
+            for c in node["children"]:
+                child = nodes[c]
+                if child["kind"]:
+                    kinds[child["kind"]] = kinds.get(child["kind"], 0) + 1
+                for kind, count in child["descendant_kinds"].items():
+                    kinds[kind] = kinds.get(kind, 0) + count
+            node["descendant_kinds"] = kinds
+
+        structural_index[doc_index["document_type"]] = doc_index
+    return structural_index
+
+def find_section_nodes(doc_index: dict, section_entity: str) -> list:
+    """Risolve un riferimento di sezione ('Titolo IV della Parte Seconda', 'capo 1') negli indici dei nodi."""
+    nodes = doc_index["nodes"]
+    pairs = [pair for pair in section_signature(section_entity) if isinstance(pair, tuple)]
+    if pairs:
+        matches = []
+        for kind, number in pairs:
+            for node_idx in doc_index["heading_index"].get(f"{kind}:{number}", []):
+                ancestors = set()
+                parent = nodes[node_idx]["parent"]
+                while parent is not None:
+                    ancestors.add((nodes[parent]["kind"], nodes[parent]["number"]))
+                    parent = nodes[parent]["parent"]
+                if all(other in ancestors for other in pairs if other != (kind, number)):
+                    matches.append(node_idx)
+        return sorted(set(matches), key=lambda i: -(nodes[i]["level"] or 0))
+
+    search_term_norm = normalize_title(section_entity)
+    if search_term_norm in doc_index["title_index"]:
+        return [doc_index["title_index"][search_term_norm]]
+    return [i for i, node in enumerate(nodes) if search_term_norm and search_term_norm in normalize_title(node["title"])][:1]
+
+def section_answer(doc: dict, node: dict | None, section_entity: str | None, count_match, list_match) -> tuple:
+    """
+    Risposta strutturale per un documento (o una sua sezione): (testo, informativa).
+    Un conteggio a 0 o un elenco vuoto non è informativo: si usa solo se nessun altro documento risponde.
+    """
+    doc_title = doc["document_title"]
+    scope = f"la sezione \"{node['title']}\"" if node else "il documento"
+    if count_match:
+        counted = count_match.group(1).lower()
+        if counted in ("articoli", "disposizioni"):
+            total = node["article_count"] if node else len(doc["article_paths"])
+        else:
+            kind = KIND_FROM_PLURAL[counted]
+            total = node["descendant_kinds"].get(kind, 0) if node else doc["kind_counts"].get(kind, 0)
+        return f"Nel documento '{doc_title}', {scope} contiene {total} {counted}.", total > 0
+
+    if list_match:
+        kind = KIND_FROM_PLURAL[list_match.group(1).lower()]
+        candidates = [doc["nodes"][c] for c in node["children"]] if node else doc["nodes"]
+        titles = [n["title"] for n in candidates if n["kind"] == kind]
+        if titles:
+            return f"Nel documento '{doc_title}', {scope} contiene {len(titles)} {list_match.group(1).lower()}:\n" + "\n".join(f"- {t}" for t in titles), True
+        if node:
+            return f"Nel documento '{doc_title}', la sezione \"{node['title']}\" non contiene {list_match.group(1).lower()}.", False
+        return None, False
+
+    if node:
+        return f"Nel documento '{doc_title}', la sezione trovata per '{section_entity}' è: \"{node['title']}\".", True
+    return None, False
+
+@traced("structural")
+def handle_structural_query(analysis: dict, structural_index: dict, user_query: str = "") -> str | None:
+    """Gestisce le query strutturali con lookup sull'indice precalcolato, senza chiamate LLM."""
+    if analysis.get("intent") != 'ricerca_strutturale':
+        return None
+
+    entities = analysis.get("entities", {})
+    doc_entity = entities.get("documento")
+    article_values = entities.get("articolo")
+    article_entities = [str(a) for a in article_values] if isinstance(article_values, list) else ([str(article_values)] if article_values else [])
+    section_entity = entities.get("nome_sezione")
+
+    target_doc_type = DOC_TYPE_MAP.get(doc_entity.lower()) if doc_entity else None
+    docs_to_search = [doc for doc_type, doc in structural_index.items() if not target_doc_type or doc_type == target_doc_type]
+
+    count_match = COUNT_PATTERN.search(user_query)
+    list_match = LIST_PATTERN.search(user_query)
+
+    if article_entities:
+        answers = []
+        for article_entity in article_entities:
+            for doc in docs_to_search:
+                node_idx = doc["article_paths"].get(article_entity)
+                if node_idx is not None:
+                    path = doc["nodes"][node_idx]["path"]
+                    answers.append(f"L'articolo {article_entity} si trova nel documento '{doc['document_title']}' all'interno del percorso: {' -> '.join(path)}.")
+                    break
+        if answers:
+            return "\n".join(answers)
+        doc_info = f"nel documento '{doc_entity}'" if doc_entity else "in nessun documento"
+        return f"Non è stato possibile trovare l'articolo {', '.join(article_entities)} {doc_info}."
+
+    # Senza documento indicato si interrogano tutti: un conteggio a 0 o un elenco vuoto in un
+    # documento (es. la Parte Prima della Costituzione non ha capi) non deve nascondere gli altri
+    answers, fallbacks = [], []
+    for doc in docs_to_search:
+        node = None
+        if section_entity:
+            found = find_section_nodes(doc, section_entity)
+            if not found:
+                continue
+            node = doc["nodes"][found[0]]
+        answer, informative = section_answer(doc, node, section_entity, count_match, list_match)
+        if answer:
+            (answers if informative else fallbacks).append(answer)
+    if answers or fallbacks:
+        return "\n".join(answers) if answers else fallbacks[0]
+
+    if section_entity:
+        doc_info = f"nel documento '{doc_entity}'" if doc_entity else "in nessun documento"
+        return f"Nessuna sezione corrispondente a '{section_entity}' è stata trovata {doc_info}."
+    return "Query strutturale non riconosciuta."
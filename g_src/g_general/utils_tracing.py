@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import threading
+import functools
+import contextvars
+from datetime import datetime
+from contextlib import contextmanager
+
+# ==============================================================================
+# --- TRACING LEGGERO PER FASE ---
+# Ogni domanda apre una traccia (lista di span); le funzioni della pipeline
+# aggiungono uno span con nome della fase e durata. La traccia corrente viaggia
+# in una ContextVar: per i thread del pool va propagata con `run_in_trace`.
+# ==============================================================================
+
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+
+@contextmanager
+def trace():
+    """Apre una traccia per la domanda corrente e restituisce la lista dei suoi span."""
+    spans = []
+    token = _current_trace.set({"spans": spans, "start": time.perf_counter(), "lock": threading.Lock()})
+    try:
+        yield spans
+    finally:
+        _current_trace.reset(token)
+
+@contextmanager
+def span(stage: str, **attributes):
+    """Misura un blocco di codice come span della traccia corrente (nessun effetto senza traccia)."""
+    current = _current_trace.get()
+    start = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        if current is not None:
+            record = {
+                "stage": stage,
+                "start_ms": round((start - current["start"]) * 1000, 3),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                "thread": threading.current_thread().name,
+            }
+            record.update(attributes)
+            with current["lock"]:
+                current["spans"].append(record)
+
+def traced(stage: str):
+    """Decoratore: registra ogni chiamata della funzione come span 'stage'."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def run_in_trace(func):
+    """Lega 'func' al contesto corrente, così gli span registrati in un altro thread finiscono nella stessa traccia."""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)
+
+def stage_totals(spans: list) -> dict:
+    """Durata totale per fase (secondi) a partire dagli span di una traccia."""
+    totals = {}
+    for record in spans:
+        totals[record["stage"]] = totals.get(record["stage"], 0.0) + record["duration_ms"] / 1000
+    return totals
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summarize_traces(traces: list) -> dict:
+    """Per ogni fase: numero di domande, p50, p95 e p99 della durata (ms) sommata per domanda."""
+    per_stage = {}
+    for spans in traces:
+        for stage, seconds in stage_totals(spans).items():
+            per_stage.setdefault(stage, []).append(seconds * 1000)
+    return {
+        stage: {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99)}
+        for stage, values in per_stage.items()
+    }
+
+def print_trace_summary(traces: list):
+    summary = summarize_traces(traces)
+    if not summary:
+        return
+    print(f"\n--- Latenza per fase su {len(traces)} domande (ms) ---")
+    print(f"   {'fase':<20}{'n':>5}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, stats in sorted(summary.items(), key=lambda item: -item[1]["p50"]):
+        print(f"   {stage:<20}{stats['count']:>5}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}")
+
+class TraceLog:
+    """File JSONL a rotazione con una riga per domanda (domanda, percorso, span)."""
+
+    def __init__(self, path: str, max_bytes: int = 5_000_000, backups: int = 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def write(self, question: str, path_taken: str | None, spans: list):
+        record = {"timestamp": datetime.now().isoformat(timespec="seconds"), "question": question, "path_taken": path_taken, "spans": spans}
+        with self._lock:
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
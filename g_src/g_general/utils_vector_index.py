@@ -0,0 +1,143 @@
+import os
+import json
+import hashlib
+from types import SimpleNamespace
+import numpy as np
+
+# Nomi dei file di cache dell'indice locale (derivati, generati nella cartella di cache non versionata)
+INDEX_MATRIX_FILE = "vector_index.npy"
+INDEX_PAYLOADS_FILE = "vector_index_payloads.json"
+INDEX_META_FILE = "vector_index_meta.json"
+
+def get_chunk_id(payload: dict) -> str:
+    """Restituisce un identificativo stabile del chunk (documento, articolo, comma)."""
+    return f"{payload.get('document_type', 'N/D')}:art_{payload.get('articolo')}_comma_{payload.get('comma')}"
+
+def find_embedding_files(embeddings_dir: str) -> list:
+    """Trova i file '*_embeddings.json' di tutte le fonti documentali, in ordine stabile."""
+    embedding_files = []
+    if not os.path.isdir(embeddings_dir):
+        return embedding_files
+    for doc_folder in sorted(os.listdir(embeddings_dir)):
+        doc_folder_path = os.path.join(embeddings_dir, doc_folder)
+        if os.path.isdir(doc_folder_path):
+            embedding_file = next((f for f in sorted(os.listdir(doc_folder_path)) if f.endswith('_embeddings.json')), None)
+            if embedding_file:
+                embedding_files.append(os.path.join(doc_folder_path, embedding_file))
+    return embedding_files
+
+def _sources_signature(embedding_files: list) -> list:
+    """Firma dei file sorgente (percorso, dimensione, mtime) per rilevare una cache obsoleta."""
+    signature = []
+    for path in embedding_files:
+        stat = os.stat(path)
+        signature.append([os.path.basename(path), stat.st_size, int(stat.st_mtime)])
+    return signature
+
+def _rebuild_index_cache(cache_dir: str, embedding_files: list, signature: list):
+    """Legge i JSON degli embedding e scrive la matrice normalizzata e i payload su disco."""
+    vectors = []
+    payloads = []
+    for path in embedding_files:
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        for record in records:
+            if not record.get("embedding"):
+                continue
+            vectors.append(record["embedding"])
+            payloads.append({k: v for k, v in record.items() if k != "embedding"})
+        print(f"     - File Embedding '{os.path.basename(path)}' caricato ({len(records)} record).")
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(os.path.join(cache_dir, INDEX_MATRIX_FILE), matrix)
+    with open(os.path.join(cache_dir, INDEX_PAYLOADS_FILE), "w", encoding="utf-8") as f:
+        json.dump(payloads, f, ensure_ascii=False)
+    with open(os.path.join(cache_dir, INDEX_META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"sources": signature, "count": len(payloads), "dim": int(matrix.shape[1]) if matrix.size else 0}, f)
+
+def _build_masks(payloads: list, field: str) -> dict:
+    """Precalcola una maschera booleana per ogni valore distinto del campo indicato."""
+    values = np.asarray([str(p.get(field)) for p in payloads], dtype=object)
+    return {value: values == value for value in set(values.tolist())}
+
+def build_vector_index(embeddings_dir: str, cache_dir: str) -> dict | None:
+    """
+    Costruisce l'indice vettoriale in-process a partire dagli embedding salvati su disco.
+    La matrice (normalizzata, float32) viene memorizzata in un file .npy in 'cache_dir'
+    (fuori dagli output versionati) e aperta in memory-map; viene rigenerata solo quando
+    i file JSON di origine cambiano.
+    """
+    embedding_files = find_embedding_files(embeddings_dir)
+    if not embedding_files:
+        print(f"   - ⚠️  WARNING: Nessun file di embedding trovato in '{embeddings_dir}'. Indice locale non disponibile.")
+        return None
+
+    signature = _sources_signature(embedding_files)
+    meta_path = os.path.join(cache_dir, INDEX_META_FILE)
+    cached_signature = None
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            cached_signature = json.load(f).get("sources")
+
+    if cached_signature != signature or not os.path.exists(os.path.join(cache_dir, INDEX_MATRIX_FILE)):
+        print("   - Cache dell'indice locale assente o obsoleta. Ricostruzione in corso...")
+        _rebuild_index_cache(cache_dir, embedding_files, signature)
+
+    matrix = np.load(os.path.join(cache_dir, INDEX_MATRIX_FILE), mmap_mode="r")
+    with open(os.path.join(cache_dir, INDEX_PAYLOADS_FILE), "r", encoding="utf-8") as f:
+        payloads = json.load(f)
+
+    index = {
+        "version": hashlib.sha256(json.dumps(signature).encode("utf-8")).hexdigest()[:16],
+        "matrix": matrix,
+        "payloads": payloads,
+        "ids": [get_chunk_id(p) for p in payloads],
+        "masks": {
+            "document_type": _build_masks(payloads, "document_type"),
+            "articolo": _build_masks(payloads, "articolo"),
+        }
+    }
+    print(f"   - Indice vettoriale locale pronto: {matrix.shape[0]} vettori di dimensione {matrix.shape[1]}.")
+    return index
+
+def search_vector_index(index: dict, query_vector: list, document_type: str | None = None, articles: list | None = None, limit: int = 20) -> list:
+    """
+    Ricerca esatta per similarità coseno (un solo prodotto matrice-vettore), con gli
+    stessi filtri 'document_type'/'articolo' della ricerca su Qdrant.
+    Restituisce oggetti con gli attributi 'id', 'score' e 'payload' come gli ScoredPoint.
+    """
+    query = np.asarray(query_vector, dtype=np.float32)
+    query_norm = np.linalg.norm(query)
+    if query_norm > 0:
+        query = query / query_norm
+    scores = index["matrix"] @ query
+
+    mask = None
+    if document_type:
+        mask = index["masks"]["document_type"].get(document_type)
+        if mask is None:
+            return []
+    if articles:
+        article_masks = [index["masks"]["articolo"][str(a)] for a in articles if str(a) in index["masks"]["articolo"]]
+        if not article_masks:
+            return []
+        articles_mask = np.logical_or.reduce(article_masks)
+        mask = articles_mask if mask is None else (mask & articles_mask)
+
+    candidates = np.flatnonzero(mask) if mask is not None else np.arange(scores.shape[0])
+    if candidates.size == 0:
+        return []
+    candidate_scores = scores[candidates]
+    k = min(limit, candidates.size)
+    top = np.argpartition(-candidate_scores, k - 1)[:k]
+    top = top[np.argsort(-candidate_scores[top])]
+
+    return [
+        SimpleNamespace(id=index["ids"][candidates[i]], score=float(candidate_scores[i]), payload=index["payloads"][candidates[i]])
+        for i in top
+    ]
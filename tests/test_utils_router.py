@@ -0,0 +1,33 @@
+# tests/test_utils_router.py
+
+"""
+Router deterministico: con entrambi i documenti, o con articolo e sezione insieme,
+la fast path non deve scegliere un solo riferimento ma lasciare decidere al router LLM.
+"""
+
+import os
+import sys
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_router import fast_analyze_query
+
+THRESHOLD = 0.8
+
+def test_single_document_is_fast_path():
+    analysis, confidence = fast_analyze_query("Cosa dice l'articolo 5 del Regolamento?")
+    assert analysis["entities"] == {"documento": "regolamento", "articolo": "5"}
+    assert confidence >= THRESHOLD
+
+def test_both_documents_leave_document_unset_and_fall_back():
+    analysis, confidence = fast_analyze_query("Che differenza c'è tra la Costituzione e il Regolamento sulla sfiducia?")
+    assert "documento" not in analysis["entities"]
+    assert confidence < THRESHOLD
+
+def test_article_and_section_are_both_kept_and_fall_back():
+    analysis, confidence = fast_analyze_query("Quanti articoli ha il Capo II e di cosa parla l'articolo 4?")
+    assert analysis["entities"]["articolo"] == "4"
+    assert analysis["entities"]["nome_sezione"] == "Capo II"
+    assert confidence < THRESHOLD
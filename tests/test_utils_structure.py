@@ -0,0 +1,48 @@
+# tests/test_utils_structure.py
+
+"""
+Query strutturali senza documento indicato, sulle strutture reali dei due documenti:
+un conteggio a 0 o un elenco vuoto nella Costituzione non deve nascondere il Regolamento.
+"""
+
+import os
+import sys
+import json
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_router import fast_analyze_query
+from g_src.g_general.utils_structure import build_structural_index, handle_structural_query
+
+STRUCTURE_FILES = [
+    os.path.join(project_root, "d_outputs", "03_structured", "a_cost", "cost_structure.json"),
+    os.path.join(project_root, "d_outputs", "03_structured", "b_regcam", "regcam_structure.json"),
+]
+
+def structural_answer(question: str) -> str:
+    structures = []
+    for path in STRUCTURE_FILES:
+        with open(path, "r", encoding="utf-8") as f:
+            structures.append(json.load(f))
+    analysis, _ = fast_analyze_query(question)
+    return handle_structural_query(analysis, build_structural_index(structures), question)
+
+def test_count_skips_document_with_zero_sections():
+    answer = structural_answer("quanti capi ha la parte prima?")
+    assert "Regolamento della Camera dei Deputati" in answer
+    assert "contiene 14 capi" in answer
+    assert "contiene 0 capi" not in answer
+
+def test_list_skips_document_without_sections_of_that_kind():
+    answer = structural_answer("Elenca tutti i capi della Parte Prima.")
+    assert "Regolamento della Camera dei Deputati" in answer
+    assert "contiene 14 capi:" in answer
+    assert "- CAPO I - DISPOSIZIONI PRELIMINARI" in answer
+    assert "Costituzione" not in answer
+
+def test_named_document_keeps_its_own_answer():
+    answer = structural_answer("quanti titoli ha la parte prima della costituzione?")
+    assert "Costituzione della Repubblica Italiana" in answer
+    assert "contiene 4 titoli" in answer
@@ -0,0 +1,105 @@
+# v_tools/bench_docx_parse.py
+
+"""
+Benchmark dell'estrazione degli articoli dai docx dei documenti.
+
+Per ogni documento misura (mediana su più esecuzioni):
+- 'pandoc': conversione `pypandoc.convert_file(..., 'plain')` + divisione in articoli,
+  come facevano gli script prima di utils_articles (saltato se pandoc non è disponibile);
+- 'python-docx': lettura nativa dei paragrafi + divisione in articoli;
+- 'cache': caricamento dell'artefatto in cache (verifica dell'hash del docx inclusa).
+
+Se pandoc è disponibile confronta anche i due testi articolo per articolo (a meno degli
+spazi: pandoc manda a capo le righe lunghe), segnalando articoli mancanti o diversi.
+
+USO:
+    python v_tools/bench_docx_parse.py [--runs 5]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+# --- Setup del Percorso ---
+script_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_articles import load_articles, read_docx_text, split_articles
+
+DOCUMENTS = {
+    "a_cost": ("cost", os.path.join(project_root, "b_testi", "a_cost", "cost_2023_22_10_testo.docx")),
+    "b_regcam": ("regcam", os.path.join(project_root, "b_testi", "b_regcam", "regcam_testo.docx")),
+}
+
+def pandoc_articles(docx_path: str, layout: str) -> dict:
+    import pypandoc
+    full_text = pypandoc.convert_file(docx_path, 'plain', format='docx').replace('\r\n', '\n')
+    return split_articles(full_text, layout)
+
+def native_articles(docx_path: str, layout: str) -> dict:
+    return split_articles(read_docx_text(docx_path), layout)
+
+def timed(function, runs: int) -> tuple:
+    """Mediana dei tempi (ms) e risultato dell'ultima esecuzione."""
+    timings, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+def compare(pandoc_map: dict, native_map: dict):
+    missing = sorted(set(pandoc_map) - set(native_map))
+    extra = sorted(set(native_map) - set(pandoc_map))
+    different = [a for a in pandoc_map if a in native_map and normalize(pandoc_map[a]) != normalize(native_map[a])]
+    print(f"   Confronto: {len(pandoc_map)} articoli pandoc, {len(native_map)} python-docx, {len(different)} con testo diverso")
+    if missing:
+        print(f"   Solo in pandoc: {', '.join(missing)}")
+    if extra:
+        print(f"   Solo in python-docx: {', '.join(extra)}")
+    if different:
+        print(f"   Diversi: {', '.join(different[:20])}{' ...' if len(different) > 20 else ''}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pandoc vs python-docx vs cache per l'estrazione degli articoli.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        import pypandoc
+        pypandoc.get_pandoc_version()
+        pandoc_available = True
+    except Exception as e:
+        print(f"⚠️ pandoc non disponibile ({e.__class__.__name__}): misuro solo python-docx e cache.")
+        pandoc_available = False
+
+    # Cache in una cartella temporanea, per non toccare quella della pipeline
+    cache_dir = tempfile.mkdtemp(prefix="bench_articles_")
+    for doc_name, (layout, docx_path) in DOCUMENTS.items():
+        size_kb = os.path.getsize(docx_path) / 1024
+        print(f"\n=== {doc_name} ({os.path.basename(docx_path)}, {size_kb:.0f} KB) ===")
+
+        pandoc_map = None
+        if pandoc_available:
+            pandoc_ms, pandoc_map = timed(lambda: pandoc_articles(docx_path, layout), args.runs)
+            print(f"   pandoc:      {pandoc_ms:8.1f} ms ({len(pandoc_map)} articoli)")
+        native_ms, native_map = timed(lambda: native_articles(docx_path, layout), args.runs)
+        print(f"   python-docx: {native_ms:8.1f} ms ({len(native_map)} articoli)")
+        load_articles(docx_path, layout, cache_dir, verbose=False)
+        cache_ms, _ = timed(lambda: load_articles(docx_path, layout, cache_dir, verbose=False), args.runs)
+        print(f"   cache:       {cache_ms:8.1f} ms")
+        if pandoc_map is not None:
+            print(f"   Speedup python-docx: x{pandoc_ms / native_ms:.1f}, cache: x{pandoc_ms / cache_ms:.0f}")
+            compare(pandoc_map, native_map)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# v_tools/bench_hybrid.py
+
+"""
+Confronto tra il retrieval attuale (vettoriale + re-ranking per keyword) e il retrieval
+ibrido (vettoriale + BM25 fusi con Reciprocal Rank Fusion).
+
+Per ogni domanda misura la latenza del solo passo di retrieval (l'embedding della domanda
+è condiviso e calcolato una volta) e la recall@k rispetto ai chunk attesi.
+
+Le domande etichettate si leggono da un file JSONL ({"question": ..., "relevant": [chunk_id, ...]},
+con chunk_id nella forma di `get_chunk_id`). Senza file, le etichette sono generate dalle
+keyword multi-parola dei chunk (es. "numero legale"): la domanda è la keyword, i chunk attesi
+quelli che la riportano. Queste pseudo-etichette favoriscono BM25, che indicizza anche le
+keyword: vanno lette come misura di recall sui termini giuridici esatti, non come accuratezza
+assoluta.
+
+USO:
+    python v_tools/bench_hybrid.py [--labels FILE.jsonl] [--sample 50] [--k 20]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+# --- Setup del Percorso ---
+script_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.config import load_config_and_clients
+from g_src.g_general.utils import embed_query, vector_search, rerank_results
+from g_src.g_general.utils_bm25 import build_bm25_index, search_bm25, reciprocal_rank_fusion
+from g_src.g_general.utils_vector_index import get_chunk_id
+
+def keyword_labels(all_chunks: list, sample: int, max_relevant: int = 10) -> list:
+    """Genera domande etichettate dalle keyword multi-parola presenti in pochi chunk."""
+    chunks_by_keyword = {}
+    for chunk in all_chunks:
+        for keyword in chunk.get("keywords", []) or []:
+            keyword = keyword.strip().lower()
+            if len(keyword.split()) >= 2:
+                chunks_by_keyword.setdefault(keyword, set()).add(get_chunk_id(chunk))
+    candidates = sorted(k for k, ids in chunks_by_keyword.items() if len(ids) <= max_relevant)
+    random.Random(42).shuffle(candidates)
+    return [{"question": k, "relevant": sorted(chunks_by_keyword[k])} for k in candidates[:sample]]
+
+def load_labels(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def recall_at_k(hits: list, relevant: list, k: int) -> float:
+    retrieved = {get_chunk_id(hit.payload) for hit in hits[:k]}
+    return len(retrieved & set(relevant)) / max(len(relevant), 1)
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval vettoriale+rerank vs ibrido BM25+RRF.")
+    parser.add_argument("--labels", help="File JSONL di domande etichettate.")
+    parser.add_argument("--sample", type=int, default=50, help="Numero di pseudo-etichette dalle keyword (senza --labels).")
+    parser.add_argument("--k", type=int, default=20, help="Profondità della recall.")
+    args = parser.parse_args()
+
+    config, clients, _, _, all_chunks = load_config_and_clients()
+    bm25_index = clients.get("bm25_index") or build_bm25_index(all_chunks)
+    labels = load_labels(args.labels) if args.labels else keyword_labels(all_chunks, args.sample)
+    print(f"\n--- Benchmark Retrieval Ibrido: {len(labels)} domande, recall@{args.k} ---")
+
+    rows = []
+    for item in labels:
+        question = item["question"]
+        query_vector = embed_query(clients, config, question)
+        vector_hits = vector_search(clients, config, query_vector, None, [], limit=args.k)
+
+        t0 = time.perf_counter()
+        reranked = rerank_results(vector_hits, question)
+        rerank_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        lexical_hits = search_bm25(bm25_index, question, limit=args.k)
+        fused = reciprocal_rank_fusion([vector_hits, lexical_hits], k=config["rrf_k"], limit=args.k)
+        hybrid_ms = (time.perf_counter() - t0) * 1000
+
+        row = {
+            "rerank_recall": recall_at_k(reranked, item["relevant"], args.k),
+            "hybrid_recall": recall_at_k(fused, item["relevant"], args.k),
+            "bm25_recall": recall_at_k(lexical_hits, item["relevant"], args.k),
+            "rerank_ms": rerank_ms,
+            "hybrid_ms": hybrid_ms,
+        }
+        rows.append(row)
+        print(f"  rerank {row['rerank_recall']:.2f} | ibrido {row['hybrid_recall']:.2f} | bm25 {row['bm25_recall']:.2f}  {question}")
+
+    if not rows:
+        print("Nessuna domanda da valutare.")
+        return
+    count = len(rows)
+    print("\n--- Risultati ---")
+    for name in ("rerank", "hybrid", "bm25"):
+        print(f"Recall@{args.k} media {name:<7}: {sum(r[f'{name}_recall'] for r in rows) / count:.3f}")
+    for name in ("rerank", "hybrid"):
+        latencies = [r[f"{name}_ms"] for r in rows]
+        print(f"Latenza aggiuntiva {name:<7}: p50 {percentile(latencies, 50):.3f} ms, p99 {percentile(latencies, 99):.3f} ms (esclusi embedding e ricerca vettoriale)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# v_tools/bench_qdrant_transport.py
+
+"""
+Benchmark dei trasporti del client Qdrant (rest, grpc, async, async_grpc).
+
+Su un'istanza Qdrant locale di prova (es. `docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant`)
+crea una collezione temporanea con i payload reali dei chunk (d_outputs/04_chunks) e vettori
+casuali di dimensione 768, poi per ogni trasporto misura:
+- la latenza di `search` (limit 20, con e senza filtro per documento), p50 e p99;
+- il tempo di uno `scroll` completo della collezione.
+Upsert e delete vengono esercitati nella preparazione e nella pulizia della collezione.
+
+USO:
+    python v_tools/bench_qdrant_transport.py [--url http://localhost:6333] [--grpc-port 6334]
+                                             [--queries 200] [--transports rest,grpc,async,async_grpc]
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+
+# --- Setup del Percorso ---
+script_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from qdrant_client import models
+from g_src.g_general.utils_qdrant import make_qdrant_client, QDRANT_TRANSPORTS
+from g_src.g_general.utils_tracing import percentile
+
+CHUNKS_DIR = os.path.join(project_root, "d_outputs", "04_chunks")
+VECTOR_SIZE = 768
+UPSERT_BATCH_SIZE = 256
+
+def load_payloads() -> list:
+    payloads = []
+    for doc_folder in sorted(os.listdir(CHUNKS_DIR)):
+        doc_path = os.path.join(CHUNKS_DIR, doc_folder)
+        chunk_file = next((f for f in sorted(os.listdir(doc_path)) if f.endswith('_chunks.json')), None) if os.path.isdir(doc_path) else None
+        if chunk_file:
+            with open(os.path.join(doc_path, chunk_file), "r", encoding="utf-8") as f:
+                payloads.extend(json.load(f))
+    return payloads
+
+def random_vector(rng: random.Random) -> list:
+    return [rng.uniform(-1, 1) for _ in range(VECTOR_SIZE)]
+
+def setup_collection(client, collection_name: str, payloads: list, rng: random.Random):
+    client.create_collection(collection_name=collection_name, vectors_config=models.VectorParams(size=VECTOR_SIZE, distance=models.Distance.COSINE))
+    client.create_payload_index(collection_name=collection_name, field_name="document_type", field_schema=models.PayloadSchemaType.KEYWORD)
+    points = [models.PointStruct(id=str(uuid.uuid4()), vector=random_vector(rng), payload=payload) for payload in payloads]
+    for start in range(0, len(points), UPSERT_BATCH_SIZE):
+        client.upsert(collection_name=collection_name, points=points[start:start + UPSERT_BATCH_SIZE], wait=True)
+
+def bench_transport(client, collection_name: str, query_vectors: list) -> dict:
+    doc_filter = models.Filter(must=[models.FieldCondition(key="document_type", match=models.MatchValue(value="regolamento_parlamentare"))])
+    for vector in query_vectors[:10]: # Riscaldamento della connessione
+        client.search(collection_name=collection_name, query_vector=vector, limit=20)
+
+    latencies = {"search": [], "search_filtrata": []}
+    for i, vector in enumerate(query_vectors):
+        kind = "search_filtrata" if i % 2 else "search"
+        t0 = time.perf_counter()
+        client.search(collection_name=collection_name, query_vector=vector, query_filter=doc_filter if kind == "search_filtrata" else None, limit=20)
+        latencies[kind].append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    offset, scrolled = None, 0
+    while True:
+        points, offset = client.scroll(collection_name=collection_name, limit=256, offset=offset, with_payload=True, with_vectors=False)
+        scrolled += len(points)
+        if offset is None:
+            break
+    scroll_ms = (time.perf_counter() - t0) * 1000
+    return {"latencies": latencies, "scroll_ms": scroll_ms, "scrolled": scrolled}
+
+def main():
+    parser = argparse.ArgumentParser(description="Latenza di search/scroll di Qdrant per trasporto.")
+    parser.add_argument("--url", default="http://localhost:6333", help="URL dell'istanza Qdrant di prova.")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--grpc-port", type=int, default=6334)
+    parser.add_argument("--queries", type=int, default=200, help="Ricerche per trasporto.")
+    parser.add_argument("--transports", default=",".join(QDRANT_TRANSPORTS), help="Trasporti da confrontare, separati da virgola.")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    payloads = load_payloads()
+    query_vectors = [random_vector(rng) for _ in range(args.queries)]
+    collection_name = f"bench_transport_{uuid.uuid4().hex[:8]}"
+
+    print(f"--- Benchmark Trasporti Qdrant: {len(payloads)} punti, {args.queries} ricerche per trasporto su '{args.url}' ---")
+    setup_client = make_qdrant_client(args.url, args.api_key, "rest", args.grpc_port)
+    setup_collection(setup_client, collection_name, payloads, rng)
+    print(f"✅ Collezione temporanea '{collection_name}' creata.")
+
+    results = {}
+    try:
+        for transport in args.transports.split(","):
+            client = make_qdrant_client(args.url, args.api_key, transport.strip(), args.grpc_port)
+            try:
+                results[transport] = bench_transport(client, collection_name, query_vectors)
+            except Exception as e:
+                print(f"❌ Trasporto '{transport}' fallito: {e}")
+            finally:
+                client.close()
+    finally:
+        setup_client.delete_collection(collection_name=collection_name)
+        print(f"🧹 Collezione temporanea '{collection_name}' eliminata.")
+
+    print(f"\n   {'trasporto':<12}{'search p50':>12}{'p99':>10}{'filtrata p50':>14}{'p99':>10}{'scroll (ms)':>13}")
+    for transport, result in results.items():
+        plain, filtered = result["latencies"]["search"], result["latencies"]["search_filtrata"]
+        print(
+            f"   {transport:<12}{percentile(plain, 50):>12.2f}{percentile(plain, 99):>10.2f}"
+            f"{percentile(filtered, 50):>14.2f}{percentile(filtered, 99):>10.2f}{result['scroll_ms']:>13.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# v_tools/bench_router.py
+
+"""
+Benchmark del router deterministico (fast path) contro il router LLM.
+
+Per ogni domanda del file di test (le righe che iniziano con # vengono ignorate):
+- classifica la domanda con le regex di `fast_analyze_query`;
+- la classifica con il router LLM (`analyze_query_with_llm`), salvo `--no-llm`;
+- confronta intent, documento, articolo e nome_sezione.
+
+Riporta la copertura del fast path (domande sopra soglia), l'accordo con l'LLM
+sulle domande coperte e la latenza risparmiata rispetto al router LLM.
+
+USO:
+    python v_tools/bench_router.py [--file PERCORSO] [--threshold 0.8] [--no-llm]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+# --- Setup del Percorso ---
+script_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_router import fast_analyze_query, section_signature, normalize_article_id
+
+DEFAULT_QUESTIONS_PATH = os.path.join(project_root, "g_src", "d_domande", "merged_file.txt")
+
+def load_questions(path: str) -> list:
+    """Legge le domande dal file, ignorando commenti, righe vuote e duplicati."""
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return list(dict.fromkeys(line for line in lines if line and not line.startswith("#")))
+
+def comparable(analysis: dict) -> dict:
+    """Riduce un'analisi del router a una forma canonica confrontabile."""
+    entities = analysis.get("entities", {}) or {}
+    articles = entities.get("articolo")
+    if articles is not None and not isinstance(articles, list):
+        articles = [articles]
+    documento = entities.get("documento")
+    return {
+        "intent": analysis.get("intent"),
+        "documento": documento.lower() if isinstance(documento, str) else None,
+        "articolo": sorted(normalize_article_id(str(a)) for a in articles) if articles else [],
+        "nome_sezione": section_signature(entities.get("nome_sezione")),
+    }
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark router deterministico vs router LLM.")
+    parser.add_argument("--file", default=DEFAULT_QUESTIONS_PATH, help="File di domande (una per riga).")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Soglia di confidenza del fast path.")
+    parser.add_argument("--no-llm", action="store_true", help="Non chiama il router LLM (solo copertura e latenza del fast path).")
+    args = parser.parse_args()
+
+    questions = load_questions(args.file)
+    print(f"--- Benchmark Router: {len(questions)} domande da '{os.path.basename(args.file)}' ---")
+
+    router_client = None
+    if not args.no_llm:
+        from g_src.g_general.config import load_config_and_clients
+        from g_src.g_general.utils import analyze_query_with_llm
+        config, clients, *_ = load_config_and_clients()
+        router_client = clients["gemini_models"]["router"]
+
+    rows = []
+    for question in questions:
+        t0 = time.perf_counter()
+        fast_analysis, confidence = fast_analyze_query(question)
+        fast_ms = (time.perf_counter() - t0) * 1000
+
+        llm_analysis, llm_ms = None, None
+        if router_client is not None:
+            t0 = time.perf_counter()
+            llm_analysis = analyze_query_with_llm(router_client, question)
+            llm_ms = (time.perf_counter() - t0) * 1000
+
+        covered = confidence >= args.threshold
+        agrees = comparable(fast_analysis) == comparable(llm_analysis) if llm_analysis else None
+        rows.append({"question": question, "covered": covered, "confidence": confidence, "fast_ms": fast_ms, "llm_ms": llm_ms, "agrees": agrees})
+
+        status = "FAST" if covered else "LLM "
+        agreement = "" if agrees is None else (" ✅" if agrees else " ❌")
+        print(f"  [{status} {confidence:.2f}]{agreement} {question}")
+        if agrees is False and covered:
+            print(f"       fast: {comparable(fast_analysis)}")
+            print(f"       llm : {comparable(llm_analysis)}")
+
+    covered_rows = [r for r in rows if r["covered"]]
+    fast_latencies = [r["fast_ms"] for r in rows]
+    print("\n--- Risultati ---")
+    print(f"Copertura fast path: {len(covered_rows)}/{len(rows)} ({len(covered_rows) / max(len(rows), 1):.0%}) con soglia {args.threshold}")
+    print(f"Latenza fast path:   p50 {percentile(fast_latencies, 50):.3f} ms, p99 {percentile(fast_latencies, 99):.3f} ms")
+
+    if router_client is not None:
+        llm_latencies = [r["llm_ms"] for r in rows]
+        agreeing = [r for r in covered_rows if r["agrees"]]
+        all_agreeing = [r for r in rows if r["agrees"]]
+        saved_ms = sum(r["llm_ms"] - r["fast_ms"] for r in covered_rows)
+        print(f"Latenza router LLM:  p50 {percentile(llm_latencies, 50):.0f} ms, p99 {percentile(llm_latencies, 99):.0f} ms, media {statistics.mean(llm_latencies):.0f} ms")
+        print(f"Accordo fast/LLM sulle domande coperte: {len(agreeing)}/{len(covered_rows)} ({len(agreeing) / max(len(covered_rows), 1):.0%})")
+        print(f"Accordo fast/LLM su tutte le domande:   {len(all_agreeing)}/{len(rows)} ({len(all_agreeing) / max(len(rows), 1):.0%})")
+        print(f"Latenza risparmiata: {saved_ms / 1000:.1f} s totali, {saved_ms / max(len(rows), 1):.0f} ms medi per domanda")
+
+if __name__ == "__main__":
+    main()
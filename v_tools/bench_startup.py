@@ -0,0 +1,96 @@
+# v_tools/bench_startup.py
+
+"""
+Benchmark del tempo di avvio a freddo di `load_config_and_clients`.
+
+Ogni misura gira in un processo Python nuovo con `-X importtime`:
+- 'lazy': avvio attuale, i client dei provider vengono costruiti al primo utilizzo;
+- 'eager': come prima dell'inizializzazione pigra, tutti i client e gli SDK
+  (google.generativeai, openai, qdrant_client) vengono costruiti subito (`clients.load_all()`).
+
+Riporta la mediana del tempo di avvio per modalità e il tempo cumulativo di import
+dei pacchetti pesanti letto dall'output di `-X importtime`.
+
+USO:
+    python v_tools/bench_startup.py [--runs 5]
+"""
+
+import os
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+
+# --- Setup del Percorso ---
+script_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+
+HEAVY_PACKAGES = ["google.generativeai", "openai", "qdrant_client", "tiktoken", "docx"]
+IMPORTTIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+STARTUP_MARKER = "__STARTUP_SECONDS__"
+
+SNIPPET = f"""
+import time
+start = time.perf_counter()
+from g_src.g_general.config import load_config_and_clients
+from g_src.g_general.utils_pipeline import answer_question
+config, clients, *_ = load_config_and_clients()
+if {{eager}}:
+    clients.load_all()
+print("{STARTUP_MARKER}", time.perf_counter() - start)
+"""
+
+def run_once(eager: bool) -> tuple:
+    """Avvia un processo nuovo e restituisce (secondi di avvio, {pacchetto: ms cumulativi di import})."""
+    env = dict(os.environ, PYTHONPATH=project_root)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SNIPPET.format(eager=eager)],
+        cwd=project_root, env=env, capture_output=True, text=True
+    )
+    marker_line = next((line for line in result.stdout.splitlines() if line.startswith(STARTUP_MARKER)), None)
+    if result.returncode != 0 or marker_line is None:
+        raise RuntimeError(f"Avvio fallito (exit {result.returncode}):\n{result.stdout[-2000:]}\n{result.stderr[-2000:]}")
+
+    import_ms = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match and match.group(4) in HEAVY_PACKAGES:
+            import_ms[match.group(4)] = int(match.group(2)) / 1000
+    return float(marker_line.split()[1]), import_ms
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo di avvio a freddo: client pigri vs inizializzazione completa.")
+    parser.add_argument("--runs", type=int, default=5, help="Processi avviati per modalità.")
+    args = parser.parse_args()
+
+    print(f"--- Benchmark Avvio: {args.runs} processi per modalità ---")
+    results = {}
+    for mode in ("eager", "lazy"):
+        timings, imports = [], {}
+        for _ in range(args.runs):
+            seconds, import_ms = run_once(eager=(mode == "eager"))
+            timings.append(seconds)
+            for package, ms in import_ms.items():
+                imports.setdefault(package, []).append(ms)
+        results[mode] = (timings, imports)
+
+    print(f"\n   {'modalità':<10}{'mediana (s)':>14}{'min (s)':>10}")
+    for mode, (timings, _) in results.items():
+        print(f"   {mode:<10}{statistics.median(timings):>14.3f}{min(timings):>10.3f}")
+
+    print(f"\n   Import dei pacchetti pesanti (ms cumulativi, mediana; '-' = non importato)")
+    print(f"   {'pacchetto':<22}{'eager':>10}{'lazy':>10}")
+    for package in HEAVY_PACKAGES:
+        cells = []
+        for mode in ("eager", "lazy"):
+            values = results[mode][1].get(package)
+            cells.append(f"{statistics.median(values):>10.1f}" if values else f"{'-':>10}")
+        print(f"   {package:<22}{''.join(cells)}")
+
+    eager_median = statistics.median(results["eager"][0])
+    lazy_median = statistics.median(results["lazy"][0])
+    print(f"\n⏱️ Avvio a freddo: {eager_median:.3f}s → {lazy_median:.3f}s ({eager_median - lazy_median:+.3f}s risparmiati).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# v_tools/build_corpus_snapshot.py
+
+"""
+Costruisce lo snapshot binario del corpus usato all'avvio da `load_config_and_clients`
+(strutture, riassunti, chunk, indice strutturale, chunk store e posting BM25) e
+confronta il tempo di caricamento dello snapshot con il percorso dai file JSON.
+
+Da lanciare dopo aver rigenerato le strutture o i chunk con i processori in c_processors;
+in ogni caso lo snapshot viene ricostruito in automatico al primo avvio con JSON cambiati.
+
+USO:
+    python v_tools/build_corpus_snapshot.py [--runs 5]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+# --- Setup del Percorso ---
+script_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.config import DOC_INFO_MAP
+from g_src.g_general.utils_snapshot import (
+    find_corpus_files,
+    corpus_content_hash,
+    build_corpus_bundle,
+    write_corpus_snapshot,
+    read_corpus_snapshot
+)
+
+STRUCTURED_DIR = os.path.join(project_root, "d_outputs", "03_structured")
+CHUNKS_DIR = os.path.join(project_root, "d_outputs", "04_chunks")
+SNAPSHOT_PATH = os.path.join(project_root, "d_outputs", "06_cache", "corpus_snapshot.bin")
+
+def main():
+    parser = argparse.ArgumentParser(description="Costruisce lo snapshot binario del corpus e ne misura il caricamento.")
+    parser.add_argument("--runs", type=int, default=5, help="Ripetizioni per la misura dei tempi di caricamento.")
+    args = parser.parse_args()
+
+    corpus_files = find_corpus_files(STRUCTURED_DIR, CHUNKS_DIR, DOC_INFO_MAP)
+    content_hash = corpus_content_hash(corpus_files, DOC_INFO_MAP)
+    print(f"--- Snapshot del corpus: {len(corpus_files)} file sorgente, hash {content_hash[:12]} ---")
+
+    bundle = build_corpus_bundle(corpus_files, DOC_INFO_MAP)
+    write_corpus_snapshot(SNAPSHOT_PATH, content_hash, bundle)
+    print(f"✅ Snapshot scritto in '{SNAPSHOT_PATH}' ({os.path.getsize(SNAPSHOT_PATH) / 1024:.0f} KB).")
+
+    json_times, hash_times, snapshot_times = [], [], []
+    for _ in range(args.runs):
+        t0 = time.perf_counter()
+        build_corpus_bundle(corpus_files, DOC_INFO_MAP)
+        json_times.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        current_hash = corpus_content_hash(find_corpus_files(STRUCTURED_DIR, CHUNKS_DIR, DOC_INFO_MAP), DOC_INFO_MAP)
+        hash_times.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        loaded = read_corpus_snapshot(SNAPSHOT_PATH, current_hash)
+        snapshot_times.append(time.perf_counter() - t0)
+        if loaded is None:
+            print("❌ Lo snapshot appena scritto non è stato riconosciuto come aggiornato.")
+            return
+
+    json_ms = statistics.median(json_times) * 1000
+    snapshot_ms = (statistics.median(hash_times) + statistics.median(snapshot_times)) * 1000
+    print(f"\n--- Caricamento del corpus (mediana su {args.runs} ripetizioni) ---")
+    print(f"   - JSON + tabelle derivate:     {json_ms:8.1f} ms")
+    print(f"   - Snapshot (hash + mmap/load): {snapshot_ms:8.1f} ms  (di cui hash {statistics.median(hash_times) * 1000:.1f} ms)")
+    print(f"⏱️ Speedup: {json_ms / max(snapshot_ms, 1e-9):.1f}x")
+
+if __name__ == "__main__":
+    main()
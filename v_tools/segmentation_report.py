@@ -0,0 +1,93 @@
+# v_tools/segmentation_report.py
+
+"""
+Report della segmentazione deterministica in commi (g_src/g_general/utils_segmentation.py).
+
+Per ogni documento carica gli articoli dal docx (utils_articles, con cache), li segmenta
+con le regole e riporta quanti articoli richiederebbero il fallback sull'LLM. Se esiste già un file di keyword (segmentato in passato dall'LLM), confronta
+anche la numerazione dei commi articolo per articolo.
+
+Non effettua chiamate al modello.
+
+USO:
+    python v_tools/segmentation_report.py [--doc a_cost|b_regcam|all] [--verbose]
+"""
+
+import os
+import sys
+import json
+import argparse
+from collections import defaultdict
+
+# --- Setup del Percorso ---
+script_dir = os.path.dirname(__file__)
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from g_src.g_general.utils_segmentation import segment_commi, SegmentationReport
+from g_src.g_general.utils_articles import load_articles
+
+DOCUMENTS = {
+    "a_cost": {
+        "layout": "cost",
+        "docx": os.path.join(project_root, "b_testi", "a_cost", "cost_2023_22_10_testo.docx"),
+        "reference": os.path.join(project_root, "d_outputs", "03_structured", "a_cost", "cost_keywords_data.json"),
+    },
+    "b_regcam": {
+        "layout": "regcam",
+        "docx": os.path.join(project_root, "b_testi", "b_regcam", "regcam_testo.docx"),
+        "reference": os.path.join(project_root, "d_outputs", "03_structured", "b_regcam", "regcam_keywords_data.json"),
+    },
+}
+
+def load_reference(path: str) -> dict:
+    """Numerazione dei commi per articolo nel file di keyword esistente ({} se assente)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    commi = defaultdict(list)
+    for record in records:
+        commi[str(record.get("articolo"))].append(str(record.get("comma")))
+    return commi
+
+def report_document(doc_name: str, settings: dict, verbose: bool):
+    print(f"\n=== {doc_name} ===")
+    articles = load_articles(settings["docx"], settings["layout"])
+    reference = load_reference(settings["reference"])
+    report = SegmentationReport()
+    compared, disagreeing = 0, []
+
+    for article_id, text in articles.items():
+        if not text:
+            continue
+        commi = segment_commi(text)
+        report.record(article_id, used_fallback=commi is None)
+        if commi is None or str(article_id) not in reference:
+            continue
+        compared += 1
+        labels = [item["comma"] for item in commi]
+        if labels != reference[str(article_id)]:
+            disagreeing.append(str(article_id))
+            if verbose:
+                print(f"  ≠ Art. {article_id}: regole {labels} / riferimento {reference[str(article_id)]}")
+
+    print(f"✂️  {report.summary()}")
+    if compared:
+        print(f"📏 Numerazione dei commi uguale al file di riferimento: {compared - len(disagreeing)}/{compared} articoli")
+        if disagreeing:
+            print(f"   Articoli diversi: {', '.join(disagreeing)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Report della segmentazione a regole degli articoli in commi.")
+    parser.add_argument("--doc", choices=[*DOCUMENTS, "all"], default="all")
+    parser.add_argument("--verbose", action="store_true", help="Mostra la numerazione degli articoli che differiscono dal riferimento.")
+    args = parser.parse_args()
+
+    for doc_name, settings in DOCUMENTS.items():
+        if args.doc in (doc_name, "all"):
+            report_document(doc_name, settings, args.verbose)
+
+if __name__ == "__main__":
+    main()